@@ -0,0 +1,297 @@
+import os
+import json
+import asyncio
+import csv
+import threading
+import numpy as np
+from typing import List, Dict, Optional, Tuple
+from dotenv import load_dotenv
+
+from distance_engine import DistanceEngine
+from spatial_index import RERANK_MARGIN, geodesic_km
+from geocode_cache import normalize_postal_code
+from location_service import location_key
+
+# Load environment variables
+load_dotenv()
+
+# Location of the precomputed postal code -> nearest musollahs table
+ANSWER_TABLE_PATH = os.getenv("ANSWER_TABLE_PATH", "cache/answers.json")
+
+# Set for the worker processes by multi_worker.py: the main process keeps the table
+# up to date and saves it, and the workers reload the saved table for every new
+# snapshot instead of each updating and saving their own
+ANSWER_TABLE_FOLLOW_FILE = os.getenv("ANSWER_TABLE_FOLLOW_FILE", "false").lower() == "true"
+
+# Number of nearest locations stored per postal code (the /nearest maximum)
+ANSWER_TABLE_SIZE = 5
+
+# Haversine differs from geodesic by less than 0.6% around Singapore, so a
+# new location can only enter a top-5 if its haversine distance is within
+# this factor of the current 5th geodesic distance.
+HAVERSINE_TOLERANCE = 1.01
+
+
+def _exact_top(lat: float, lon: float, candidates: List[Tuple[str, float, float]],
+               positions: Dict[str, int]) -> List[Tuple[str, float]]:
+    """Rank (key, lat, lon) candidates by geodesic distance and keep the top ANSWER_TABLE_SIZE.
+
+    Distances and ties (broken by snapshot position) are ranked exactly like
+    SpatialIndex.nearest() does, so table answers match live answers.
+    """
+    ranked = sorted(
+        (geodesic_km(lat, lon, c_lat, c_lon), positions[key], key)
+        for key, c_lat, c_lon in candidates
+    )
+    return [(key, distance) for distance, _, key in ranked[:ANSWER_TABLE_SIZE]]
+
+
+class AnswerTable:
+    """Precomputed top-5 nearest musollahs for a fixed set of postal codes.
+
+    The table is built offline (see the __main__ block) and kept in sync with
+    the catalog: whenever a new catalog snapshot is installed, `update()`
+    only recomputes postal codes whose answers lost a location and merges
+    newly added locations into the others, so the cost scales with the size
+    of the change rather than with the size of the catalog.
+
+    Answers are only served for the snapshot the table was last updated
+    against, so a stale table can never produce a wrong reply.
+
+    With `follow_file=True` the table is never saved: before each update it
+    reloads the file if another process saved a newer table, so that update
+    usually only has to map the answers to the snapshot's positions.
+    """
+
+    def __init__(self, path: str = ANSWER_TABLE_PATH, follow_file: bool = ANSWER_TABLE_FOLLOW_FILE):
+        self._path = path
+        self._follow_file = follow_file
+        # (inode, mtime, size) of the file last read
+        self._file_id: Optional[Tuple[int, int, int]] = None
+        self._lock = threading.Lock()
+        self._points: Dict[str, Tuple[float, float]] = {}
+        self._location_keys: frozenset = frozenset()
+        # (snapshot version, location key -> snapshot position, postal code -> [(key, distance)])
+        self._state: Tuple[Optional[int], Dict[str, int], Dict[str, List[Tuple[str, float]]]] = (None, {}, {})
+
+    def __len__(self) -> int:
+        return len(self._state[2])
+
+    @classmethod
+    def load(cls, path: str = ANSWER_TABLE_PATH, follow_file: bool = ANSWER_TABLE_FOLLOW_FILE) -> "AnswerTable":
+        """Load a table from disk (an empty table is returned if the file does not exist)."""
+        table = cls(path, follow_file)
+        table._read()
+        return table
+
+    def _read(self) -> None:
+        """Replace the table with the saved one, unless the file is missing or was already read."""
+        try:
+            stat = os.stat(self._path)
+        except FileNotFoundError:
+            return
+        file_id = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if file_id == self._file_id:
+            return
+        try:
+            with open(self._path) as f:
+                data = json.load(f)
+            keys = data["locations"]
+            points = {}
+            answers = {}
+            for postal_code, (lat, lon, entries) in data["codes"].items():
+                points[postal_code] = (lat, lon)
+                answers[postal_code] = [(keys[i], distance) for i, distance in entries]
+        except Exception as e:
+            print(f"Error loading answer table from {self._path}: {e}")
+            return
+        self._points = points
+        self._location_keys = frozenset(keys)
+        self._state = (None, {}, answers)
+        self._file_id = file_id
+        print(f"Loaded {len(answers)} precomputed postal code answers from {self._path}")
+
+    def save(self) -> None:
+        """Write the table to disk in a compact form (location keys are stored once)."""
+        _, _, answers = self._state
+        keys = sorted(self._location_keys)
+        key_index = {key: i for i, key in enumerate(keys)}
+        codes = {
+            postal_code: [*self._points[postal_code], [[key_index[key], round(distance, 6)] for key, distance in entries]]
+            for postal_code, entries in answers.items()
+        }
+
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self._path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"locations": keys, "codes": codes}, f, separators=(",", ":"))
+        os.replace(tmp_path, self._path)
+
+    def add_postal_codes(self, points: Dict[str, Tuple[float, float]]) -> None:
+        """Register postal codes to precompute; their answers are computed by the next update()."""
+        with self._lock:
+            for postal_code, coordinates in points.items():
+                self._points[normalize_postal_code(postal_code)] = coordinates
+
+    def update(self, snapshot) -> None:
+        """Bring the table in line with a catalog snapshot, recomputing only what changed."""
+        with self._lock:
+            if self._follow_file:
+                self._read()
+            locations = snapshot.locations
+            # Removed catalog slots are None (see CatalogSnapshot)
+            keys = [location_key(location) if location is not None else None for location in locations]
+            positions = {key: i for i, key in enumerate(keys) if key is not None}
+            new_keys = frozenset(positions)
+            added = new_keys - self._location_keys
+            removed = self._location_keys - new_keys
+
+            _, _, old_answers = self._state
+            answers: Dict[str, List[Tuple[str, float]]] = {}
+            full = []
+            for postal_code in self._points:
+                entries = old_answers.get(postal_code)
+                if entries is None or any(key in removed for key, _ in entries):
+                    full.append(postal_code)
+                else:
+                    answers[postal_code] = entries
+
+            # Postal codes that are new or lost one of their answers: recompute from scratch
+            if full and len(snapshot):
+                candidates = snapshot.engine.nearest_batch(
+                    [self._points[postal_code] for postal_code in full], ANSWER_TABLE_SIZE + RERANK_MARGIN
+                )
+                for postal_code, nearest in zip(full, candidates):
+                    lat, lon = self._points[postal_code]
+                    answers[postal_code] = _exact_top(lat, lon, [
+                        (keys[i], locations[i]["lat"], locations[i]["lon"]) for _, i in nearest
+                    ], positions)
+
+            # Other postal codes: only check whether an added location beats their current answers
+            recomputed = set(full)
+            merge_codes = [postal_code for postal_code in answers if postal_code not in recomputed]
+            if added and merge_codes:
+                added_keys = sorted(added)
+                added_locations = [locations[positions[key]] for key in added_keys]
+                engine = DistanceEngine([loc["lat"] for loc in added_locations], [loc["lon"] for loc in added_locations])
+                matrix = engine.distance_matrix(
+                    [self._points[postal_code][0] for postal_code in merge_codes],
+                    [self._points[postal_code][1] for postal_code in merge_codes],
+                )
+                for row, postal_code in zip(matrix, merge_codes):
+                    entries = answers[postal_code]
+                    bound = entries[-1][1] * HAVERSINE_TOLERANCE if len(entries) >= ANSWER_TABLE_SIZE else float("inf")
+                    close = np.flatnonzero(row <= bound).tolist()
+                    if not close:
+                        continue
+                    lat, lon = self._points[postal_code]
+                    candidates = [(key, locations[positions[key]]["lat"], locations[positions[key]]["lon"])
+                                  for key, _ in entries]
+                    candidates += [(added_keys[j], added_locations[j]["lat"], added_locations[j]["lon"]) for j in close]
+                    answers[postal_code] = _exact_top(lat, lon, candidates, positions)
+
+            changed = bool(full or added or removed)
+            self._location_keys = new_keys
+            self._state = (snapshot.version, positions, answers)
+            print(f"Answer table updated for catalog version {snapshot.version}: "
+                  f"{len(full)} recomputed, {len(added)} added, {len(removed)} removed locations")
+
+        if changed and self._points and not self._follow_file:
+            try:
+                self.save()
+            except Exception as e:
+                print(f"Error saving answer table to {self._path}: {e}")
+
+    def lookup(self, postal_code: str, snapshot, count: int = 1) -> Optional[List[Tuple[float, int]]]:
+        """Return the precomputed nearest locations for a postal code.
+
+        Returns:
+            List of (distance in km, snapshot position) pairs sorted by distance, or
+            None if the postal code is not in the table or the table was built
+            against a different snapshot
+        """
+        version, positions, answers = self._state
+        if snapshot is None or version != snapshot.version:
+            return None
+        entries = answers.get(normalize_postal_code(postal_code))
+        if entries is None:
+            return None
+        return [(distance, positions[key]) for key, distance in entries[:count]]
+
+
+_table: Optional[AnswerTable] = None
+
+
+def get_answer_table() -> AnswerTable:
+    """Return the process-wide answer table, loaded from ANSWER_TABLE_PATH."""
+    global _table
+    if _table is None:
+        _table = AnswerTable.load()
+    return _table
+
+
+async def _geocode_missing(postal_codes: List[str]) -> Dict[str, Tuple[float, float]]:
+    """Geocode postal codes without coordinates (through the geocode cache)."""
+    from onemap_service import geocode_postal_code_async
+    from http_client import close_http_client
+
+    semaphore = asyncio.Semaphore(5)  # Be gentle with OneMap
+
+    async def lookup(postal_code):
+        async with semaphore:
+            try:
+                return postal_code, await geocode_postal_code_async(postal_code)
+            except Exception as e:
+                print(f"Error geocoding postal code {postal_code}: {e}")
+                return postal_code, None
+
+    try:
+        results = await asyncio.gather(*(lookup(postal_code) for postal_code in postal_codes))
+    finally:
+        await close_http_client()
+    return {postal_code: coordinates for postal_code, coordinates in results if coordinates}
+
+
+def read_postal_codes(csv_path: str) -> Dict[str, Tuple[float, float]]:
+    """Read postal codes from a CSV file with a postal_code column and optional lat, lon columns.
+
+    Postal codes without coordinates are geocoded through the geocode cache / OneMap.
+    """
+    points: Dict[str, Tuple[float, float]] = {}
+    missing = []
+    with open(csv_path, newline='') as f:
+        for row in csv.reader(f):
+            if not row or not row[0].strip().isdigit():
+                continue  # Header or blank row
+            postal_code = normalize_postal_code(row[0])
+            try:
+                points[postal_code] = (float(row[1]), float(row[2]))
+            except (ValueError, IndexError):
+                missing.append(postal_code)
+
+    if missing:
+        points.update(asyncio.run(_geocode_missing(missing)))
+    return points
+
+
+# Offline build: python answer_table.py postal_codes.csv
+if __name__ == "__main__":
+    import sys
+    from catalog_service import LocationCatalog
+
+    if len(sys.argv) != 2:
+        print("Usage: python answer_table.py <postal_codes.csv>")
+        sys.exit(1)
+
+    table = AnswerTable.load()
+    table.add_postal_codes(read_postal_codes(sys.argv[1]))
+    # Built from the same merged catalog the bot serves, so its location keys match at runtime
+    snapshot = LocationCatalog().get_snapshot()
+    if not snapshot or not len(snapshot):
+        print("No locations fetched, answer table not updated.")
+        sys.exit(1)
+    table.update(snapshot)
+    table.save()
+    print(f"Wrote {len(table)} postal code answers to {ANSWER_TABLE_PATH}")
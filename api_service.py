@@ -1,7 +1,12 @@
 import os
+import hashlib
 import requests
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Iterator
 from dotenv import load_dotenv
+from http_client import get_http_client, HTTP_TIMEOUT_SECONDS
+from json_stream import iter_json_array, aiter_json_array
+from location_store import SourceLocation
+from metrics import timed, UPSTREAM_SECONDS, UPSTREAM_ERRORS
 
 # Load environment variables
 load_dotenv()
@@ -10,69 +15,162 @@ load_dotenv()
 API_KEY = os.getenv('MUSOLLAH_API_KEY')
 API_URL = "https://api.musollah.com/info/musollah/list/sg"
 
-def fetch_api_locations() -> List[Dict[str, Any]]:
-    """Fetch musollah locations from the musollah.com API.
-    
+# The response body is downloaded and parsed in chunks of this size
+API_CHUNK_BYTES = 64 * 1024
+
+def _request_headers() -> Dict[str, str]:
+    # Ask for a compressed body; requests and httpx decompress it while streaming
+    headers = {"Accept-Encoding": "gzip"}
+    # httpx rejects None header values (requests silently drops them)
+    if API_KEY:
+        headers["X-API-KEY"] = API_KEY
+    return headers
+
+@timed(UPSTREAM_SECONDS, UPSTREAM_ERRORS, service="musollah_api")
+def _fetch(headers: Dict[str, str], previous_sha1: Optional[str] = None
+           ) -> Tuple[requests.Response, Optional[str], Optional[List[SourceLocation]]]:
+    """GET the musollah list and convert it to locations while it downloads.
+
+    The body is hashed and parsed item by item as it arrives (see
+    json_stream), so neither the raw body nor the decoded JSON list is ever
+    held in memory. If the body hashes to `previous_sha1`, the converted
+    locations are discarded.
+
+    Args:
+        headers: Request headers
+        previous_sha1: SHA-1 of the body last converted, if any
+
     Returns:
-        List of dictionaries containing musollah location data with keys:
-        - name: Name of the musollah
-        - lat: Latitude (float)
-        - lon: Longitude (float)
-        - directions: Directions to the musollah
-        - details: Additional details about the musollah
-        - google_maps: Google Maps link to the location (constructed)
+        (response, SHA-1 of the body, locations); locations is None if the body
+        hashes to `previous_sha1`, and both are None for a 304 Not Modified
+        response (which is returned, not raised)
     """
-    try:
-        # Set up the API request with the API key
-        headers = {"X-API-KEY": API_KEY}
-        
-        # Make the API request
-        response = requests.get(API_URL, headers=headers)
+    with requests.get(API_URL, headers=headers, timeout=HTTP_TIMEOUT_SECONDS, stream=True) as response:
+        if response.status_code == 304:
+            return response, None, None
         response.raise_for_status()  # Raise an exception for HTTP errors
-        
-        # Parse the JSON response
-        data = response.json()
-        
-        if not data:
-            print('No data found from the API.')
-            return []
-        
-        # Convert API data to location dictionaries in the same format as sheets_service
+
+        digest = hashlib.sha1()
+
+        def hashed(chunks: Iterable[bytes]) -> Iterator[bytes]:
+            for chunk in chunks:
+                digest.update(chunk)
+                yield chunk
+
+        locations = parse_api_items(iter_json_array(hashed(response.iter_content(API_CHUNK_BYTES))))
+
+    content_hash = digest.hexdigest()
+    if content_hash == previous_sha1:
+        return response, content_hash, None
+    return response, content_hash, locations
+
+@timed(UPSTREAM_SECONDS, UPSTREAM_ERRORS, service="musollah_api")
+async def _fetch_async(headers: Dict[str, str]) -> List[SourceLocation]:
+    """GET the musollah list through the shared async HTTP client, converting it while it downloads."""
+    async with get_http_client().stream("GET", API_URL, headers=headers) as response:
+        response.raise_for_status()
         locations = []
-        
-        for item in data:
-            try:
-                # Extract and convert latitude and longitude to float
-                lat = float(item.get('Latitude', 0))
-                lon = float(item.get('Longitude', 0))
-                
-                # Create location dictionary with the same structure as sheets_service
-                name = f"{item.get('Place', 'Unknown')}"
-                location = {
-                    "name": name,
-                    "lat": lat,
-                    "lon": lon,
-                    "address": item.get('Address', ''),
-                    "details": item.get('Details', ''),
-                    "type": item.get('Type', 'Musollah'),
-                    "directions": item.get('LocationIn', ''),
-                    # Construct Google Maps link
-                    # "google_maps": f"https://www.google.com/maps/search/?api=1&query={name.replace(" ", "+")},{lat},{lon}",
-                }
-                
+        async for item in aiter_json_array(response.aiter_bytes(API_CHUNK_BYTES)):
+            location = api_item_location(item)
+            if location is not None:
                 locations.append(location)
-            except (ValueError, TypeError) as e:
-                print(f"Error processing item {item.get('ID', 'unknown')}: {e}")
-                continue
+    if not locations:
+        print('No data found from the API.')
+    return locations
+
+def fetch_api_locations_if_changed(fingerprint: Optional[Dict[str, str]] = None) -> Tuple[Optional[Dict[str, str]], Optional[List[SourceLocation]]]:
+    """Fetch musollah locations from the musollah.com API, skipping them if nothing changed.
+    
+    Sends a conditional request when the previous response had an ETag or
+    Last-Modified header, and otherwise compares a hash of the response body,
+    so that an unchanged list does not cause a catalog refresh.
+    
+    Args:
+        fingerprint: The fingerprint returned by the previous call, if any
+        
+    Returns:
+        (fingerprint, locations) where locations is None if the list is unchanged
+        since `fingerprint`
         
-        return locations
+    Raises:
+        requests.RequestException: If the API request failed
+        ValueError: If the response is not a JSON array
+    """
+    headers = _request_headers()
+    if fingerprint:
+        if fingerprint.get("etag"):
+            headers["If-None-Match"] = fingerprint["etag"]
+        if fingerprint.get("last_modified"):
+            headers["If-Modified-Since"] = fingerprint["last_modified"]
+    
+    response, content_hash, locations = _fetch(headers, fingerprint.get("sha1") if fingerprint else None)
+    if response.status_code == 304:
+        return fingerprint, None
+    
+    new_fingerprint = {
+        "etag": response.headers.get("ETag", ""),
+        "last_modified": response.headers.get("Last-Modified", ""),
+        "sha1": content_hash,
+    }
+    return new_fingerprint, locations
+
+async def fetch_api_locations_async() -> List[SourceLocation]:
+    """Fetch musollah locations from the musollah.com API without blocking the event loop.
+    
+    Uses the shared pooled HTTP client.
+
+    Returns:
+        List of location records (see api_item_location), or an empty list if the request failed
+    """
+    try:
+        return await _fetch_async(_request_headers())
     except Exception as e:
         print(f"Error fetching data from API: {e}")
         return []
 
+def api_item_location(item: Any) -> Optional[SourceLocation]:
+    """Convert one item of the musollah.com API response to a location record.
+
+    Records are the compact SourceLocation tuples the Google Sheets source
+    produces too, with the fields the API does not have set to None.
+
+    Returns:
+        The location, or None if the item is invalid
+    """
+    try:
+        # Extract and convert latitude and longitude to float
+        lat = float(item.get('Latitude', 0))
+        lon = float(item.get('Longitude', 0))
+        return SourceLocation(
+            name=f"{item.get('Place', 'Unknown')}",
+            lat=lat,
+            lon=lon,
+            address=item.get('Address', ''),
+            directions=item.get('LocationIn', ''),
+            details=item.get('Details', ''),
+            google_maps=None,
+            type=item.get('Type', 'Musollah'),
+            guide=None,
+        )
+    except (ValueError, TypeError, AttributeError) as e:
+        item_id = item.get('ID', 'unknown') if isinstance(item, dict) else 'unknown'
+        print(f"Error processing item {item_id}: {e}")
+        return None
+
+def parse_api_items(data: Iterable[Any]) -> List[SourceLocation]:
+    """Convert the items of the musollah.com API response to location records, skipping invalid ones."""
+    locations = []
+    for item in data:
+        location = api_item_location(item)
+        if location is not None:
+            locations.append(location)
+    if not locations:
+        print('No data found from the API.')
+    return locations
+
 # For testing purposes
 if __name__ == "__main__":
-    locations = fetch_api_locations()
+    _, locations = fetch_api_locations_if_changed()
     print(f"Fetched {len(locations)} locations from API")
     for loc in locations[:2]:  # Print first two locations as a sample
         print(f"Name: {loc['name']}")
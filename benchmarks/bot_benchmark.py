@@ -0,0 +1,231 @@
+"""
+Benchmark nearest-location queries, restarts and webhook throughput, fully offline.
+
+Google Sheets, musollah.com, OneMap, Supabase and the Telegram Bot API are
+replaced by the local stand-ins in stubs.py. Results are written to JSON so
+runs on different commits can be compared.
+
+Usage:
+    python benchmarks/bot_benchmark.py [--sizes 100,1000,10000,100000] [--queries 2000]
+        [--updates 2000] [--concurrency 50] [--fast-ack] [--output benchmark_results.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+
+import stubs
+from latency import latency_summary
+
+stubs.configure_environment()
+
+import httpx  # noqa: E402
+
+import catalog_service  # noqa: E402
+import telegram_bot  # noqa: E402
+import webserver  # noqa: E402
+from location_store import NearestLocation  # noqa: E402
+
+
+def random_points(n, seed=1):
+    rng = random.Random(seed)
+    return [(rng.uniform(*stubs.LAT_RANGE), rng.uniform(*stubs.LON_RANGE)) for _ in range(n)]
+
+
+def bench_nearest(sizes, queries, counts=(1, 5)):
+    """Latency of get_nearest_musollah_text_async against the number of catalog locations."""
+    points = random_points(queries)
+    results = []
+    for size in sizes:
+        stubs.install_stubs(stubs.synthetic_locations(size))
+        started = time.perf_counter()
+        catalog_service.get_catalog().refresh()
+        load_seconds = time.perf_counter() - started
+
+        result = {"locations": size, "catalog_load_ms": load_seconds * 1e3}
+        for count in counts:
+            result[f"count_{count}"] = latency_summary(asyncio.run(nearest_latencies(points, count)))
+        results.append(result)
+    return results
+
+
+async def nearest_latencies(points, count):
+    latencies = []
+    for lat, lon in points:
+        started = time.perf_counter()
+        await telegram_bot.get_nearest_musollah_text_async(lat, lon, count)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def bench_format(locations, repeat):
+    """Throughput of _format_location_details, rendering a location from scratch."""
+    stubs.install_stubs(stubs.synthetic_locations(locations))
+    catalog_service.get_catalog().refresh()
+    store = catalog_service.get_catalog().get_snapshot().locations
+    rng = random.Random(2)
+    results = [NearestLocation(rng.uniform(0, 5), store[rng.randrange(len(store))]) for _ in range(1000)]
+
+    started = time.perf_counter()
+    for i in range(repeat):
+        telegram_bot._format_location_details(results[i % len(results)], i % 5 + 1)
+    elapsed = time.perf_counter() - started
+    return {"calls": repeat, "calls_per_second": repeat / elapsed, "us_per_call": elapsed / repeat * 1e6}
+
+
+# Target time from a restart to the first answer, served from the saved catalog snapshot
+RESTORE_TARGET_MS = 100
+
+
+def bench_restore(sizes):
+    """Time from creating the catalog of a restarted process to its first answer, from a saved snapshot file."""
+    results = []
+    with tempfile.TemporaryDirectory(prefix="musollah-restore-") as workdir:
+        for size in sizes:
+            path = os.path.join(workdir, f"catalog-{size}.snapshot")
+            locations = stubs.synthetic_locations(size)
+            catalog_service.save_snapshot(catalog_service.CatalogSnapshot(1, locations, time.monotonic()), path)
+
+            lat, lon = random_points(1)[0]
+            started = time.perf_counter()
+            # No sources: only the restore is measured, not the background refresh that follows it
+            catalog = catalog_service.LocationCatalog(sources={}, async_sources={})
+            catalog.persist_snapshots(path)
+            snapshot = catalog.get_snapshot()
+            snapshot.renderer.render_nearest(snapshot.index.nearest(lat, lon, 5), 5)
+            elapsed_ms = (time.perf_counter() - started) * 1e3
+
+            results.append({
+                "locations": size,
+                "file_kib": os.path.getsize(path) // 1024,
+                "first_answer_ms": elapsed_ms,
+                "within_target": elapsed_ms < RESTORE_TARGET_MS,
+            })
+    return results
+
+
+def webhook_updates(n, users, seed=3):
+    """A mix of location pins and simple commands from `users` distinct users."""
+    rng = random.Random(seed)
+    updates = []
+    for update_id in range(1, n + 1):
+        user_id = rng.randrange(1, users + 1)
+        roll = rng.random()
+        if roll < 0.7:
+            lat, lon = random_points(1, seed=update_id)[0]
+            updates.append(stubs.telegram_update(update_id, user_id, location=(lat, lon)))
+        elif roll < 0.85:
+            updates.append(stubs.telegram_update(update_id, user_id, text="/start"))
+        else:
+            updates.append(stubs.telegram_update(update_id, user_id, text="/help"))
+    return updates
+
+
+async def bench_webhook(locations, n, concurrency, fast_ack):
+    """End-to-end /webhook requests per second through the FastAPI app."""
+    telegram = await stubs.StubTelegramServer().start()
+    os.environ["TELEGRAM_API_BASE_URL"] = telegram.base_url
+    supabase = stubs.install_stubs(stubs.synthetic_locations(locations))
+    webserver.WEBHOOK_FAST_ACK = fast_ack
+    await webserver.startup_event()
+    try:
+        updates = webhook_updates(n, users=max(1, n // 4))
+        latencies, statuses = [], {}
+        semaphore = asyncio.Semaphore(concurrency)
+        transport = httpx.ASGITransport(app=webserver.app)
+
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            # Warm up the catalog and connection pools outside the measurement
+            await client.post("/webhook", json=stubs.telegram_update(0, 1, text="/help"))
+
+            async def send(update):
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.post("/webhook", json=update)
+                    latencies.append(time.perf_counter() - started)
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(send(update) for update in updates))
+            if webserver.update_dispatcher:
+                # With fast-ack, the run ends once every queued update was processed
+                dispatcher = webserver.update_dispatcher
+                while dispatcher.processed + dispatcher.failed < dispatcher.accepted:
+                    await asyncio.sleep(0.005)
+            elapsed = time.perf_counter() - started
+
+        return {
+            "mode": "fast_ack" if fast_ack else "inline",
+            "locations": locations,
+            "updates": n,
+            "concurrency": concurrency,
+            "seconds": elapsed,
+            "requests_per_second": n / elapsed,
+            "statuses": {str(status): total for status, total in sorted(statuses.items())},
+            "latency": latency_summary(latencies),
+            "telegram_calls": dict(sorted(telegram.calls.items())),
+            "supabase_upserts": supabase.upserts,
+        }
+    finally:
+        await webserver.shutdown_event()
+        await telegram.stop()
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes=(100, 1000, 10000, 100000), queries=2000, format_repeat=100000,
+        updates=2000, concurrency=50, webhook_locations=1000, fast_ack=False):
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "nearest": bench_nearest(sizes, queries),
+        "restore": bench_restore(sizes),
+        "format_location_details": bench_format(webhook_locations, format_repeat),
+        "webhook": asyncio.run(bench_webhook(webhook_locations, updates, concurrency, fast_ack)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="100,1000,10000,100000",
+                        help="comma-separated catalog sizes for the nearest-location benchmark")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--format-repeat", type=int, default=100000)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--webhook-locations", type=int, default=1000)
+    parser.add_argument("--fast-ack", action="store_true", help="benchmark the webhook in fast-ack mode")
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    result = run([int(size) for size in args.sizes.split(",")], args.queries, args.format_repeat,
+                 args.updates, args.concurrency, args.webhook_locations, args.fast_ack)
+    with open(args.output, "w") as f:
+        json.dump(result, f, indent=2)
+
+    print("get_nearest_musollah_text_async:")
+    for row in result["nearest"]:
+        print(f"  {row['locations']:>7} locations: p50 {row['count_1']['p50_ms']:.3f} ms (1), "
+              f"{row['count_5']['p50_ms']:.3f} ms (5), p99 {row['count_5']['p99_ms']:.3f} ms")
+    print(f"First answer after a restart (target {RESTORE_TARGET_MS} ms):")
+    for row in result["restore"]:
+        print(f"  {row['locations']:>7} locations: {row['first_answer_ms']:.1f} ms "
+              f"({row['file_kib']:,} KiB snapshot file{'' if row['within_target'] else ', over target'})")
+    print(f"_format_location_details: {result['format_location_details']['calls_per_second']:,.0f} calls/s")
+    webhook = result["webhook"]
+    print(f"/webhook ({webhook['mode']}, concurrency {webhook['concurrency']}): "
+          f"{webhook['requests_per_second']:,.0f} req/s, p50 {webhook['latency']['p50_ms']:.2f} ms, "
+          f"p99 {webhook['latency']['p99_ms']:.2f} ms, statuses {webhook['statuses']}")
+    print(f"Results written to {args.output}")
@@ -0,0 +1,340 @@
+"""
+Replay synthetic Telegram updates against /webhook to capacity-plan one instance.
+
+Virtual users run realistic flows: location pins across Singapore, /location
+conversations with postal codes, /nearest flows with counts, and feedback.
+Updates are sent at a configurable rate (updates per second, 0 = as fast as
+possible) by a configurable number of concurrent users. Bot API calls go to a
+local stub (stubs.StubTelegramServer).
+
+By default a webserver.py instance is started in a subprocess with every
+upstream service stubbed (see stubs.py); use --url to load an instance that is
+already running with TELEGRAM_API_BASE_URL pointing at --telegram-port.
+
+Webhook latencies measure how long the server takes to answer Telegram, which
+with --fast-ack is only the time to queue an update. After the load phase the
+generator therefore polls /health until the server has finished every update
+it accepted, and reports the updates processed and failed (handlers raising,
+which the webhook still answers with 200) as counted by the server, the time
+the backlog took to drain and the resulting processing rate. Against a
+multi-worker instance /health reflects a single worker, so use one worker.
+
+Usage:
+    python benchmarks/load_generator.py [--rate 200] [--concurrency 50] [--duration 30]
+        [--mix pin=50,location=20,nearest=20,feedback=10] [--fast-ack] [--output load.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+import stubs
+from latency import latency_summary
+
+# Flow name -> share of flows (overridden with --mix)
+DEFAULT_MIX = {"pin": 50, "location": 20, "nearest": 20, "feedback": 10}
+
+# Postal codes are drawn from a pool where a few codes are much hotter than the rest
+POSTAL_CODE_POOL = 2000
+
+# How long to wait for the server to finish the updates it accepted after the load phase
+DRAIN_TIMEOUT_SECONDS = 120
+
+
+class LoadStats:
+    """Latencies and outcomes of the updates sent, per flow step."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+        self.errors = {}
+        self.sent = 0
+        self.accepted = 0
+
+    def record(self, step, seconds, status=None, error=None):
+        self.sent += 1
+        if status == 200 and error is None:
+            self.accepted += 1
+        self.latencies.setdefault(step, []).append(seconds)
+        if status is not None:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+        if error is not None:
+            self.errors[error] = self.errors.get(error, 0) + 1
+
+    def report(self, elapsed, outcomes=None, drain_seconds=0.0):
+        """Summarize the load phase.
+
+        Args:
+            elapsed: Duration of the load phase in seconds
+            outcomes: {"processed", "failed"} updates the server finished during
+                the run (None if it does not report them)
+            drain_seconds: Time the server took to finish its backlog after the load phase
+        """
+        all_latencies = [seconds for latencies in self.latencies.values() for seconds in latencies]
+        failed = sum(self.errors.values()) + sum(
+            total for status, total in self.statuses.items() if not 200 <= status < 300)
+        server = {}
+        if outcomes is not None:
+            # Accepted updates the server never finished count as failed too
+            unfinished = max(0, self.accepted - outcomes["processed"] - outcomes["failed"])
+            failed += outcomes["failed"] + unfinished
+            total_seconds = elapsed + drain_seconds
+            server = {
+                "processed": outcomes["processed"],
+                "failed": outcomes["failed"],
+                "unfinished": unfinished,
+                "drain_seconds": drain_seconds,
+                "processed_per_second": outcomes["processed"] / total_seconds if total_seconds else 0.0,
+            }
+        return {
+            "updates": self.sent,
+            "seconds": elapsed,
+            "updates_per_second": self.sent / elapsed if elapsed else 0.0,
+            "error_rate": failed / self.sent if self.sent else 0.0,
+            "server": server or None,
+            "statuses": {str(status): total for status, total in sorted(self.statuses.items())},
+            "errors": dict(sorted(self.errors.items())),
+            "latency": latency_summary(all_latencies),
+            "latency_by_step": {step: latency_summary(latencies) for step, latencies in sorted(self.latencies.items())},
+        }
+
+
+class Pacer:
+    """Spaces sends evenly at `rate` per second across all users (no limit if rate is 0)."""
+
+    def __init__(self, rate):
+        self._interval = 1 / rate if rate > 0 else 0
+        self._next = time.perf_counter()
+
+    async def wait(self):
+        if not self._interval:
+            return
+        now = time.perf_counter()
+        self._next = max(self._next + self._interval, now)
+        if self._next > now:
+            await asyncio.sleep(self._next - now)
+
+
+class UpdateFactory:
+    """Builds the updates of each flow, with unique update ids."""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self._update_id = 0
+        codes = self.rng.sample(range(100000, 830000), POSTAL_CODE_POOL)
+        self._postal_codes = [str(code) for code in codes]
+        self._weights = [1 / rank for rank in range(1, POSTAL_CODE_POOL + 1)]
+
+    def update(self, user_id, text=None, location=None):
+        self._update_id += 1
+        return stubs.telegram_update(self._update_id, user_id, text=text, location=location)
+
+    def pin(self):
+        return self.rng.uniform(*stubs.LAT_RANGE), self.rng.uniform(*stubs.LON_RANGE)
+
+    def postal_code(self):
+        return self.rng.choices(self._postal_codes, self._weights)[0]
+
+    def flow(self, name, user_id):
+        """The (step, update) pairs of one flow, in the order a user sends them."""
+        if name == "pin":
+            return [("pin", self.update(user_id, location=self.pin()))]
+        if name == "location":
+            return [("/location", self.update(user_id, text="/location")),
+                    ("postal_code", self.update(user_id, text=self.postal_code()))]
+        if name == "nearest":
+            answer = (self.update(user_id, location=self.pin()) if self.rng.random() < 0.5
+                      else self.update(user_id, text=self.postal_code()))
+            return [("/nearest", self.update(user_id, text="/nearest")),
+                    ("count", self.update(user_id, text=str(self.rng.randint(1, 5)))),
+                    ("nearest_answer", answer)]
+        if name == "feedback":
+            return [("/feedback", self.update(user_id, text="/feedback")),
+                    ("feedback_text", self.update(user_id, text="Load test feedback, please ignore"))]
+        raise ValueError(f"Unknown flow: {name}")
+
+
+async def server_outcomes(client):
+    """The server's {"processed", "failed"} update counts, or None if /health does not report them."""
+    try:
+        return (await client.get("/health")).json().get("updates")
+    except (httpx.HTTPError, ValueError):
+        return None
+
+
+async def wait_until_processed(client, baseline, expected, timeout=DRAIN_TIMEOUT_SECONDS):
+    """Poll /health until the server finished `expected` updates since `baseline` (or `timeout` passed).
+
+    Returns:
+        The {"processed", "failed"} updates finished since `baseline`
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        current = await server_outcomes(client) or baseline
+        outcomes = {key: current[key] - baseline[key] for key in ("processed", "failed")}
+        if outcomes["processed"] + outcomes["failed"] >= expected or time.monotonic() >= deadline:
+            return outcomes
+        await asyncio.sleep(0.1)
+
+
+async def run_load(url, rate, concurrency, duration, mix, seed=0, timeout=30):
+    """Run `concurrency` virtual users against `url` for `duration` seconds, then wait for the backlog."""
+    factory = UpdateFactory(seed)
+    flows, weights = zip(*mix.items())
+    stats = LoadStats()
+    pacer = Pacer(rate)
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        async def send(step, update):
+            await pacer.wait()
+            started = time.perf_counter()
+            try:
+                response = await client.post("/webhook", json=update)
+            except httpx.HTTPError as e:
+                stats.record(step, time.perf_counter() - started, error=type(e).__name__)
+                return False
+            seconds = time.perf_counter() - started
+            body_error = response.status_code == 200 and response.json().get("status") == "error"
+            stats.record(step, seconds, status=response.status_code,
+                         error="webhook_error" if body_error else None)
+            return response.status_code == 200 and not body_error
+
+        async def user(index):
+            # Every flow gets a fresh user id so an aborted flow cannot leave a conversation open
+            for flow_number in range(sys.maxsize):
+                if time.perf_counter() >= deadline:
+                    return
+                user_id = index * 1_000_000 + flow_number + 1
+                for step, update in factory.flow(factory.rng.choices(flows, weights)[0], user_id):
+                    if not await send(step, update):
+                        break
+
+        baseline = await server_outcomes(client)
+        started = time.perf_counter()
+        await asyncio.gather(*(user(index) for index in range(1, concurrency + 1)))
+        elapsed = time.perf_counter() - started
+
+        outcomes = None
+        if baseline is not None:
+            outcomes = await wait_until_processed(client, baseline, stats.accepted)
+        drain_seconds = time.perf_counter() - started - elapsed
+
+    return stats.report(elapsed, outcomes, drain_seconds)
+
+
+def serve(port, locations):
+    """Run webserver.py on `port` with every upstream service stubbed (the --spawn subprocess)."""
+    stubs.configure_environment()
+    import uvicorn
+    import webserver
+
+    stubs.install_stubs(stubs.synthetic_locations(locations))
+    uvicorn.run(webserver.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+async def wait_until_ready(url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url, timeout=1) as client:
+        while time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {process.returncode}")
+            try:
+                if (await client.get("/health")).json().get("bot_status") == "ready":
+                    return
+            except (httpx.HTTPError, ValueError):
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {url} not ready after {timeout} seconds")
+
+
+async def main(args):
+    telegram = await stubs.StubTelegramServer(port=args.telegram_port).start()
+    process = None
+    try:
+        url = args.url
+        if url is None:
+            url = f"http://127.0.0.1:{args.port}"
+            env = dict(os.environ, TELEGRAM_API_BASE_URL=telegram.base_url,
+                       WEBHOOK_FAST_ACK="true" if args.fast_ack else "false")
+            log_path = os.path.join(tempfile.gettempdir(), "musollah-load-server.log")
+            print(f"Starting a stubbed server on {url} (log: {log_path})")
+            with open(log_path, "w") as log:
+                process = subprocess.Popen(
+                    [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(args.port),
+                     "--locations", str(args.locations)],
+                    env=env, stdout=log, stderr=subprocess.STDOUT)
+        await wait_until_ready(url, process)
+
+        report = await run_load(url, args.rate, args.concurrency, args.duration, args.mix, args.seed)
+        report.update({
+            "url": url,
+            "target_rate": args.rate,
+            "concurrency": args.concurrency,
+            "mix": args.mix,
+            "telegram_calls": dict(sorted(telegram.calls.items())),
+        })
+        return report
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=15)
+        await telegram.stop()
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown flow {name!r} (expected one of {', '.join(DEFAULT_MIX)})")
+        mix[name] = float(weight)
+    return mix
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="load an already running instance instead of starting one")
+    parser.add_argument("--port", type=int, default=8000, help="port of the started instance")
+    parser.add_argument("--telegram-port", type=int, default=8081, help="port of the stub Bot API server")
+    parser.add_argument("--locations", type=int, default=1000, help="catalog size of the started instance")
+    parser.add_argument("--fast-ack", action="store_true", help="start the instance with WEBHOOK_FAST_ACK=true")
+    parser.add_argument("--rate", type=float, default=200, help="updates per second (0 = as fast as possible)")
+    parser.add_argument("--concurrency", type=int, default=50, help="number of concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to generate load for")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help="flow weights, e.g. pin=50,location=20")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report to this JSON file")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port, args.locations)
+        sys.exit()
+
+    report = asyncio.run(main(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    latency = report["latency"]
+    print(f"{report['updates']} updates in {report['seconds']:.1f} s: {report['updates_per_second']:,.1f} updates/s "
+          f"(target {args.rate or 'unlimited'}), error rate {report['error_rate']:.2%}")
+    print(f"Latency: p50 {latency.get('p50_ms', 0):.1f} ms, p90 {latency.get('p90_ms', 0):.1f} ms, "
+          f"p99 {latency.get('p99_ms', 0):.1f} ms, max {latency.get('max_ms', 0):.1f} ms")
+    for step, summary in report["latency_by_step"].items():
+        print(f"  {step:<15} {summary['count']:>7} updates, p50 {summary['p50_ms']:.1f} ms, p99 {summary['p99_ms']:.1f} ms")
+    server = report["server"]
+    if server:
+        print(f"Server: {server['processed']} processed, {server['failed']} failed, {server['unfinished']} unfinished; "
+              f"backlog drained in {server['drain_seconds']:.1f} s, {server['processed_per_second']:,.1f} updates/s processed")
+    print(f"Statuses: {report['statuses']}, errors: {report['errors']}")
+    print(f"Bot API calls: {report['telegram_calls']}")
@@ -0,0 +1,86 @@
+"""
+Benchmark reply rendering: pre-rendered fragments vs. formatting from scratch.
+
+Usage:
+    python benchmarks/render_benchmark.py [--locations 1000] [--count 5] [--repeat 20000]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from location_renderer import LocationRenderer, compile_location, render_fragment  # noqa: E402
+
+
+def synthetic_locations(n, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "name": f"Location {i}",
+            "lat": rng.uniform(1.22, 1.47),
+            "lon": rng.uniform(103.6, 104.05),
+            "address": f"{rng.randint(1, 999)} Example Road, Singapore {rng.randint(100000, 999999)}",
+            "directions": "Level 2, next to the lift lobby",
+            "details": "Ablution area available",
+            "google_maps": None,
+            "type": "Musollah",
+            "guide": None,
+        }
+        for i in range(n)
+    ]
+
+
+def render_from_scratch(locations, nearest, count):
+    """The previous reply path: format every location per request and build the reply with +=."""
+    def format_location(position, distance, index=None):
+        head, tail = compile_location(locations[position])
+        return render_fragment(head, tail, distance, index)
+
+    if count == 1:
+        distance, position = nearest[0]
+        return format_location(position, distance)
+    response_text = f'<b>🕌 {count} Nearest Prayer Spaces:</b>\n\n'
+    for i, (distance, position) in enumerate(nearest, 1):
+        response_text += format_location(position, distance, i)
+        if i < len(nearest):
+            response_text += "\n\n"
+    return response_text
+
+
+def run(locations=1000, count=5, repeat=20000):
+    data = synthetic_locations(locations)
+    renderer = LocationRenderer(data)
+    rng = random.Random(1)
+    nearest = sorted((rng.uniform(0, 5), rng.randrange(locations)) for _ in range(count))
+
+    assert render_from_scratch(data, nearest, count) == renderer.render_nearest(nearest, count)
+
+    scratch = min(timeit.repeat(lambda: render_from_scratch(data, nearest, count), number=repeat, repeat=3))
+    compiled = min(timeit.repeat(lambda: renderer.render_nearest(nearest, count), number=repeat, repeat=3))
+    build = min(timeit.repeat(lambda: LocationRenderer(data), number=1, repeat=3))
+
+    return {
+        "locations": locations,
+        "count": count,
+        "from_scratch_us": scratch / repeat * 1e6,
+        "precompiled_us": compiled / repeat * 1e6,
+        "speedup": scratch / compiled,
+        "compile_snapshot_ms": build * 1e3,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--locations", type=int, default=1000)
+    parser.add_argument("--count", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20000)
+    args = parser.parse_args()
+
+    result = run(args.locations, args.count, args.repeat)
+    print(f"Reply with {result['count']} locations:")
+    print(f"  from scratch:  {result['from_scratch_us']:.2f} us")
+    print(f"  pre-rendered:  {result['precompiled_us']:.2f} us ({result['speedup']:.1f}x faster)")
+    print(f"Compiling {result['locations']} locations per snapshot: {result['compile_snapshot_ms']:.1f} ms")
@@ -0,0 +1,255 @@
+"""
+Offline stand-ins for the services the bot talks to, for benchmarks.
+
+- Google Sheets and musollah.com: catalog sources serving synthetic locations
+- OneMap: an httpx mock transport answering postal code searches
+- Supabase: an async client that accepts upserts without storing them
+- Telegram: a local Bot API server (aiohttp) that answers every method call
+
+Call configure_environment() before importing any module of the bot, since
+most settings are read at import time.
+"""
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+
+import httpx
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BOT_TOKEN = "123456:BENCHMARK"
+DEVELOPER_GROUP_ID = "-1001"
+
+# Roughly the bounding box of Singapore
+LAT_RANGE = (1.22, 1.47)
+LON_RANGE = (103.6, 104.05)
+
+
+def configure_environment(workdir=None):
+    """Point the bot's settings at throwaway local files and the stubs.
+
+    Returns:
+        The directory holding the geocode cache, answer table and other local files
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix="musollah-bench-")
+    os.environ.update({
+        "ENVIRONMENT": "dev",
+        "TELEGRAM_BOT_TOKEN_DEV": BOT_TOKEN,
+        "DEVELOPER_GROUP_ID": DEVELOPER_GROUP_ID,
+        "PROD_URL": "http://127.0.0.1/",
+        "SCOPE": "sg",
+        "CATALOG_TTL_SECONDS": "86400",
+        "GEOCODE_CACHE_PATH": os.path.join(workdir, "geocode.sqlite3"),
+        "ANSWER_TABLE_PATH": os.path.join(workdir, "answers.json"),
+        "CONVERSATION_STORE_PATH": os.path.join(workdir, "conversations.sqlite3"),
+        "CATALOG_SNAPSHOT_PATH": os.path.join(workdir, "catalog.snapshot"),
+        "SUPABASE_URL": "http://127.0.0.1/supabase",
+        "SUPABASE_ANON_KEY": "benchmark",
+    })
+    return workdir
+
+
+def synthetic_locations(n, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "name": f"Location {i}",
+            "lat": rng.uniform(*LAT_RANGE),
+            "lon": rng.uniform(*LON_RANGE),
+            "address": f"{rng.randint(1, 999)} Example Road, Singapore {rng.randint(100000, 999999)}",
+            "directions": "Level 2, next to the lift lobby",
+            "details": "Ablution area available",
+            "google_maps": None,
+            "type": "Musollah",
+            "guide": None,
+        }
+        for i in range(n)
+    ]
+
+
+def postal_code_coordinates(postal_code):
+    """Deterministic coordinates inside Singapore for any postal code."""
+    rng = random.Random(postal_code)
+    return rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)
+
+
+# Google Sheets and musollah.com
+
+def fake_sources(locations, overlap=0.1, seed=0):
+    """Fake Google Sheets and musollah.com sources for `locations`.
+
+    Google Sheets serves every location; musollah.com serves a copy of an
+    `overlap` fraction of them, a few meters off and with a slightly different
+    name, so the catalog merges both sources back to the same locations.
+
+    Returns:
+        (sources, async_sources) in the form LocationCatalog expects
+    """
+    rng = random.Random(seed)
+    duplicates = [
+        dict(location, name=f"{location['name']} Musollah",
+             lat=location["lat"] + rng.uniform(-5e-5, 5e-5), lon=location["lon"] + rng.uniform(-5e-5, 5e-5))
+        for location in rng.sample(locations, int(len(locations) * overlap))
+    ]
+    by_source = {"sheets": locations, "api": duplicates}
+
+    def fetcher(name):
+        def fetch_if_changed(fingerprint):
+            if fingerprint == name:
+                return fingerprint, None
+            return name, list(by_source[name])
+        return fetch_if_changed
+
+    def async_fetcher(name):
+        async def fetch():
+            return list(by_source[name])
+        return fetch
+
+    return ({name: fetcher(name) for name in by_source},
+            {name: async_fetcher(name) for name in by_source})
+
+
+# OneMap
+
+def fake_onemap_transport():
+    """httpx transport answering OneMap postal code searches."""
+    def handler(request):
+        postal_code = request.url.params.get("searchVal", "")
+        if not postal_code.isdigit() or postal_code.startswith("0"):
+            return httpx.Response(200, json={"found": 0, "results": []})
+        lat, lon = postal_code_coordinates(postal_code)
+        return httpx.Response(200, json={
+            "found": 1,
+            "results": [{"POSTAL": postal_code, "LATITUDE": str(lat), "LONGITUDE": str(lon)}],
+        })
+    return httpx.MockTransport(handler)
+
+
+# Supabase
+
+class FakeSupabase:
+    """Accepts `table(...).upsert(...).execute()` calls like the async Supabase client."""
+
+    def __init__(self):
+        self.upserts = 0
+        self.rows = 0
+
+    def table(self, name):
+        return self
+
+    def upsert(self, rows, on_conflict=None):
+        self.upserts += 1
+        self.rows += len(rows)
+        return self
+
+    async def execute(self):
+        return None
+
+
+# Telegram
+
+class StubTelegramServer:
+    """Local Bot API server answering every method with a plausible result.
+
+    Use `base_url` as TELEGRAM_API_BASE_URL. Call counts per method are
+    kept in `calls`.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.calls = {}
+        self._message_ids = itertools.count(1)
+        self._runner = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/bot"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle(self, request):
+        method = request.match_info["method"]
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        return web.json_response({"ok": True, "result": self._result(method, params)})
+
+    def _result(self, method, params):
+        if method == "getMe":
+            return {"id": 123456, "is_bot": True, "first_name": "Musollah Finder", "username": "benchmark_bot",
+                    "can_join_groups": True, "can_read_all_group_messages": False,
+                    "supports_inline_queries": True}
+        if method == "getWebhookInfo":
+            return {"url": os.getenv("PROD_URL", "") + "webhook", "has_custom_certificate": False,
+                    "pending_update_count": 0}
+        if method in ("sendMessage", "editMessageText"):
+            chat_id = int(params.get("chat_id") or 0)
+            return {
+                "message_id": int(params.get("message_id") or next(self._message_ids)),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": params.get("text", ""),
+            }
+        return True
+
+
+def telegram_update(update_id, user_id, text=None, location=None):
+    """A Telegram webhook update: a private message with `text` or a `(lat, lon)` location."""
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private", "first_name": f"User {user_id}"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"User {user_id}", "username": f"user{user_id}"},
+    }
+    if location is not None:
+        message["location"] = {"latitude": location[0], "longitude": location[1]}
+    else:
+        message["text"] = text
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+def install_stubs(locations):
+    """Wire the stand-ins into the bot's modules (after configure_environment()).
+
+    Returns:
+        The FakeSupabase client, to read its counters
+    """
+    import catalog_service
+    import database_service
+    import http_client
+    import telegram_bot
+
+    sources, async_sources = fake_sources(locations)
+    old_catalog = catalog_service._catalog
+    if old_catalog is not None:
+        old_catalog.stop()
+    catalog_service._catalog = catalog_service.LocationCatalog(sources=sources, async_sources=async_sources)
+
+    http_client._client = httpx.AsyncClient(transport=fake_onemap_transport())
+
+    supabase = FakeSupabase()
+    database_service._async_client = supabase
+    telegram_bot.init_database = lambda: None
+    return supabase
@@ -0,0 +1,574 @@
+import os
+import asyncio
+import threading
+import time
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Tuple, Union
+from dotenv import load_dotenv
+
+from location_service import SOURCE_FETCHERS_IF_CHANGED, SOURCE_FETCHERS_ASYNC, get_scope_sources, location_key
+from spatial_index import SpatialIndex
+from distance_engine import DistanceEngine
+from location_renderer import LocationRenderer
+from location_store import LocationStore, NearestLocation, location_row
+from source_orchestrator import SourceOrchestrator, SourceResult
+from location_merger import merge_locations
+from single_flight import SingleFlight
+from snapshot_file import read_snapshot_file, write_snapshot_file, snapshot_file_id
+
+# Load environment variables
+load_dotenv()
+
+# How long a catalog snapshot is served before the background thread refreshes it
+CATALOG_TTL_SECONDS = float(os.getenv("CATALOG_TTL_SECONDS", "300"))
+
+# Patched snapshots are compacted (rebuilt from scratch) once the number of
+# removed slots and un-indexed changes exceeds this many, plus this fraction
+# of the catalog size, so that query overhead stays bounded
+CATALOG_MAX_PATCH_SIZE = 64
+CATALOG_MAX_PATCH_FRACTION = 0.25
+
+# Snapshot file shared by the worker processes in multi-worker mode (see multi_worker.py):
+# one process loads the catalog and writes every snapshot to this file, and the
+# workers map it and check it for a newer snapshot every poll interval
+CATALOG_SNAPSHOT_PATH = os.getenv("CATALOG_SNAPSHOT_PATH", "cache/catalog.snapshot")
+CATALOG_SNAPSHOT_POLL_SECONDS = float(os.getenv("CATALOG_SNAPSHOT_POLL_SECONDS", "2"))
+
+# Save every new snapshot to CATALOG_SNAPSHOT_PATH and serve the saved one right
+# away after a restart, while the data sources are fetched in the background
+CATALOG_PERSIST_SNAPSHOT = os.getenv("CATALOG_PERSIST_SNAPSHOT", "true").lower() == "true"
+
+# Set for the worker processes by multi_worker.py: serve the snapshot file instead of loading the sources
+CATALOG_FOLLOW_SNAPSHOT = os.getenv("CATALOG_FOLLOW_SNAPSHOT", "false").lower() == "true"
+
+# fetcher(fingerprint) -> (new fingerprint, locations or None if unchanged)
+SourceFetcher = Callable[[Optional[Any]], Tuple[Any, Optional[List[Dict[str, Any]]]]]
+AsyncSourceFetcher = Callable[[], Awaitable[List[Dict[str, Any]]]]
+
+
+class CatalogSnapshot:
+    """Read-only set of locations produced by one successful refresh.
+
+    Snapshots are shared between all concurrent requests, so nothing may
+    mutate a snapshot once built. The locations are kept in a columnar
+    LocationStore; the spatial index (single interactive queries), the
+    distance engine (vectorized batch queries) and the pre-rendered HTML
+    fragments are built here, once per snapshot. All of them address
+    locations by their position in `locations`.
+
+    Snapshots created with `patched()` keep every unchanged location at the
+    same position, so removed locations leave a None slot in `locations` and
+    `len(snapshot)` counts live locations only.
+    """
+
+    __slots__ = ("version", "locations", "loaded_at", "index", "engine", "renderer")
+
+    def __init__(self, version: int, locations: Union[LocationStore, List[Dict[str, Any]]], loaded_at: float,
+                 index: Optional[SpatialIndex] = None,
+                 engine: Optional[DistanceEngine] = None,
+                 renderer: Optional[LocationRenderer] = None):
+        if not isinstance(locations, LocationStore):
+            locations = LocationStore(locations)
+        self.version = version
+        self.locations = locations
+        self.loaded_at = loaded_at
+        if index is None:
+            index = SpatialIndex(list(zip(locations.lats, locations.lons)))
+        if engine is None:
+            engine = DistanceEngine(locations.lats, locations.lons)
+        if renderer is None:
+            renderer = LocationRenderer(locations)
+        self.index = index
+        self.engine = engine
+        self.renderer = renderer
+
+    def __len__(self) -> int:
+        return self.locations.size
+
+    @property
+    def fragmentation(self) -> int:
+        """Number of removed slots plus changes kept outside the spatial index's tree."""
+        return len(self.locations) - self.locations.size + self.index.patch_size
+
+    def nearest(self, lat: float, lon: float, count: int = 1) -> List[NearestLocation]:
+        """Find the `count` locations nearest to (lat, lon), by exact geodesic distance."""
+        return self.locations.nearest(self.index.nearest(lat, lon, count))
+
+    def patched(self, version: int, changes: Dict[int, Optional[Dict[str, Any]]],
+                loaded_at: float) -> "CatalogSnapshot":
+        """Return a new snapshot with some positions added, modified or removed.
+
+        Only the changed positions are re-indexed and re-rendered, and the
+        spatial structures are only touched for locations that moved. The
+        location columns, distance arrays and fragment lists are still copied
+        in full (about 4 ms for 20,000 locations, under 1% of a refresh that
+        diffs the sources); only the spatial index shares its tree.
+
+        Args:
+            version: Version of the new snapshot
+            changes: position -> new location, or None to remove the location
+            loaded_at: Monotonic time the changes were fetched
+        """
+        slots = max(len(self.locations), max(changes, default=-1) + 1)
+        locations = self.locations.patched(changes, slots)
+
+        moved: Dict[int, Optional[Tuple[float, float]]] = {}
+        for position, location in changes.items():
+            previous = self.locations.row(position) if position < len(self.locations) else None
+            if location is None:
+                moved[position] = None
+            elif previous is None or previous[1:3] != (location["lat"], location["lon"]):
+                moved[position] = (location["lat"], location["lon"])
+
+        grown = slots != len(self.locations)
+        return CatalogSnapshot(
+            version, locations, loaded_at,
+            index=self.index.patched(moved) if moved else self.index,
+            engine=self.engine.patched(moved, slots) if moved or grown else self.engine,
+            renderer=self.renderer.patched({position: locations[position] for position in changes}, slots),
+        )
+
+
+def _key_rows(locations: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Key locations by identity (repeated locations get a '#n' suffix)."""
+    rows: Dict[str, Dict[str, Any]] = {}
+    for location in locations:
+        key = base = location_key(location)
+        n = 1
+        while key in rows:
+            n += 1
+            key = f"{base}#{n}"
+        rows[key] = location
+    return rows
+
+
+class LocationCatalog:
+    """Process-wide cache of musollah locations with background TTL refresh.
+
+    The catalog loads once (either when `start()` is called or on the first
+    request) and is then refreshed by a daemon thread every `ttl` seconds.
+
+    Refreshes are incremental. Every source is asked whether its data changed
+    since the fingerprint (content hash, ETag, ...) of the previous fetch;
+    unchanged sources are skipped. When a source changed, the last good
+    locations of all sources are merged (see location_merger) and diffed
+    against the current snapshot so that only added, removed and modified
+    locations are patched into the new snapshot.
+
+    Sources are fetched concurrently with per-source deadlines, retries and
+    circuit breakers (see SourceOrchestrator). If a source fails, its last
+    good rows keep being served.
+
+    The background thread uses the synchronous `sources`; async callers that
+    hit a cold catalog use `async_sources`, and build the snapshot in a worker
+    thread, so the event loop is never blocked.
+    """
+
+    def __init__(self, sources: Optional[Dict[str, SourceFetcher]] = None,
+                 ttl: float = CATALOG_TTL_SECONDS,
+                 async_sources: Optional[Dict[str, AsyncSourceFetcher]] = None):
+        if sources is None:
+            sources = {name: SOURCE_FETCHERS_IF_CHANGED[name] for name in get_scope_sources()}
+        if async_sources is None:
+            async_sources = {name: SOURCE_FETCHERS_ASYNC[name] for name in get_scope_sources()}
+        self._orchestrator = SourceOrchestrator(sources, async_sources)
+        self._cold_loads = SingleFlight()
+        self._ttl = ttl
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.RLock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Set once the background thread's first refresh has finished (see get_snapshot_async())
+        self._first_refresh_done = threading.Event()
+        self._listeners: List[Callable[[CatalogSnapshot], None]] = []
+
+        # Change detection state (guarded by self._lock): per-source fingerprints
+        # and last good locations, and the snapshot position of every merged location
+        self._fingerprints: Dict[str, Any] = {}
+        self._source_locations: Dict[str, List[Dict[str, Any]]] = {}
+        self._slots: Dict[str, int] = {}
+        self._free_slots: List[int] = []
+
+        # Snapshot file the current snapshot was restored from, until the sources replace it
+        self._restored_from: Optional[str] = None
+
+        # Counters exposed through stats()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.unchanged_refreshes = 0
+        self.full_rebuilds = 0
+        self.refresh_failures = 0
+        self.last_change: Dict[str, int] = {}
+        self.last_error: Optional[str] = None
+
+    def add_refresh_listener(self, listener: Callable[[CatalogSnapshot], None]) -> None:
+        """Register a callback invoked with every newly installed snapshot.
+
+        Listeners run on the thread that installed the snapshot (usually the
+        background refresh thread), so they may do moderately expensive work
+        such as updating derived lookup tables.
+        """
+        self._listeners.append(listener)
+
+    def persist_snapshots(self, path: str = CATALOG_SNAPSHOT_PATH) -> bool:
+        """Serve the snapshot saved at `path` right away, and save every new snapshot there.
+
+        The saved snapshot is mapped (see snapshot_file) instead of fetching the
+        data sources, so a restarted process can answer within milliseconds.
+        It is served until the sources have been fetched: the background thread
+        refreshes it as soon as it starts. Call before start(); listeners added
+        before this call are notified of the restored snapshot.
+
+        Returns:
+            True if a saved snapshot was restored
+        """
+        restored = self._restore(path)
+        self.add_refresh_listener(lambda snapshot: save_snapshot(snapshot, path))
+        return restored
+
+    def _restore(self, path: str) -> bool:
+        if snapshot_file_id(path) is None:
+            return False
+        try:
+            data = read_snapshot_file(path)
+        except (OSError, ValueError) as e:
+            print(f"Saved catalog snapshot could not be loaded: {e}")
+            return False
+
+        snapshot = CatalogSnapshot(data.version, data.locations, time.monotonic(), index=data.index,
+                                   engine=data.engine, renderer=data.renderer)
+        with self._lock:
+            if self._snapshot is not None:
+                return False
+            self._snapshot = snapshot
+            self._restored_from = path
+
+        print(f"Catalog snapshot version {snapshot.version} restored from {path} with {len(snapshot)} locations")
+        self._notify(snapshot)
+        return True
+
+    def _restore_slots(self, snapshot: CatalogSnapshot) -> None:
+        """Key the positions of a restored snapshot, so the first refresh patches it (caller holds self._lock).
+
+        Keys of repeated locations may get other '#n' suffixes than before the
+        restart, which only costs a few patched positions.
+        """
+        self._slots = {}
+        self._free_slots = []
+        for position, location in enumerate(snapshot.locations):
+            if location is None:
+                self._free_slots.append(position)
+                continue
+            key = base = location_key(location)
+            n = 1
+            while key in self._slots:
+                n += 1
+                key = f"{base}#{n}"
+            self._slots[key] = position
+
+    def start(self) -> None:
+        """Start the background refresh thread (no-op if already running)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._first_refresh_done.clear()
+        self._thread = threading.Thread(target=self._run, name="location-catalog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background refresh thread."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        # Load immediately unless a request already did (a restored snapshot is
+        # refreshed immediately too), then refresh on every TTL tick
+        try:
+            if self._snapshot is None or self._restored_from:
+                self.refresh()
+        finally:
+            self._first_refresh_done.set()
+        while not self._stop_event.wait(self._ttl):
+            self.refresh()
+
+    def refresh(self) -> bool:
+        """Check every data source for changes and apply them.
+
+        Returns:
+            True if a new snapshot was installed, False if nothing changed or
+            the refresh failed and the previous snapshot (if any) is still
+            being served.
+        """
+        with self._refresh_lock:
+            return self._apply(self._orchestrator.fetch(dict(self._fingerprints)))
+
+    async def refresh_async(self) -> bool:
+        """Reload every data source without blocking the event loop.
+
+        Returns:
+            True if a new snapshot was installed, False otherwise (see refresh()).
+        """
+        # Async results carry no fingerprint: the next background refresh fetches those sources in full once
+        results = await self._orchestrator.fetch_async()
+        # Merging, building the snapshot and the listeners (which save files) take too long for the event loop
+        return await asyncio.to_thread(self._apply_locked, results)
+
+    def _apply_locked(self, results: Dict[str, SourceResult]) -> bool:
+        with self._refresh_lock:
+            return self._apply(results)
+
+    def _apply(self, results: Dict[str, SourceResult]) -> bool:
+        """Merge the sources, diff them against the current snapshot and install the resulting snapshot."""
+        changed = {name: result for name, result in results.items() if result.locations is not None}
+        errors = [f"{name}: {result.error}" for name, result in results.items() if result.error]
+        if errors:
+            self.refresh_failures += 1
+            self.last_error = "; ".join(errors)
+            print(f"Catalog refresh failed for some sources, serving their previous data: {self.last_error}")
+
+        with self._lock:
+            current = self._snapshot
+            changes: Dict[int, Optional[Dict[str, Any]]] = {}
+            added = removed = modified = 0
+            next_slot = len(current.locations) if current else 0
+
+            for name, (fingerprint, locations, _) in changed.items():
+                self._fingerprints[name] = fingerprint
+                self._source_locations[name] = locations
+
+            # Until every source has delivered, a restored snapshot is kept as it is, so that a
+            # source that is still down does not take its locations out of the catalog
+            waiting = self._restored_from is not None and any(
+                name not in self._source_locations for name in self._orchestrator.sources)
+
+            duplicates = 0
+            if changed and not waiting:
+                if self._restored_from:
+                    self._restore_slots(current)
+                # Records of the same place from several sources are merged once per refresh
+                sources = {name: self._source_locations[name] for name in self._orchestrator.sources
+                           if name in self._source_locations}
+                merged = merge_locations(sources)
+                duplicates = sum(len(locations) for locations in sources.values()) - len(merged)
+                new_rows = _key_rows(merged)
+
+                for key in self._slots.keys() - new_rows.keys():
+                    position = self._slots.pop(key)
+                    changes[position] = None
+                    self._free_slots.append(position)
+                    removed += 1
+                for key, location in new_rows.items():
+                    position = self._slots.get(key)
+                    if position is None:
+                        if self._free_slots:
+                            position = self._free_slots.pop()
+                        else:
+                            position = next_slot
+                            next_slot += 1
+                        self._slots[key] = position
+                        changes[position] = location
+                        added += 1
+                    elif current.locations.row(position) != location_row(location):
+                        changes[position] = location
+                        modified += 1
+                self._restored_from = None
+
+            if not changes:
+                if not errors:
+                    self.unchanged_refreshes += 1
+                return False
+
+            version = current.version + 1 if current else 1
+            loaded_at = time.monotonic()
+            if current is None:
+                # First load: every position is new, 0..n-1
+                snapshot = self._rebuild(version, loaded_at, LocationStore(changes[p] for p in range(len(changes))))
+            else:
+                snapshot = current.patched(version, changes, loaded_at)
+                if snapshot.fragmentation > CATALOG_MAX_PATCH_SIZE + CATALOG_MAX_PATCH_FRACTION * len(snapshot):
+                    snapshot = self._rebuild(version, loaded_at, snapshot.locations)
+            self._snapshot = snapshot
+            self.last_change = {"added": added, "removed": removed, "modified": modified,
+                                "duplicates_merged": duplicates}
+
+        self.refreshes += 1
+        if not errors:
+            self.last_error = None
+        print(f"Catalog refreshed: version {version} with {len(snapshot)} locations "
+              f"({added} added, {removed} removed, {modified} modified)")
+
+        self._notify(snapshot)
+        return True
+
+    def _notify(self, snapshot: CatalogSnapshot) -> None:
+        for listener in self._listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                print(f"Error in catalog refresh listener {listener}: {e}")
+
+    def _rebuild(self, version: int, loaded_at: float, locations: LocationStore) -> CatalogSnapshot:
+        """Build a snapshot from scratch with the removed positions compacted away (caller holds self._lock)."""
+        order = sorted(self._slots.items(), key=lambda item: item[1])
+        self._slots = {slot: position for position, (slot, _) in enumerate(order)}
+        self._free_slots = []
+        self.full_rebuilds += 1
+        return CatalogSnapshot(version, LocationStore.from_rows(locations.row(position) for _, position in order), loaded_at)
+
+    def get_snapshot(self) -> Optional[CatalogSnapshot]:
+        """Return the current snapshot, loading it synchronously on a cold start."""
+        snapshot = self._snapshot
+        if snapshot is not None:
+            self.hits += 1
+            return snapshot
+
+        self.misses += 1
+        with self._refresh_lock:
+            # Another caller may have finished loading while we waited for the lock
+            if self._snapshot is None:
+                self.refresh()
+        return self._snapshot
+
+    @property
+    def current_snapshot(self) -> Optional[CatalogSnapshot]:
+        """The snapshot currently being served, without loading one or counting a hit."""
+        return self._snapshot
+
+    async def get_snapshot_async(self) -> Optional[CatalogSnapshot]:
+        """Return the current snapshot, loading it asynchronously on a cold start.
+
+        A cold start while the background thread is still loading the catalog
+        waits for that load instead of fetching the sources a second time.
+        """
+        snapshot = self._snapshot
+        if snapshot is not None:
+            self.hits += 1
+            return snapshot
+
+        self.misses += 1
+        # Concurrent cold misses share one load instead of each fetching every source
+        await self._cold_loads.do("catalog", self._load_async)
+        return self._snapshot
+
+    async def _load_async(self) -> None:
+        thread = self._thread
+        if thread is not None and thread.is_alive() and not self._first_refresh_done.is_set():
+            # The background thread is loading the catalog already: wait for it instead of fetching every source twice
+            await asyncio.to_thread(self._first_refresh_done.wait)
+        if self._snapshot is None:
+            await self.refresh_async()
+
+    @property
+    def age_seconds(self) -> Optional[float]:
+        """Seconds since the current snapshot was loaded, or None if nothing is loaded."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        return time.monotonic() - snapshot.loaded_at
+
+    def stats(self) -> Dict[str, Any]:
+        """Return catalog metrics for health and monitoring endpoints."""
+        snapshot = self._snapshot
+        age = self.age_seconds
+        return {
+            "version": snapshot.version if snapshot else 0,
+            "size": len(snapshot) if snapshot else 0,
+            "fragmentation": snapshot.fragmentation if snapshot else 0,
+            "age_seconds": round(age, 1) if age is not None else None,
+            "ttl_seconds": self._ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced_misses": self._cold_loads.coalesced,
+            "refreshes": self.refreshes,
+            "unchanged_refreshes": self.unchanged_refreshes,
+            "full_rebuilds": self.full_rebuilds,
+            "last_change": self.last_change,
+            "refresh_failures": self.refresh_failures,
+            "last_error": self.last_error,
+            "restored_from": self._restored_from,
+            "sources": self._orchestrator.stats(),
+        }
+
+
+class SnapshotFileCatalog(LocationCatalog):
+    """Catalog serving the snapshots another process writes to a snapshot file.
+
+    Used by the worker processes in multi-worker mode: instead of fetching
+    the data sources, every refresh checks whether a new snapshot file was
+    written (see save_snapshot()) and maps it. The location columns, the
+    spatial index's tree, the distance engine's arrays and the pre-rendered
+    fragments all stay in the read-only mapping shared by all workers,
+    instead of each worker rebuilding its own copy.
+    """
+
+    def __init__(self, path: str = CATALOG_SNAPSHOT_PATH, poll_interval: float = CATALOG_SNAPSHOT_POLL_SECONDS):
+        super().__init__(sources={}, ttl=poll_interval, async_sources={})
+        self._path = path
+        self._file_id = None
+
+    def refresh(self) -> bool:
+        """Map the snapshot file if a new one was written since the last refresh.
+
+        Returns:
+            True if a new snapshot was installed, False otherwise
+        """
+        with self._refresh_lock:
+            file_id = snapshot_file_id(self._path)
+            if file_id is not None and file_id == self._file_id:
+                self.unchanged_refreshes += 1
+                return False
+            try:
+                if file_id is None:
+                    raise FileNotFoundError(f"no catalog snapshot at {self._path} yet")
+                data = read_snapshot_file(self._path)
+            except (OSError, ValueError) as e:
+                self.refresh_failures += 1
+                self.last_error = str(e)
+                print(f"Catalog snapshot could not be loaded: {e}")
+                return False
+
+            snapshot = CatalogSnapshot(data.version, data.locations, time.monotonic(), index=data.index,
+                                       engine=data.engine, renderer=data.renderer)
+            with self._lock:
+                self._snapshot = snapshot
+                self._file_id = file_id
+            self.refreshes += 1
+            self.last_error = None
+
+        print(f"Catalog snapshot version {snapshot.version} mapped from {self._path} with {len(snapshot)} locations")
+        self._notify(snapshot)
+        return True
+
+    def persist_snapshots(self, path: str = CATALOG_SNAPSHOT_PATH) -> bool:
+        """No-op: the snapshot file is written by the process loading the catalog."""
+        return False
+
+    async def refresh_async(self) -> bool:
+        """Map a new snapshot file without blocking the event loop (see refresh())."""
+        return await asyncio.to_thread(self.refresh)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return catalog metrics for health and monitoring endpoints."""
+        stats = super().stats()
+        stats["sources"] = None
+        stats["snapshot_file"] = self._path
+        return stats
+
+
+def save_snapshot(snapshot: CatalogSnapshot, path: str = CATALOG_SNAPSHOT_PATH) -> None:
+    """Write a snapshot to the snapshot file (use as a refresh listener of the loading process)."""
+    write_snapshot_file(path, snapshot.version, snapshot.locations, snapshot.index, snapshot.engine, snapshot.renderer)
+
+
+_catalog: Optional[LocationCatalog] = None
+
+
+def get_catalog() -> LocationCatalog:
+    """Return the process-wide location catalog."""
+    global _catalog
+    if _catalog is None:
+        _catalog = SnapshotFileCatalog() if CATALOG_FOLLOW_SNAPSHOT else LocationCatalog()
+    return _catalog
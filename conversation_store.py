@@ -0,0 +1,396 @@
+import os
+import json
+import asyncio
+import time
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+from telegram import Update
+from telegram.ext import ContextTypes, ConversationHandler
+
+# Load environment variables
+load_dotenv()
+
+# Where conversation states and user_data live: "sqlite" (kept across restarts,
+# and shared by every worker process on the machine) or "memory" (this process only)
+CONVERSATION_STORE = os.getenv("CONVERSATION_STORE", "sqlite").lower()
+CONVERSATION_STORE_PATH = os.getenv("CONVERSATION_STORE_PATH", "cache/conversations.sqlite3")
+
+# Conversations and user_data not touched for this long are dropped
+CONVERSATION_TTL_SECONDS = float(os.getenv("CONVERSATION_TTL_SECONDS", "86400"))
+
+# Writes to SQLite are batched and written in the background this often
+# (in multi-worker mode they are written before each update is finished instead)
+CONVERSATION_FLUSH_SECONDS = float(os.getenv("CONVERSATION_FLUSH_SECONDS", "0.2"))
+
+# Expired entries are purged this often
+CONVERSATION_CLEANUP_SECONDS = 600
+
+# Set for the worker processes by multi_worker.py: other processes write to the
+# same SQLite file, so every update reads its entries from the file and writes
+# its changes back before it is finished
+CONVERSATION_STORE_SHARED = os.getenv("CONVERSATION_STORE_SHARED", "false").lower() == "true"
+
+ConversationKey = Tuple[int, ...]
+
+# An entry is addressed by (table, key) and stored as (JSON value, time written)
+EntryKey = Tuple[str, str]
+Entry = Tuple[str, float]
+
+
+class ConversationStore(ABC):
+    """Storage for the state of ConversationHandler flows and users' user_data.
+
+    Values are stored as JSON, so callers always get a copy and mutating what
+    they read never changes the stored data without calling a setter.
+    Implementations provide `_get()` and `_put()` for JSON text entries.
+    """
+
+    def get_state(self, name: str, key: ConversationKey) -> Optional[Any]:
+        """Return the state of conversation `name` for `key`, or None if it is not active."""
+        value = self._get("conversation", json.dumps([name, *key]))
+        return json.loads(value) if value is not None else None
+
+    def set_state(self, name: str, key: ConversationKey, state: Optional[Any]) -> None:
+        """Store the state of a conversation; None ends it."""
+        self._put("conversation", json.dumps([name, *key]), json.dumps(state) if state is not None else None)
+
+    def get_user_data(self, user_id: int) -> Dict[str, Any]:
+        """Return a copy of a user's user_data (empty if none)."""
+        value = self._get("user_data", str(user_id))
+        return json.loads(value) if value is not None else {}
+
+    def set_user_data(self, user_id: int, data: Dict[str, Any]) -> None:
+        """Store a user's user_data; an empty dict deletes it."""
+        self._put("user_data", str(user_id), json.dumps(data) if data else None)
+
+    @abstractmethod
+    def _get(self, table: str, key: str) -> Optional[str]:
+        """Return the JSON text stored for (table, key), or None."""
+
+    @abstractmethod
+    def _put(self, table: str, key: str, value: Optional[str]) -> None:
+        """Store JSON text for (table, key); None deletes the entry."""
+
+    async def load(self, entries: Iterable[EntryKey]) -> None:
+        """Read the entries an update is about to use (no-op for stores that always read from memory)."""
+
+    async def commit(self) -> None:
+        """Write the changes made so far before the update is finished (no-op for write-behind stores)."""
+
+    def close(self) -> None:
+        """Write out anything still pending (no-op for stores without pending writes)."""
+
+    def stats(self) -> Dict[str, Any]:
+        """Return store metrics for health and monitoring endpoints."""
+        return {}
+
+
+class MemoryConversationStore(ConversationStore):
+    """Conversation store kept in process memory (lost on restart, single process only).
+
+    Entries expire `ttl` seconds after they were last written; expired
+    entries are ignored on read and purged every CONVERSATION_CLEANUP_SECONDS.
+    """
+
+    def __init__(self, ttl: float = CONVERSATION_TTL_SECONDS):
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[EntryKey, Entry] = {}
+        self._last_cleanup = time.time()
+
+        # Counters exposed through stats()
+        self.expired = 0
+
+    def _get(self, table: str, key: str) -> Optional[str]:
+        entry = self._entries.get((table, key))
+        if entry is None or time.time() - entry[1] > self._ttl:
+            return None
+        return entry[0]
+
+    def _put(self, table: str, key: str, value: Optional[str]) -> None:
+        now = time.time()
+        with self._lock:
+            if value is None:
+                self._entries.pop((table, key), None)
+            else:
+                self._entries[(table, key)] = (value, now)
+        if now - self._last_cleanup > CONVERSATION_CLEANUP_SECONDS:
+            self._expire_entries()
+
+    def cleanup(self) -> int:
+        """Purge expired entries; returns how many were removed."""
+        return self._expire_entries()
+
+    def _expire_entries(self) -> int:
+        cutoff = time.time() - self._ttl
+        with self._lock:
+            self._last_cleanup = time.time()
+            expired = [entry_key for entry_key, (_, written_at) in self._entries.items() if written_at < cutoff]
+            for entry_key in expired:
+                del self._entries[entry_key]
+        self.expired += len(expired)
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", "entries": len(self._entries), "expired": self.expired}
+
+
+class SQLiteConversationStore(MemoryConversationStore):
+    """Conversation store persisted in a SQLite file, so flows survive restarts.
+
+    Handlers never wait on the disk: reads are served from memory (every
+    unexpired entry is loaded once at startup), and writes update memory and
+    are queued for a background thread that writes them in one transaction
+    every `flush_interval` seconds. At most the last `flush_interval` seconds
+    of changes are lost if the process crashes; `close()` writes out the rest.
+
+    With `shared=True` (multi-worker mode) other processes write to the same
+    file, and the next update of a conversation may reach any of them. Then
+    nothing is loaded at startup: `load()` reads the entries of each update
+    from the file before its handlers run, and `commit()` writes its changes
+    before it is finished, both in a thread so the event loop never waits on
+    the disk.
+    """
+
+    def __init__(self, path: str = CONVERSATION_STORE_PATH, ttl: float = CONVERSATION_TTL_SECONDS,
+                 flush_interval: float = CONVERSATION_FLUSH_SECONDS, shared: bool = CONVERSATION_STORE_SHARED):
+        super().__init__(ttl)
+        self._path = path
+        self._shared = shared
+        self._flush_interval = flush_interval
+        self._pending: Dict[EntryKey, Tuple[Optional[str], float]] = {}
+        self._db_lock = threading.Lock()
+        # Held from taking the pending changes until they are written, so that
+        # a commit() finding nothing pending knows every earlier change is written
+        self._flush_lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        # WAL lets workers read while another one writes, and makes each commit cheap
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS conversation_entries ("
+            "kind TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, updated_at REAL NOT NULL, "
+            "PRIMARY KEY (kind, key))"
+        )
+        self._db.commit()
+        if not shared:
+            rows = self._db.execute(
+                "SELECT kind, key, value, updated_at FROM conversation_entries WHERE updated_at >= ?",
+                (time.time() - ttl,),
+            ).fetchall()
+            self._entries = {(kind, key): (value, updated_at) for kind, key, value, updated_at in rows}
+
+        # Counters exposed through stats()
+        self.flushes = 0
+        self.flushed_entries = 0
+        self.flush_errors = 0
+
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="conversation-store", daemon=True)
+        self._thread.start()
+
+    def _put(self, table: str, key: str, value: Optional[str]) -> None:
+        super()._put(table, key, value)
+        with self._lock:
+            self._pending[(table, key)] = (value, time.time())
+
+    async def load(self, entries: Iterable[EntryKey]) -> None:
+        if self._shared:
+            await asyncio.to_thread(self._read_entries, list(entries))
+
+    def _read_entries(self, entries: List[EntryKey]) -> None:
+        with self._db_lock:
+            rows = [
+                self._db.execute(
+                    "SELECT value, updated_at FROM conversation_entries WHERE kind = ? AND key = ?", entry_key
+                ).fetchone()
+                for entry_key in entries
+            ]
+        with self._lock:
+            for entry_key, row in zip(entries, rows):
+                if entry_key in self._pending:
+                    continue  # Changed by this process and not written yet
+                if row is None:
+                    self._entries.pop(entry_key, None)
+                else:
+                    self._entries[entry_key] = row
+
+    async def commit(self) -> None:
+        if self._shared:
+            await asyncio.to_thread(self.flush)
+
+    def _run(self) -> None:
+        last_cleanup = time.time()
+        while not self._stop_event.wait(self._flush_interval):
+            self.flush()
+            if time.time() - last_cleanup > CONVERSATION_CLEANUP_SECONDS:
+                last_cleanup = time.time()
+                self.cleanup()
+
+    def flush(self) -> None:
+        """Write all pending changes to the file in one transaction."""
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        upserts: List[Tuple[str, str, str, float]] = []
+        deletes: List[Tuple[str, str]] = []
+        for (table, key), (value, written_at) in pending.items():
+            if value is None:
+                deletes.append((table, key))
+            else:
+                upserts.append((table, key, value, written_at))
+        try:
+            with self._db_lock:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO conversation_entries (kind, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                    upserts,
+                )
+                self._db.executemany("DELETE FROM conversation_entries WHERE kind = ? AND key = ?", deletes)
+                self._db.commit()
+            self.flushes += 1
+            self.flushed_entries += len(pending)
+        except sqlite3.Error as e:
+            self.flush_errors += 1
+            print(f"Error writing {len(pending)} conversation entries to {self._path}: {e}")
+            # Keep the changes for the next flush, unless they were overwritten meanwhile
+            with self._lock:
+                for entry_key, change in pending.items():
+                    self._pending.setdefault(entry_key, change)
+
+    def cleanup(self) -> int:
+        """Purge expired entries from memory and from the file; returns how many were removed."""
+        removed = self._expire_entries()
+        try:
+            with self._db_lock:
+                cursor = self._db.execute(
+                    "DELETE FROM conversation_entries WHERE updated_at < ?", (time.time() - self._ttl,)
+                )
+                self._db.commit()
+            if self._shared:
+                # Entries here are only copies of the ones read by recent updates
+                removed = cursor.rowcount
+                self.expired += removed
+        except sqlite3.Error as e:
+            print(f"Error purging expired conversation entries from {self._path}: {e}")
+        return removed
+
+    def close(self) -> None:
+        """Stop the background writer and write out all pending changes."""
+        self._stop_event.set()
+        self._thread.join(timeout=5)
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "sqlite",
+            "shared": self._shared,
+            "entries": len(self._entries),
+            "pending": len(self._pending),
+            "flushes": self.flushes,
+            "flushed_entries": self.flushed_entries,
+            "flush_errors": self.flush_errors,
+            "expired": self.expired,
+        }
+
+
+_store: Optional[ConversationStore] = None
+
+
+def get_conversation_store() -> ConversationStore:
+    """Return the process-wide conversation store selected by CONVERSATION_STORE."""
+    global _store
+    if _store is None:
+        if CONVERSATION_STORE == "sqlite":
+            _store = SQLiteConversationStore()
+        elif CONVERSATION_STORE == "memory":
+            _store = MemoryConversationStore()
+        else:
+            raise ValueError(f"Unknown CONVERSATION_STORE: {CONVERSATION_STORE} (expected memory or sqlite)")
+    return _store
+
+
+class StoredConversationHandler(ConversationHandler):
+    """ConversationHandler whose states live in the conversation store.
+
+    The state of a conversation is read from the store before every update
+    is checked and written back after it was handled, so conversations
+    survive restarts and consecutive updates of one conversation can be
+    handled by different worker processes (`load_user_data` reads the states
+    an update needs beforehand). Handlers need a `name` and must be blocking
+    (the default).
+
+    PTB's own persistence (BasePersistence) cannot be used for this: a
+    ConversationHandler reads the persisted states once, when the application
+    is initialized, so a worker would never see a conversation another worker
+    started. This class instead fills in the handler's `_conversations` and
+    uses its `_get_key()`, which are not public API; python-telegram-bot is
+    pinned to an exact version in requirements.txt, and
+    tests/test_conversation_store.py fails if either one changes.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not (isinstance(getattr(self, "_conversations", None), dict) and callable(getattr(self, "_get_key", None))):
+            raise RuntimeError("This python-telegram-bot version has no ConversationHandler._conversations "
+                               "or _get_key(), which StoredConversationHandler needs; see requirements.txt")
+
+    def check_update(self, update: object) -> Optional[Any]:
+        if isinstance(update, Update) and update.effective_chat and update.effective_user:
+            key = self._get_key(update)
+            state = get_conversation_store().get_state(self.name, key)
+            if state is None:
+                self._conversations.pop(key, None)
+            else:
+                self._conversations[key] = state
+        return super().check_update(update)
+
+    async def handle_update(self, update, application, check_result, context):
+        try:
+            return await super().handle_update(update, application, check_result, context)
+        finally:
+            key = check_result[1]
+            store = get_conversation_store()
+            store.set_state(self.name, key, self._conversations.get(key))
+            await store.commit()
+
+
+def _update_entries(update: Update, context: ContextTypes.DEFAULT_TYPE) -> List[EntryKey]:
+    """The entries handling `update` reads: the user's user_data and the state of every stored conversation."""
+    entries = [("user_data", str(update.effective_user.id))]
+    if update.effective_chat:
+        for handlers in context.application.handlers.values():
+            for handler in handlers:
+                if isinstance(handler, StoredConversationHandler):
+                    entries.append(("conversation", json.dumps([handler.name, *handler._get_key(update)])))
+    return entries
+
+
+async def load_user_data(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Replace the user's user_data with the stored copy (register before every other handler)."""
+    if update.effective_user:
+        store = get_conversation_store()
+        await store.load(_update_entries(update, context))
+        stored = store.get_user_data(update.effective_user.id)
+        context.user_data.clear()
+        context.user_data.update(stored)
+
+
+async def save_user_data(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Store the user's user_data if a handler changed it (register after every other handler)."""
+    if update.effective_user:
+        store = get_conversation_store()
+        if store.get_user_data(update.effective_user.id) != context.user_data:
+            store.set_user_data(update.effective_user.id, dict(context.user_data))
+        await store.commit()
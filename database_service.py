@@ -1,5 +1,5 @@
 import os
-from supabase import create_client, Client
+from supabase import create_client, acreate_client, Client, AsyncClient
 from datetime import datetime
 
 # Initialize Supabase client
@@ -13,6 +13,23 @@ def get_supabase_client() -> Client:
     
     return create_client(url, key)
 
+_async_client = None
+
+async def get_async_supabase_client() -> AsyncClient:
+    """Return the shared async Supabase client, creating it on first use"""
+    global _async_client
+    if _async_client is not None:
+        return _async_client
+    
+    url = os.getenv('SUPABASE_URL')
+    key = os.getenv('SUPABASE_ANON_KEY')
+    
+    if not url or not key:
+        raise ValueError('SUPABASE_URL and SUPABASE_ANON_KEY must be set')
+    
+    _async_client = await acreate_client(url, key)
+    return _async_client
+
 def init_database():
     """Initialize users table in Supabase"""
     try:
@@ -0,0 +1,144 @@
+"""
+Vectorized haversine distance engine for batch proximity queries.
+
+Coordinates are kept as contiguous NumPy arrays (in radians, with the cosine
+of each latitude precomputed) so that the distances from one or many query
+points to every location are computed in a single vectorized call, and the
+top-k is selected with `argpartition` instead of a full sort.
+
+Accuracy:
+    Haversine treats the Earth as a sphere with the mean radius
+    (6371.0088 km), while geopy's `geodesic` uses the WGS-84 ellipsoid.
+    Around Singapore (~1.3°N) this overestimates north-south distances by up
+    to ~0.56% and underestimates east-west distances by up to ~0.11%, i.e. at
+    most ~6 m per kilometer. Rankings only differ for locations whose
+    geodesic distances are within that margin of each other. Use
+    `SpatialIndex.nearest(..., exact=True)` when distances shown to users
+    must match geodesic exactly. tests/test_distance_engine.py checks the
+    gap against geodesic on random points.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+# Mean Earth radius in kilometers (IUGG), matching spatial_index.KM_PER_DEGREE
+EARTH_RADIUS_KM = 6371.0088
+
+# Maximum size of one (query points x locations) distance block in nearest_batch
+BATCH_BLOCK_ELEMENTS = 4_000_000
+
+
+class DistanceEngine:
+    """Haversine distances from query points to a fixed set of locations."""
+
+    def __init__(self, lats: Sequence[float], lons: Sequence[float]):
+        self._lat = np.radians(np.ascontiguousarray(lats, dtype=np.float64))
+        self._lon = np.radians(np.ascontiguousarray(lons, dtype=np.float64))
+        self._cos_lat = np.cos(self._lat)
+
+    @classmethod
+    def from_arrays(cls, lat: Sequence[float], lon: Sequence[float], cos_lat: Sequence[float]) -> "DistanceEngine":
+        """Wrap the `arrays` of another engine without converting or copying them.
+
+        Any float64 buffers work, e.g. views of a memory-mapped file (see snapshot_file).
+        """
+        engine = object.__new__(cls)
+        engine._lat = np.frombuffer(lat, dtype=np.float64)
+        engine._lon = np.frombuffer(lon, dtype=np.float64)
+        engine._cos_lat = np.frombuffer(cos_lat, dtype=np.float64)
+        return engine
+
+    @property
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """The (latitudes, longitudes, cosines of the latitudes) in radians; see from_arrays()."""
+        return self._lat, self._lon, self._cos_lat
+
+    def __len__(self) -> int:
+        return self._lat.shape[0]
+
+    def patched(self, changes: Dict[int, Optional[Tuple[float, float]]], size: int) -> "DistanceEngine":
+        """Return a new engine with some positions moved, added or removed.
+
+        Only the changed positions are converted; the rest of the arrays are
+        copied as-is (a memcpy, well under a millisecond for 20,000 locations),
+        since the vectorized queries need each array in one contiguous block.
+        Removed positions hold NaN and are never returned.
+
+        Args:
+            changes: position -> new (lat, lon), or None to remove the position
+            size: Total number of positions (including removed ones)
+        """
+        engine = object.__new__(DistanceEngine)
+        engine._lat = np.full(size, np.nan)
+        engine._lon = np.full(size, np.nan)
+        kept = min(size, len(self))
+        engine._lat[:kept] = self._lat[:kept]
+        engine._lon[:kept] = self._lon[:kept]
+        for position, coordinates in changes.items():
+            if coordinates is None:
+                engine._lat[position] = engine._lon[position] = np.nan
+            else:
+                engine._lat[position], engine._lon[position] = np.radians(coordinates)
+        engine._cos_lat = np.cos(engine._lat)
+        return engine
+
+    def distance_matrix(self, lats: Sequence[float], lons: Sequence[float]) -> np.ndarray:
+        """Return an (N query points x M locations) array of distances in km."""
+        q_lat = np.radians(np.asarray(lats, dtype=np.float64))[:, None]
+        q_lon = np.radians(np.asarray(lons, dtype=np.float64))[:, None]
+
+        a = (np.sin((self._lat - q_lat) * 0.5) ** 2
+             + np.cos(q_lat) * self._cos_lat * np.sin((self._lon - q_lon) * 0.5) ** 2)
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    def distances(self, lat: float, lon: float) -> np.ndarray:
+        """Return the distance in km from (lat, lon) to every location."""
+        return self.distance_matrix([lat], [lon])[0]
+
+    @staticmethod
+    def _top_k(distances: np.ndarray, k: int) -> np.ndarray:
+        """Return the positions of the k smallest values of each row, nearest first."""
+        if k < distances.shape[1]:
+            part = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        else:
+            part = np.broadcast_to(np.arange(distances.shape[1]), distances.shape)
+        part_distances = np.take_along_axis(distances, part, axis=1)
+        return np.take_along_axis(part, np.argsort(part_distances, axis=1, kind="stable"), axis=1)
+
+    def nearest(self, lat: float, lon: float, k: int = 1) -> List[Tuple[float, int]]:
+        """Find the k locations nearest to (lat, lon).
+
+        Returns:
+            List of (distance in km, position) pairs sorted by distance
+        """
+        return self.nearest_batch([(lat, lon)], k)[0]
+
+    def nearest_batch(self, points: Sequence[Tuple[float, float]], k: int = 1) -> List[List[Tuple[float, int]]]:
+        """Find the k nearest locations for each of N query points.
+
+        Queries are processed in blocks so that memory stays bounded by
+        BATCH_BLOCK_ELEMENTS regardless of the number of points.
+
+        Args:
+            points: (lat, lon) query points
+            k: Number of results per query point
+
+        Returns:
+            One list of (distance in km, position) pairs per query point,
+            each sorted by distance
+        """
+        if k <= 0 or len(self) == 0:
+            return [[] for _ in points]
+
+        coords = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        block = max(1, BATCH_BLOCK_ELEMENTS // len(self))
+        results = []
+        for start in range(0, coords.shape[0], block):
+            chunk = coords[start:start + block]
+            distances = self.distance_matrix(chunk[:, 0], chunk[:, 1])
+            top = self._top_k(distances, k)
+            top_distances = np.take_along_axis(distances, top, axis=1)
+            for row_positions, row_distances in zip(top.tolist(), top_distances.tolist()):
+                # NaN marks removed positions (sorted last by argpartition/argsort)
+                results.append([(d, p) for d, p in zip(row_distances, row_positions) if d == d])
+        return results
+
@@ -0,0 +1,260 @@
+import os
+import csv
+import time
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Tuple, Dict, Any
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Location of the persistent cache and the number of entries kept in memory
+GEOCODE_CACHE_PATH = os.getenv("GEOCODE_CACHE_PATH", "cache/geocode.sqlite3")
+GEOCODE_CACHE_SIZE = int(os.getenv("GEOCODE_CACHE_SIZE", "10000"))
+
+# Postal codes OneMap does not know are remembered for this long (they may be new buildings)
+GEOCODE_NEGATIVE_TTL_SECONDS = float(os.getenv("GEOCODE_NEGATIVE_TTL_SECONDS", "86400"))
+
+# Returned by GeocodeCache.get() for a postal code cached as not found
+NOT_FOUND: Tuple[()] = ()
+
+
+def normalize_postal_code(postal_code: str) -> str:
+    """Strip whitespace and restore leading zeros lost by spreadsheets (e.g. 18956 -> 018956)."""
+    return postal_code.strip().zfill(6)
+
+
+class GeocodeCache:
+    """Postal code -> (lat, lon) cache with an in-memory LRU backed by SQLite.
+
+    Singapore postal codes almost never move, so entries never expire. Lookups
+    are served from memory when possible, then from the SQLite file (and
+    promoted into memory), and only go to the network when both miss. Postal
+    codes that were not found are cached too, for `negative_ttl` seconds.
+
+    The async methods answer memory hits right away and do any SQLite work in
+    a thread, so the event loop never waits on the disk.
+    """
+
+    def __init__(self, path: str = GEOCODE_CACHE_PATH, max_size: int = GEOCODE_CACHE_SIZE,
+                 negative_ttl: float = GEOCODE_NEGATIVE_TTL_SECONDS):
+        self._path = path
+        self._max_size = max_size
+        self._negative_ttl = negative_ttl
+        self._memory: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        # Postal codes cached as not found -> time (time.time()) the entry expires
+        self._missing: "OrderedDict[str, float]" = OrderedDict()
+        # Guards the in-memory entries; _db_lock guards the connection, so the
+        # event loop never waits for a query while checking memory
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        # WAL keeps reads from waiting on writes and makes each commit cheap
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS postal_codes ("
+            "postal_code TEXT PRIMARY KEY, lat REAL NOT NULL, lon REAL NOT NULL, updated_at TEXT)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS missing_postal_codes (postal_code TEXT PRIMARY KEY, checked_at REAL NOT NULL)"
+        )
+        self._db.commit()
+        # Number of postal codes in the file, counted once here and kept up to date by this
+        # process's writes (so stats() never queries the file; another worker's writes are
+        # only counted after a restart)
+        self._stored = self._db.execute("SELECT COUNT(*) FROM postal_codes").fetchone()[0]
+
+        # Counters exposed through stats()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def _remember(self, entries: "OrderedDict[str, Any]", postal_code: str, value: Any) -> None:
+        # Caller must hold self._lock
+        entries[postal_code] = value
+        entries.move_to_end(postal_code)
+        if len(entries) > self._max_size:
+            entries.popitem(last=False)
+
+    def _get_memory(self, postal_code: str) -> Optional[Tuple[float, ...]]:
+        """Return the in-memory entry of a normalized postal code (see get()), or None."""
+        with self._lock:
+            coordinates = self._memory.get(postal_code)
+            if coordinates is not None:
+                self._memory.move_to_end(postal_code)
+                self.memory_hits += 1
+                return coordinates
+            expires_at = self._missing.get(postal_code)
+            if expires_at is not None:
+                if expires_at > time.time():
+                    self.negative_hits += 1
+                    return NOT_FOUND
+                del self._missing[postal_code]
+        return None
+
+    def _get_disk(self, postal_code: str) -> Optional[Tuple[float, ...]]:
+        """Look up a normalized postal code in the SQLite file and promote it into memory."""
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT lat, lon FROM postal_codes WHERE postal_code = ?", (postal_code,)
+            ).fetchone()
+            missing = None if row is not None else self._db.execute(
+                "SELECT checked_at FROM missing_postal_codes WHERE postal_code = ?", (postal_code,)
+            ).fetchone()
+
+        with self._lock:
+            if row is not None:
+                coordinates = (row[0], row[1])
+                self._remember(self._memory, postal_code, coordinates)
+                self.disk_hits += 1
+                return coordinates
+            if missing is not None and missing[0] + self._negative_ttl > time.time():
+                self._remember(self._missing, postal_code, missing[0] + self._negative_ttl)
+                self.negative_hits += 1
+                return NOT_FOUND
+            self.misses += 1
+            return None
+
+    def get(self, postal_code: str) -> Optional[Tuple[float, ...]]:
+        """Return the cached (lat, lon) for a postal code.
+
+        Returns:
+            (lat, lon), NOT_FOUND if the postal code is cached as not found,
+            or None if it is not cached
+        """
+        postal_code = normalize_postal_code(postal_code)
+        cached = self._get_memory(postal_code)
+        return cached if cached is not None else self._get_disk(postal_code)
+
+    async def get_async(self, postal_code: str) -> Optional[Tuple[float, ...]]:
+        """Like get(), reading the SQLite file in a thread on a memory miss."""
+        postal_code = normalize_postal_code(postal_code)
+        cached = self._get_memory(postal_code)
+        return cached if cached is not None else await asyncio.to_thread(self._get_disk, postal_code)
+
+    def put(self, postal_code: str, lat: float, lon: float) -> None:
+        """Store the coordinates of a postal code in memory and on disk."""
+        postal_code = normalize_postal_code(postal_code)
+        with self._lock:
+            self._missing.pop(postal_code, None)
+            self._remember(self._memory, postal_code, (lat, lon))
+        self._write(postal_code, (lat, lon))
+
+    def put_missing(self, postal_code: str) -> None:
+        """Remember that a postal code was not found, for the negative TTL."""
+        postal_code = normalize_postal_code(postal_code)
+        now = time.time()
+        with self._lock:
+            self._memory.pop(postal_code, None)
+            self._remember(self._missing, postal_code, now + self._negative_ttl)
+        self._write(postal_code, None, now)
+
+    async def put_async(self, postal_code: str, lat: float, lon: float) -> None:
+        """Like put(), writing the SQLite file in a thread."""
+        await asyncio.to_thread(self.put, postal_code, lat, lon)
+
+    async def put_missing_async(self, postal_code: str) -> None:
+        """Like put_missing(), writing the SQLite file in a thread."""
+        await asyncio.to_thread(self.put_missing, postal_code)
+
+    def _write(self, postal_code: str, coordinates: Optional[Tuple[float, float]], checked_at: float = 0.0) -> None:
+        with self._db_lock:
+            if coordinates is None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO missing_postal_codes (postal_code, checked_at) VALUES (?, ?)",
+                    (postal_code, checked_at),
+                )
+            else:
+                stored = self._db.execute(
+                    "SELECT 1 FROM postal_codes WHERE postal_code = ?", (postal_code,)
+                ).fetchone()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO postal_codes (postal_code, lat, lon, updated_at) VALUES (?, ?, ?, ?)",
+                    (postal_code, *coordinates, datetime.now().isoformat()),
+                )
+                self._db.execute("DELETE FROM missing_postal_codes WHERE postal_code = ?", (postal_code,))
+            self._db.commit()
+            if coordinates is not None and stored is None:
+                self._stored += 1
+
+    def preload_csv(self, csv_path: str) -> int:
+        """Bulk load postal codes from a CSV file with postal_code, lat, lon columns.
+
+        Rows that cannot be parsed (such as a header row) are skipped.
+
+        Returns:
+            Number of postal codes loaded
+        """
+        rows = []
+        now = datetime.now().isoformat()
+        with open(csv_path, newline='') as f:
+            for row in csv.reader(f):
+                try:
+                    rows.append((normalize_postal_code(row[0]), float(row[1]), float(row[2]), now))
+                except (ValueError, IndexError):
+                    continue
+
+        with self._db_lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO postal_codes (postal_code, lat, lon, updated_at) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._db.executemany(
+                "DELETE FROM missing_postal_codes WHERE postal_code = ?", [(row[0],) for row in rows]
+            )
+            self._db.commit()
+            self._stored = self._db.execute("SELECT COUNT(*) FROM postal_codes").fetchone()[0]
+        with self._lock:
+            # Drop any stale in-memory copies of the reloaded codes
+            for postal_code, _, _, _ in rows:
+                self._memory.pop(postal_code, None)
+                self._missing.pop(postal_code, None)
+        return len(rows)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache metrics for health and monitoring endpoints (never touches the SQLite file)."""
+        return {
+            "memory_entries": len(self._memory),
+            "missing_entries": len(self._missing),
+            "stored_entries": self._stored,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+        }
+
+    def close(self) -> None:
+        with self._db_lock:
+            self._db.close()
+
+
+_cache: Optional[GeocodeCache] = None
+
+
+def get_geocode_cache() -> GeocodeCache:
+    """Return the process-wide geocode cache."""
+    global _cache
+    if _cache is None:
+        _cache = GeocodeCache()
+    return _cache
+
+
+# Bulk preload: python geocode_cache.py postal_codes.csv
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 2:
+        print("Usage: python geocode_cache.py <postal_codes.csv>")
+        sys.exit(1)
+    loaded = get_geocode_cache().preload_csv(sys.argv[1])
+    print(f"Loaded {loaded} postal codes into {GEOCODE_CACHE_PATH}")
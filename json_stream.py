@@ -0,0 +1,100 @@
+import json
+import codecs
+from typing import Any, AsyncIterable, AsyncIterator, Iterable, Iterator, List
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = _WHITESPACE + ",]"
+
+# Parser states: before "[", before the first item or "]", before an item,
+# after an item (before "," or "]"), after "]"
+_START, _FIRST, _ITEM, _AFTER_ITEM, _DONE = range(5)
+
+
+class JSONArrayParser:
+    """Incremental parser for a JSON document that is an array, item by item.
+
+    Feed it the document in chunks of bytes (UTF-8) as they are downloaded;
+    every item is returned as soon as its text is complete, so only one chunk
+    and one unfinished item are buffered at a time, never the whole document.
+    Items are decoded with the standard library's JSON decoder.
+    """
+
+    def __init__(self):
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._state = _START
+
+    def feed(self, data: bytes, final: bool = False) -> List[Any]:
+        """Add the next chunk of the document and return the items completed by it.
+
+        Args:
+            data: Next bytes of the document
+            final: True for the last chunk (an empty chunk at the end is fine)
+
+        Raises:
+            ValueError: If the document is not a JSON array, or (with `final`) is truncated
+        """
+        buffer = self._buffer + self._text.decode(data, final)
+        items = []
+        pos = 0
+        length = len(buffer)
+        state = self._state
+        while True:
+            while pos < length and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos == length:
+                break
+            char = buffer[pos]
+            if state == _START:
+                if char != "[":
+                    raise ValueError(f"Expected a JSON array, found {char!r}")
+                state = _FIRST
+                pos += 1
+            elif state == _AFTER_ITEM or (state == _FIRST and char == "]"):
+                if char == "]":
+                    state = _DONE
+                elif char == "," and state == _AFTER_ITEM:
+                    state = _ITEM
+                else:
+                    raise ValueError(f"Expected ',' or ']' at {pos}, found {char!r}")
+                pos += 1
+            elif state == _DONE:
+                raise ValueError(f"Unexpected data after the end of the array: {char!r}")
+            else:
+                try:
+                    item, end = _decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if final:
+                        raise
+                    break  # The item is not complete yet
+                if (not final and not isinstance(item, (dict, list, str))
+                        and (end == length or buffer[end] not in _DELIMITERS)):
+                    break  # A number cut off by the end of the chunk (1 of 1.5) may continue in the next one
+                items.append(item)
+                state = _AFTER_ITEM
+                pos = end
+
+        self._buffer = buffer[pos:]
+        self._state = state
+        if final and state != _DONE:
+            raise ValueError("Truncated JSON array")
+        return items
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """Yield the items of a JSON array document given as an iterable of byte chunks."""
+    parser = JSONArrayParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.feed(b"", final=True)
+
+
+async def aiter_json_array(chunks: AsyncIterable[bytes]) -> AsyncIterator[Any]:
+    """Yield the items of a JSON array document given as an async iterable of byte chunks."""
+    parser = JSONArrayParser()
+    async for chunk in chunks:
+        for item in parser.feed(chunk):
+            yield item
+    for item in parser.feed(b"", final=True):
+        yield item
@@ -0,0 +1,129 @@
+import os
+import re
+import math
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+from dotenv import load_dotenv
+
+from location_store import FIELDS
+
+# Load environment variables
+load_dotenv()
+
+# Records from different sources closer than this (and with similar names) are the same place
+MERGE_RADIUS_METERS = float(os.getenv("MERGE_RADIUS_METERS", "75"))
+
+# Minimum name similarity (0-1) for two nearby records to be merged
+MERGE_NAME_SIMILARITY = float(os.getenv("MERGE_NAME_SIMILARITY", "0.6"))
+
+# Length of one degree of latitude in meters (mean Earth radius 6371.0088 km)
+METERS_PER_DEGREE = 6371008.8 * math.pi / 180
+
+# Words that say what kind of place it is rather than which place it is
+_GENERIC_WORDS = frozenset({"musollah", "musolla", "musalla", "surau", "prayer", "room", "space", "area", "the", "at"})
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_name(name: Optional[str]) -> Tuple[str, ...]:
+    """Reduce a location name to its distinctive lowercase words."""
+    words = _NON_WORD.sub(" ", (name or "").lower()).split()
+    return tuple(word for word in words if word not in _GENERIC_WORDS)
+
+
+def name_similarity(a: Tuple[str, ...], b: Tuple[str, ...]) -> float:
+    """Similarity (0-1) of two normalized names.
+
+    The best of word overlap (robust to reordering, e.g. "NUS Central Library"
+    vs "Central Library (NUS)") and character similarity (robust to typos and
+    abbreviations). A name without distinctive words matches anything, so
+    e.g. a bare "Musollah" is merged by distance alone.
+    """
+    if not a or not b:
+        return 1.0
+    overlap = len(set(a) & set(b)) / len(set(a) | set(b))
+    return max(overlap, SequenceMatcher(None, " ".join(a), " ".join(b)).ratio())
+
+
+def _merge_fields(members: List[Tuple[str, Mapping[str, Any]]]) -> Dict[str, Any]:
+    """Combine the records of one place, most trusted source first."""
+    _, primary = members[0]
+    merged = {field: primary.get(field) for field in FIELDS}
+    # Name and coordinates come from the most trusted source; for every other
+    # field the most detailed (longest) value of any source wins
+    for field in FIELDS[3:-1]:
+        values = [location.get(field) for _, location in members]
+        values = [value for value in values if value]
+        if values:
+            merged[field] = max(values, key=lambda value: len(str(value)))
+    merged["sources"] = ",".join(name for name, _ in members)
+    return merged
+
+
+def merge_locations(sources: Mapping[str, Sequence[Mapping[str, Any]]],
+                    radius_m: float = MERGE_RADIUS_METERS,
+                    min_similarity: float = MERGE_NAME_SIMILARITY) -> List[Dict[str, Any]]:
+    """Merge the locations of several sources, combining records of the same place.
+
+    Sources are given in order of trust. Each record is matched against the
+    places found so far in other sources, using a grid of `radius_m` cells so
+    only records in the 3x3 neighbouring cells are compared. A record joins
+    the most similarly named place within the radius that has no record from
+    its own source yet (two records of one source are always kept apart,
+    since a building can have several prayer rooms); otherwise it starts a
+    new place.
+
+    Returns:
+        One location dictionary per place with the FIELDS keys, plus
+        "sources": the comma-separated names of the sources it came from
+    """
+    lat_step = radius_m / METERS_PER_DEGREE
+    places: List[List[Tuple[str, Mapping[str, Any]]]] = []
+    anchors: List[Tuple[float, float, Tuple[str, ...]]] = []
+    grid: Dict[Tuple[int, int], List[int]] = {}
+
+    for source, locations in sources.items():
+        for location in locations:
+            lat, lon = location["lat"], location["lon"]
+            lon_step = lat_step / max(math.cos(math.radians(lat)), 1e-6)
+            cell = (math.floor(lat / lat_step), math.floor(lon / lon_step))
+            name = normalize_name(location["name"])
+
+            best, best_score = None, 0.0
+            for dy in (-1, 0, 1):
+                for dx in (-1, 0, 1):
+                    for place in grid.get((cell[0] + dy, cell[1] + dx), ()):
+                        if any(member_source == source for member_source, _ in places[place]):
+                            continue
+                        place_lat, place_lon, place_name = anchors[place]
+                        dy_m = (lat - place_lat) * METERS_PER_DEGREE
+                        dx_m = (lon - place_lon) * METERS_PER_DEGREE * math.cos(math.radians(lat))
+                        if dx_m * dx_m + dy_m * dy_m > radius_m * radius_m:
+                            continue
+                        score = name_similarity(name, place_name)
+                        if score >= min_similarity and (best is None or score > best_score):
+                            best, best_score = place, score
+
+            if best is None:
+                grid.setdefault(cell, []).append(len(places))
+                anchors.append((lat, lon, name))
+                places.append([(source, location)])
+            else:
+                places[best].append((source, location))
+
+    return [_merge_fields(members) for members in places]
+
+
+# For testing purposes
+if __name__ == "__main__":
+    sheets = [
+        {"name": "Central Library Musollah", "lat": 1.29655, "lon": 103.77302, "address": "", "type": "Musollah",
+         "details": "Level 3", "guide": "https://example.com/guide"},
+        {"name": "Central Library Musollah (Level 5)", "lat": 1.29660, "lon": 103.77305, "type": "Musollah"},
+    ]
+    api = [
+        {"name": "NUS Central Library", "lat": 1.29670, "lon": 103.77310,
+         "address": "12 Kent Ridge Crescent, Singapore 119275", "details": "", "type": "Musollah"},
+        {"name": "Somewhere Else", "lat": 1.35, "lon": 103.85, "type": "Musollah"},
+    ]
+    for place in merge_locations({"sheets": sheets, "api": api}):
+        print(place["sources"], "|", place["name"], "|", place["address"], "|", place["details"])
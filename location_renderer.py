@@ -0,0 +1,124 @@
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+
+def get_gmaps_link(location: Dict[str, Any]) -> str:
+    """Extract or generate Google Maps link from location data."""
+    if "google_maps" in location and location["google_maps"]:
+        return location["google_maps"]
+    elif "lat" in location and "lon" in location:
+        return f"https://www.google.com/maps/search/?api=1&query={location['lat']},{location['lon']}"
+    return ''
+
+
+def compile_location(location: Dict[str, Any]) -> Tuple[str, str]:
+    """Pre-render the parts of a location's HTML that do not depend on the query.
+
+    Returns:
+        (head, tail) where the full text is
+        '<b>' + index prefix + head + formatted distance + tail
+    """
+    # Basic location information
+    name = f'{location["name"]}</b>\n'
+    if (not location["type"] or location["type"].lower() == "musollah") and "musollah" not in location["name"].lower():
+        name = f'{location["name"]} Musollah</b>\n'
+
+    # Address and Google Maps link
+    gmaps_link = get_gmaps_link(location)
+    address_line = ""
+    if "address" in location and location["address"]:
+        if gmaps_link:
+            address_line = f'<b>Address:</b> {location["address"]} (<a href="{gmaps_link}">Google Maps</a>)\n'
+        else:
+            address_line = f'<b>Address:</b> {location["address"]}\n'
+    elif gmaps_link:
+        address_line = f'<b>Address:</b> <a href="{gmaps_link}">Google Maps</a>\n'
+
+    # Directions (only if video guide is available)
+    video_guide = location.get("guide", "")
+    directions_line = ""
+    if video_guide:
+        directions_line = f'<b>Directions:</b> <a href="{video_guide}">Directional Video</a>\n'
+    elif location.get("directions"):
+        directions_line = f'<b>Directions:</b> {location.get("directions")}\n'
+
+    # Additional details
+    details = location.get("details", "")
+    details_lines = f'<b>Additional Info:</b> {details}' if details and details.strip() else ""
+
+    head = name + address_line + '<b>Distance:</b> '
+    tail = ' kilometers\n' + directions_line + details_lines
+    return head, tail
+
+
+def render_fragment(head: str, tail: str, distance: float, index: Optional[int] = None) -> str:
+    """Fill the query-specific parts (list index and distance) into a compiled location."""
+    name_prefix = f"{index}. " if index is not None else ""
+    return f'<b>{name_prefix}{head}{distance:.2f}{tail}'
+
+
+class LocationRenderer:
+    """HTML fragments for every location of a catalog snapshot, compiled once.
+
+    Only the distance and the list index change between users, so replies are
+    assembled from the pre-rendered fragments instead of being rebuilt from
+    the location data on every request.
+    """
+
+    def __init__(self, locations: Sequence[Optional[Dict[str, Any]]]):
+        # Removed positions (None) get empty fragments, as in patched()
+        compiled = [compile_location(location) if location is not None else ("", "") for location in locations]
+        self._heads: Sequence[str] = [head for head, _ in compiled]
+        self._tails: Sequence[str] = [tail for _, tail in compiled]
+
+    @classmethod
+    def from_fragments(cls, heads: Sequence[str], tails: Sequence[str]) -> "LocationRenderer":
+        """Wrap the `fragments` of another renderer without compiling or copying them.
+
+        The sequences may be views of a memory-mapped file (see snapshot_file),
+        so a renderer for a snapshot restored from disk is ready at once.
+        """
+        renderer = object.__new__(cls)
+        renderer._heads = heads
+        renderer._tails = tails
+        return renderer
+
+    @property
+    def fragments(self) -> Tuple[Sequence[str], Sequence[str]]:
+        """The compiled (heads, tails) of every position; see from_fragments()."""
+        return self._heads, self._tails
+
+    def patched(self, changes: Dict[int, Optional[Dict[str, Any]]], size: int) -> "LocationRenderer":
+        """Return a new renderer with only the changed positions recompiled.
+
+        Compiling is the expensive part and scales with the change; the
+        fragment lists themselves are copied (pointer copies only, no strings
+        are duplicated), which keeps render() a plain list lookup.
+
+        Args:
+            changes: position -> new location, or None for a removed position
+            size: Total number of positions (including removed ones)
+        """
+        renderer = object.__new__(LocationRenderer)
+        renderer._heads = list(self._heads[:size]) + [""] * (size - len(self._heads))
+        renderer._tails = list(self._tails[:size]) + [""] * (size - len(self._tails))
+        for position, location in changes.items():
+            if location is None:
+                renderer._heads[position] = renderer._tails[position] = ""
+            else:
+                renderer._heads[position], renderer._tails[position] = compile_location(location)
+        return renderer
+
+    def render(self, position: int, distance: float, index: Optional[int] = None) -> str:
+        """Render one location (by snapshot position) at the given distance."""
+        return render_fragment(self._heads[position], self._tails[position], distance, index)
+
+    def render_nearest(self, nearest: List[Tuple[float, int]], count: int) -> str:
+        """Render the reply for a list of (distance, position) pairs sorted by distance."""
+        if count == 1:
+            # Single location response
+            distance, position = nearest[0]
+            return self.render(position, distance)
+
+        # Multiple locations response, separated by a blank line
+        parts = [self.render(position, distance, i) for i, (distance, position) in enumerate(nearest, 1)]
+        return f'<b>🕌 {count} Nearest Prayer Spaces:</b>\n\n' + "\n\n".join(parts)
@@ -1,40 +1,41 @@
 import os
-from typing import List, Dict, Any
-from sheets_service import fetch_locations as fetch_sheets_locations
-from api_service import fetch_api_locations
+from typing import List, Dict, Any, Callable
+from sheets_service import (
+    fetch_locations_async as fetch_sheets_locations_async,
+    fetch_locations_if_changed as fetch_sheets_locations_if_changed,
+)
+from api_service import fetch_api_locations_async, fetch_api_locations_if_changed
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-def fetch_all_locations() -> List[Dict[str, Any]]:
-    """Fetch musollah locations based on the configured scope.
-    
-    This function fetches data from Google Sheets and optionally from the musollah.com API
-    based on the SCOPE environment variable:
-    - If SCOPE is 'sg', data is fetched from both Google Sheets and the API
-    - If SCOPE is 'nus' or undefined, data is fetched only from Google Sheets
-    
-    Returns:
-        List of dictionaries containing musollah location data with keys:
-        - name: Name of the musollah
-        - lat: Latitude (float)
-        - lon: Longitude (float)
-        - directions: Directions to the musollah
-        - details: Additional details about the musollah
-        - google_maps: Google Maps link to the location
-    """
-    # Get the scope from environment variables
-    scope = os.getenv("SCOPE", "nus").lower()
+# Data sources used for each scope
+SCOPE_SOURCES = {
+    "nus": ["sheets"],
+    "sg": ["sheets", "api"],
+}
 
-    data_fetchers = {
-        "nus": [fetch_sheets_locations],
-        "sg": [fetch_sheets_locations, fetch_api_locations]
-    }
-    
-    all_locations = []
-    for fetcher in data_fetchers[scope]:
-        all_locations.extend(fetcher())
-    print(f"Fetched {len(all_locations)} locations for {scope}")
+# Change-aware fetchers: fetcher(fingerprint) -> (fingerprint, locations or None if unchanged)
+SOURCE_FETCHERS_IF_CHANGED: Dict[str, Callable] = {
+    "sheets": fetch_sheets_locations_if_changed,
+    "api": fetch_api_locations_if_changed,
+}
+
+# Non-blocking fetchers: await fetcher() -> locations
+SOURCE_FETCHERS_ASYNC: Dict[str, Callable] = {
+    "sheets": fetch_sheets_locations_async,
+    "api": fetch_api_locations_async,
+}
+
+def get_scope_sources() -> List[str]:
+    """Return the names of the data sources for the configured SCOPE."""
+    return SCOPE_SOURCES[os.getenv("SCOPE", "nus").lower()]
+
+def location_key(location: Dict[str, Any]) -> str:
+    """Return the identity of a location across refreshes.
     
-    return all_locations
\ No newline at end of file
+    Only the name and coordinates affect which locations are nearest, so other
+    fields (address, details, ...) may change without changing the identity.
+    """
+    return f'{location["name"]}|{location["lat"]:.6f}|{location["lon"]:.6f}'
@@ -0,0 +1,271 @@
+import sys
+from array import array
+from collections import namedtuple
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+# Fields of a location, in column order. Both data sources are normalized to
+# these fields (missing fields are None). "sources" records which data sources
+# a location was merged from (see location_merger).
+FIELDS = ("name", "lat", "lon", "address", "directions", "details", "google_maps", "type", "guide", "sources")
+
+# Text columns whose values repeat a lot between locations (building names,
+# "Musollah", ...); their strings are interned so each value is stored once
+INTERNED_FIELDS = ("name", "type", "address", "sources")
+
+_TEXT_FIELDS = tuple(field for field in FIELDS if field not in ("lat", "lon"))
+_POSITIONS = {field: i for i, field in enumerate(FIELDS)}
+
+
+def _intern(value: Any) -> Any:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def location_row(location: Mapping[str, Any]) -> Tuple[Any, ...]:
+    """Normalize a location record or dictionary from any source to a tuple in FIELDS order."""
+    return tuple(location.get(field) for field in FIELDS)
+
+
+class SourceLocation(namedtuple("SourceLocation", FIELDS[:-1])):
+    """Compact, immutable location record, as produced by every data source.
+
+    Has one field per FIELDS entry except "sources", which is only added when
+    the sources are merged. Besides attribute access, it supports the
+    read-only dictionary accessors used on location dictionaries elsewhere
+    (`location["lat"]`, `.get()`, `in`, `.keys()`, `.items()` and
+    `dict(location)`).
+    """
+
+    __slots__ = ()
+
+    _positions = {key: i for i, key in enumerate(FIELDS[:-1])}
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                key = self._positions[key]
+            except KeyError:
+                raise KeyError(key) from None
+        return tuple.__getitem__(self, key)
+
+    def __contains__(self, key) -> bool:
+        return key in self._positions
+
+    def get(self, key: str, default: Any = None) -> Any:
+        position = self._positions.get(key)
+        return default if position is None else tuple.__getitem__(self, position)
+
+    def keys(self) -> Tuple[str, ...]:
+        return self._fields
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        return zip(self._fields, tuple.__iter__(self))
+
+class LocationView:
+    """Read-only view of one location of a LocationStore.
+
+    Supports the dictionary accessors used for location dictionaries
+    (`view["lat"]`, `.get()`, `in`, `.keys()`, `.items()`, `dict(view)`)
+    as well as attributes (`view.lat`). The view holds no copy of the data.
+    """
+
+    __slots__ = ("_store", "id")
+
+    def __init__(self, store: "LocationStore", position: int):
+        self._store = store
+        # Position of the location in its store; stable for as long as the location is unchanged
+        self.id = position
+
+    def __getitem__(self, field: str) -> Any:
+        if field == "lat":
+            return self._store._lats[self.id]
+        if field == "lon":
+            return self._store._lons[self.id]
+        try:
+            return self._store._text[field][self.id]
+        except KeyError:
+            raise KeyError(field) from None
+
+    def __getattr__(self, field: str) -> Any:
+        if field not in _POSITIONS:
+            raise AttributeError(field)
+        return self[field]
+
+    def __contains__(self, field: str) -> bool:
+        return field in _POSITIONS
+
+    def get(self, field: str, default: Any = None) -> Any:
+        return self[field] if field in _POSITIONS else default
+
+    def keys(self) -> Tuple[str, ...]:
+        return FIELDS
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        return zip(FIELDS, self._store.row(self.id))
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, LocationView):
+            return self._store.row(self.id) == other._store.row(other.id)
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self._store.row(self.id))
+
+    def __repr__(self) -> str:
+        return f"LocationView({self.id}, {dict(self)!r})"
+
+
+class NearestLocation(NamedTuple):
+    """A query result: the location and its distance from the query point."""
+    distance: float
+    location: LocationView
+
+
+class LocationStore:
+    """Immutable, columnar storage for the locations of a catalog snapshot.
+
+    Coordinates are kept in two float arrays and every other field in one
+    list per field (with frequently repeated strings interned), instead of one
+    dictionary per location. Locations are addressed by position, which is
+    also their integer id; `store[position]` returns a LocationView, or None
+    for a position whose location was removed by `patched()`.
+
+    Because nothing can be written through a view, query results carry their
+    distance separately (see NearestLocation) and concurrent requests never
+    share mutable state.
+    """
+
+    __slots__ = ("_lats", "_lons", "_text", "_size")
+
+    def __init__(self, locations: Iterable[Optional[Mapping[str, Any]]] = ()):
+        self._lats = array("d")
+        self._lons = array("d")
+        self._text: Dict[str, List[Any]] = {field: [] for field in _TEXT_FIELDS}
+        self._size = 0
+        for location in locations:
+            self._append(location_row(location) if location is not None else None)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Optional[Tuple[Any, ...]]]) -> "LocationStore":
+        """Build a store from rows in FIELDS order (see location_row())."""
+        store = cls()
+        for row in rows:
+            store._append(row)
+        return store
+
+    @classmethod
+    def from_columns(cls, lats: Sequence[float], lons: Sequence[float],
+                     text: Mapping[str, Sequence[Any]]) -> "LocationStore":
+        """Build a store around existing columns (see `text_columns`), without copying them.
+
+        The columns may be any sequences, e.g. views of a memory-mapped file
+        (see snapshot_file); NaN coordinates mark a removed position.
+        """
+        store = object.__new__(cls)
+        store._lats = lats
+        store._lons = lons
+        store._text = {field: text[field] for field in _TEXT_FIELDS}
+        store._size = sum(1 for lat in lats if lat == lat)
+        return store
+
+    @property
+    def text_columns(self) -> Dict[str, Sequence[Any]]:
+        """Every field except the coordinates, one sequence per field (read-only)."""
+        return self._text
+
+    def _append(self, row: Optional[Tuple[Any, ...]]) -> None:
+        if row is None:
+            self._lats.append(float("nan"))
+            self._lons.append(float("nan"))
+            for column in self._text.values():
+                column.append(None)
+            return
+        self._lats.append(row[1])
+        self._lons.append(row[2])
+        for field in _TEXT_FIELDS:
+            value = row[_POSITIONS[field]]
+            self._text[field].append(_intern(value) if field in INTERNED_FIELDS else value)
+        self._size += 1
+
+    def _set(self, position: int, row: Optional[Tuple[Any, ...]]) -> None:
+        live = self._lats[position] == self._lats[position]  # NaN marks a removed position
+        if row is None:
+            self._lats[position] = self._lons[position] = float("nan")
+            for column in self._text.values():
+                column[position] = None
+            self._size -= live
+            return
+        self._lats[position] = row[1]
+        self._lons[position] = row[2]
+        for field in _TEXT_FIELDS:
+            value = row[_POSITIONS[field]]
+            self._text[field][position] = _intern(value) if field in INTERNED_FIELDS else value
+        self._size += not live
+
+    def patched(self, changes: Dict[int, Optional[Mapping[str, Any]]], size: int) -> "LocationStore":
+        """Return a new store with some positions added, modified or removed.
+
+        The columns are copied whole (a flat copy of each array and list, about
+        1 ms for 20,000 locations) rather than shared in chunks: snapshots
+        must stay immutable, and the copy is negligible next to the catalog's
+        diff of the sources, which visits every location anyway.
+
+        Args:
+            changes: position -> new location, or None to remove the location
+            size: Total number of positions (including removed ones)
+        """
+        store = object.__new__(LocationStore)
+        store._lats = array("d", self._lats)
+        store._lons = array("d", self._lons)
+        store._text = {field: list(column) for field, column in self._text.items()}
+        store._size = self._size
+        for _ in range(len(self), size):
+            store._append(None)
+        for position, location in changes.items():
+            store._set(position, location_row(location) if location is not None else None)
+        return store
+
+    def __len__(self) -> int:
+        """Number of positions, including removed ones (see `size` for live locations)."""
+        return len(self._lats)
+
+    @property
+    def size(self) -> int:
+        """Number of live locations."""
+        return self._size
+
+    @property
+    def lats(self) -> Sequence[float]:
+        """Latitude column (NaN for removed positions)."""
+        return self._lats
+
+    @property
+    def lons(self) -> Sequence[float]:
+        """Longitude column (NaN for removed positions)."""
+        return self._lons
+
+    def __getitem__(self, position: int) -> Optional[LocationView]:
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        if self._lats[position] != self._lats[position]:
+            return None
+        return LocationView(self, position)
+
+    def __iter__(self) -> Iterator[Optional[LocationView]]:
+        for position in range(len(self)):
+            yield self[position]
+
+    def row(self, position: int) -> Optional[Tuple[Any, ...]]:
+        """Return the fields of a position as a tuple in FIELDS order, or None if removed."""
+        lat = self._lats[position]
+        if lat != lat:
+            return None
+        text = self._text
+        return (text["name"][position], lat, self._lons[position]) + tuple(
+            text[field][position] for field in FIELDS[3:]
+        )
+
+    def nearest(self, results: Iterable[Tuple[float, int]]) -> List[NearestLocation]:
+        """Turn (distance, position) query results into NearestLocation views."""
+        return [NearestLocation(distance, LocationView(self, position)) for distance, position in results]
@@ -0,0 +1,194 @@
+"""
+Minimal Prometheus-style metrics: counters, histograms and timing decorators.
+
+Metrics are kept in process memory and rendered in the Prometheus text
+exposition format by the webserver's `/metrics` endpoint, so any Prometheus
+compatible scraper (or a plain `curl`) can read them.
+
+Usage:
+    from metrics import timed, UPSTREAM_SECONDS, BOT_COMMANDS
+
+    @timed(UPSTREAM_SECONDS, service="onemap")
+    async def call_onemap(...): ...
+
+    BOT_COMMANDS.inc(command="start")
+"""
+import time
+import asyncio
+import threading
+import functools
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Default latency buckets in seconds (upper bounds), from 5 ms to 30 s
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonically increasing count, optionally split by labels."""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Distribution of observed values (e.g. latencies in seconds), optionally split by labels."""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[LabelValues, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, ([*counts], total, n)) for key, (counts, total, n) in self._series.items())
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {n}")
+        return lines
+
+
+_registry: List[Any] = []
+
+
+def register(metric):
+    """Add a metric to the registry rendered by render_metrics()."""
+    _registry.append(metric)
+    return metric
+
+
+def render_metrics() -> str:
+    """Render every registered metric in the Prometheus text exposition format (0.0.4)."""
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def timed(histogram: Histogram, errors: Optional[Counter] = None, **labels: str) -> Callable:
+    """Decorator recording the duration of every call of a function in `histogram`.
+
+    Works on both regular and async functions. Failed calls are timed too,
+    and additionally counted in `errors` (if given) before the exception is
+    re-raised.
+    """
+    def decorator(fn: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                except Exception:
+                    if errors is not None:
+                        errors.inc(**labels)
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - started, **labels)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                if errors is not None:
+                    errors.inc(**labels)
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started, **labels)
+        return wrapper
+
+    return decorator
+
+
+class Timer:
+    """Context manager recording the duration of a block in `histogram`."""
+
+    __slots__ = ("_histogram", "_labels", "_started")
+
+    def __init__(self, histogram: Histogram, **labels: str):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self) -> "Timer":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._histogram.observe(time.perf_counter() - self._started, **self._labels)
+
+
+# Metrics of the bot (add new ones here so /metrics lists them in one place)
+WEBHOOK_SECONDS = register(Histogram(
+    "musollah_webhook_seconds", "Time to handle a Telegram webhook request", ["mode"]))
+UPDATE_SECONDS = register(Histogram(
+    "musollah_update_processing_seconds", "Time to process one Telegram update"))
+NEAREST_PHASE_SECONDS = register(Histogram(
+    "musollah_nearest_phase_seconds", "Time spent per phase of answering a nearest-musollah query",
+    ["phase"], buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0, 5.0)))
+UPSTREAM_SECONDS = register(Histogram(
+    "musollah_upstream_request_seconds", "Latency of calls to external services", ["service"]))
+UPSTREAM_ERRORS = register(Counter(
+    "musollah_upstream_errors_total", "Failed calls to external services", ["service"]))
+BOT_COMMANDS = register(Counter(
+    "musollah_bot_commands_total", "Bot commands received", ["command"]))
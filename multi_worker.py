@@ -0,0 +1,111 @@
+"""
+Multi-worker mode: run the webserver in several processes to use more than one core.
+
+This process loads the location catalog, keeps the postal code answer table
+up to date and writes every new snapshot to CATALOG_SNAPSHOT_PATH; the
+uvicorn worker processes map that file read-only (see SnapshotFileCatalog)
+and reload the saved answer table, instead of each fetching the data sources
+and updating the table. Conversation states and user_data are kept in the
+shared SQLite conversation store, so an update can be handled by any worker.
+
+Tasks needed once per instance (registering the webhook, the keep-alive
+pings, checking the Supabase table) only run in the primary worker: the
+first one to lock WEB_PRIMARY_LOCK_PATH (see is_primary_process()).
+
+Updates of one chat are only processed strictly in order within a process
+(see update_dispatcher): Telegram may deliver two updates of a chat to two
+workers at once, and the conversation store only makes sure each sees the
+state the other one committed.
+
+Usage:
+    WEB_WORKERS=4 python webserver.py
+    python multi_worker.py [--workers 4] [--host 0.0.0.0] [--port 8000]
+"""
+import os
+import argparse
+from typing import IO, Optional
+
+import uvicorn
+
+from answer_table import get_answer_table
+from catalog_service import LocationCatalog, CATALOG_SNAPSHOT_PATH, CATALOG_PERSIST_SNAPSHOT, save_snapshot
+
+# Set for the worker processes by run_workers(): the worker holding a lock on
+# this file is the primary one (unset when running as a single process)
+WEB_PRIMARY_LOCK_PATH = os.getenv("WEB_PRIMARY_LOCK_PATH")
+
+_primary_lock: Optional[IO] = None
+
+
+def is_primary_process() -> bool:
+    """Whether this process runs the tasks needed once per instance.
+
+    Always True for a single process. In multi-worker mode the first worker
+    to ask locks WEB_PRIMARY_LOCK_PATH and holds the lock until it exits, so
+    a worker started to replace it takes over.
+    """
+    global _primary_lock
+    if not WEB_PRIMARY_LOCK_PATH or _primary_lock is not None:
+        return True
+    import fcntl
+    lock = open(WEB_PRIMARY_LOCK_PATH, "a")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock.close()
+        return False
+    _primary_lock = lock
+    return True
+
+
+def run_workers(workers: int, host: str = "0.0.0.0", port: int = 8000,
+                catalog: Optional[LocationCatalog] = None, snapshot_path: str = CATALOG_SNAPSHOT_PATH) -> None:
+    """Load the catalog in this process and serve webserver.app from `workers` processes.
+
+    Args:
+        workers: Number of uvicorn worker processes
+        host: Interface to listen on
+        port: Port to listen on
+        catalog: Catalog to load and share (defaults to one over the configured data sources)
+        snapshot_path: Snapshot file the workers map
+    """
+    catalog = catalog or LocationCatalog()
+    # Update the answer table before each snapshot is saved, so the workers find it up to date
+    catalog.add_refresh_listener(get_answer_table().update)
+    # The workers start on the snapshot saved by the previous run, if there is one;
+    # otherwise load before they start, so they find a snapshot on their first request
+    if CATALOG_PERSIST_SNAPSHOT:
+        restored = catalog.persist_snapshots(snapshot_path)
+    else:
+        catalog.add_refresh_listener(lambda snapshot: save_snapshot(snapshot, snapshot_path))
+        restored = False
+    if not restored:
+        catalog.refresh()
+    catalog.start()
+
+    # Settings inherited by the worker processes
+    os.environ["CATALOG_FOLLOW_SNAPSHOT"] = "true"
+    os.environ["CATALOG_SNAPSHOT_PATH"] = snapshot_path
+    os.environ["CONVERSATION_STORE_SHARED"] = "true"
+    os.environ["ANSWER_TABLE_FOLLOW_FILE"] = "true"
+    os.environ["WEB_PRIMARY_LOCK_PATH"] = os.path.join(os.path.dirname(snapshot_path) or ".", "primary-worker.lock")
+    if os.getenv("WEBHOOK_FAST_ACK", "false").lower() == "true":
+        print("Note: with WEBHOOK_FAST_ACK, updates of one chat are only processed in order within each "
+              "worker; two updates of a chat that reach different workers may be processed concurrently")
+    if os.getenv("CONVERSATION_STORE", "sqlite").lower() == "memory":
+        print("Warning: CONVERSATION_STORE=memory keeps each worker's conversations to itself; "
+              "multi-step commands break when their updates reach different workers")
+
+    try:
+        uvicorn.run("webserver:app", host=host, port=port, workers=workers)
+    finally:
+        catalog.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_WORKERS", "2")))
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    run_workers(args.workers, args.host, args.port)
@@ -0,0 +1,136 @@
+import os
+import math
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+from spatial_index import KM_PER_DEGREE, RERANK_MARGIN, geodesic_km
+
+# Load environment variables
+load_dotenv()
+
+# Size of the map cells results are cached for, and number of cells kept (0 disables the cache)
+NEAREST_CACHE_CELL_METERS = float(os.getenv("NEAREST_CACHE_CELL_METERS", "50"))
+NEAREST_CACHE_SIZE = int(os.getenv("NEAREST_CACHE_SIZE", "10000"))
+
+# (lat cell, lon cell, count)
+CellKey = Tuple[int, int, int]
+
+# The locations that can be among the nearest ones anywhere in a cell, as
+# (position, lat, lon), or None if there are too many of them
+CellEntry = Optional[List[Tuple[int, float, float]]]
+
+
+class NearestCache:
+    """LRU cache of nearest-location queries per small square map cell.
+
+    Users at the same building or MRT exit send nearly identical coordinates.
+    For each (cell, count) the cache keeps the few locations that can be
+    among the `count` nearest ones from anywhere in the cell: seen from any
+    point of the cell, a distance differs by at most the cell's radius from
+    the one seen from its centre, so locations more than a diameter farther
+    from the centre than the count-th nearest one can never make it. On a hit
+    only the distances from the exact query point to those candidates are
+    computed, so the results, their order and their distances are exactly
+    what `SpatialIndex.nearest()` returns. Cells with more than
+    RERANK_MARGIN extra candidates are remembered as such and answered from
+    the index.
+
+    The cache belongs to one catalog snapshot and is cleared as soon as a
+    query comes in for another one.
+    """
+
+    def __init__(self, cell_meters: float = NEAREST_CACHE_CELL_METERS, max_size: int = NEAREST_CACHE_SIZE):
+        self._cell_degrees = cell_meters / 1000 / KM_PER_DEGREE
+        self._max_size = max_size
+        self._cells: "OrderedDict[CellKey, CellEntry]" = OrderedDict()
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+        # Counters exposed through stats()
+        self.hits = 0
+        self.misses = 0
+        self.uncacheable = 0
+        self.invalidations = 0
+
+    def nearest(self, snapshot, lat: float, lon: float, count: int = 1) -> List[Tuple[float, int]]:
+        """Find the `count` locations of `snapshot` nearest to (lat, lon).
+
+        Returns:
+            List of (distance in km, snapshot position) pairs sorted by distance,
+            the same as `snapshot.index.nearest(lat, lon, count)`
+        """
+        index = snapshot.index
+        if self._max_size <= 0 or count <= 0:
+            return index.nearest(lat, lon, count)
+
+        key = (math.floor(lat / self._cell_degrees), math.floor(lon / self._cell_degrees), count)
+        with self._lock:
+            if snapshot is not self._snapshot:
+                if self._cells:
+                    self.invalidations += 1
+                self._cells.clear()
+                self._snapshot = snapshot
+            cached = key in self._cells
+            if cached:
+                self._cells.move_to_end(key)
+                entry = self._cells[key]
+
+        if cached:
+            self.hits += 1
+        else:
+            self.misses += 1
+            entry = self._cell_entry(index, key)
+            with self._lock:
+                if snapshot is self._snapshot:
+                    self._cells[key] = entry
+                    if len(self._cells) > self._max_size:
+                        self._cells.popitem(last=False)
+
+        if entry is None:
+            self.uncacheable += 1
+            return index.nearest(lat, lon, count)
+        return sorted((geodesic_km(lat, lon, location_lat, location_lon), position)
+                      for position, location_lat, location_lon in entry)[:count]
+
+    def _cell_entry(self, index, key: CellKey) -> CellEntry:
+        lat_cell, lon_cell, count = key
+        size = self._cell_degrees
+        center = ((lat_cell + 0.5) * size, (lon_cell + 0.5) * size)
+        # Every point of the cell is within `radius` of its centre (with a little slack for rounding)
+        radius = max(geodesic_km(*center, corner_lat * size, lon_cell * size)
+                     for corner_lat in (lat_cell, lat_cell + 1)) * 1.001 + 1e-9
+
+        limit = count + RERANK_MARGIN
+        nearest = index.nearest(center[0], center[1], limit + 1)
+        if len(nearest) <= count:
+            return [(position, *index.coordinates(position)) for _, position in nearest]
+        # Anything farther than this from the centre is farther than the count nearest
+        # ones from every point of the cell (including the ones fetched beyond `limit`)
+        bound = nearest[count - 1][0] + 2 * radius
+        candidates = [position for distance, position in nearest if distance <= bound]
+        if len(candidates) > limit:
+            return None
+        return [(position, *index.coordinates(position)) for position in candidates]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache metrics for health and monitoring endpoints."""
+        return {
+            "cells": len(self._cells),
+            "hits": self.hits,
+            "misses": self.misses,
+            "uncacheable": self.uncacheable,
+            "invalidations": self.invalidations,
+        }
+
+
+_cache: Optional[NearestCache] = None
+
+
+def get_nearest_cache() -> NearestCache:
+    """Return the process-wide nearest-location result cache."""
+    global _cache
+    if _cache is None:
+        _cache = NearestCache()
+    return _cache
@@ -0,0 +1,55 @@
+from typing import Optional, Tuple
+from http_client import get_http_client
+from geocode_cache import get_geocode_cache, normalize_postal_code, NOT_FOUND
+from single_flight import SingleFlight
+from metrics import timed, UPSTREAM_SECONDS, UPSTREAM_ERRORS
+
+ONEMAP_SEARCH_URL = "https://www.onemap.gov.sg/api/common/elastic/search"
+
+# Concurrent lookups of the same postal code share one OneMap request
+geocode_flights = SingleFlight()
+
+
+async def geocode_postal_code_async(postal_code: str) -> Optional[Tuple[float, float]]:
+    """Look up the coordinates of a Singapore postal code with the OneMap search API.
+    
+    Results are cached (in memory and on disk), so repeat lookups never reach the network,
+    and concurrent cache misses for the same postal code share a single request. Postal
+    codes OneMap does not know are cached for GEOCODE_NEGATIVE_TTL_SECONDS.
+
+    Args:
+        postal_code: A 6-digit Singapore postal code
+
+    Returns:
+        (lat, lon) of the first search result, or None if the postal code was not found
+
+    Raises:
+        httpx.HTTPError, ValueError, KeyError: If the lookup itself failed
+    """
+    coordinates = await get_geocode_cache().get_async(postal_code)
+    if coordinates is NOT_FOUND:
+        return None
+    if coordinates is not None:
+        return coordinates
+
+    return await geocode_flights.do(normalize_postal_code(postal_code), lambda: _search_postal_code(postal_code))
+
+
+@timed(UPSTREAM_SECONDS, UPSTREAM_ERRORS, service="onemap")
+async def _search_postal_code(postal_code: str) -> Optional[Tuple[float, float]]:
+    """Query OneMap for a postal code and cache the result."""
+    params = {
+        "searchVal": postal_code,
+        "returnGeom": "Y",
+        "getAddrDetails": "N",
+    }
+    response = await get_http_client().get(ONEMAP_SEARCH_URL, params=params)
+    response.raise_for_status()
+
+    results = response.json().get('results', [])
+    if not results:
+        await get_geocode_cache().put_missing_async(postal_code)
+        return None
+    coordinates = float(results[0]['LATITUDE']), float(results[0]['LONGITUDE'])
+    await get_geocode_cache().put_async(postal_code, *coordinates)
+    return coordinates
@@ -1,8 +1,16 @@
 import os
-from typing import List, Dict, Any, TypeVar
+import json
+import hashlib
+import threading
+from typing import List, Dict, Any, TypeVar, Optional, Tuple, NamedTuple, Callable, Iterator, Iterable
+from urllib.parse import quote
+import httplib2
 from googleapiclient.discovery import build
 from dotenv import load_dotenv
 from datetime import datetime
+from http_client import get_http_client, HTTP_TIMEOUT_SECONDS
+from metrics import timed, UPSTREAM_SECONDS, UPSTREAM_ERRORS
+from location_store import SourceLocation
 
 # Load environment variables
 load_dotenv()
@@ -11,10 +19,17 @@ load_dotenv()
 SPREADSHEET_ID = os.getenv('GOOGLE_SHEETS_SPREADSHEET_ID')
 API_KEY = os.getenv('GOOGLE_SHEETS_API_KEY')
 LOCATIONS_RANGE_NAME = os.getenv('GOOGLE_SHEETS_RANGE', 'locations')
+SHEETS_VALUES_URL = "https://sheets.googleapis.com/v4/spreadsheets/{spreadsheet_id}/values/{range}"
+
+# The sheet is read in pages of this many rows, so memory use and the time to the
+# first record depend on the page size rather than on the size of the sheet.
+# 0 reads the whole range in one request (always the case for ranges given in A1
+# notation, such as 'Sheet1!A1:I500'; paging needs GOOGLE_SHEETS_RANGE to be a sheet name)
+SHEETS_PAGE_ROWS = int(os.getenv('GOOGLE_SHEETS_PAGE_ROWS', '1000'))
 
 # Define a schema for the columns
 # Each entry defines: 
-# - key: the dictionary key to use in the result
+# - key: the dictionary key to use in the result (the keys are the fields of location_store.SourceLocation)
 # - required: whether this field is required
 # - transform: optional function to transform the value (e.g., convert to float)
 # - default: default value if the column is missing or empty
@@ -82,7 +97,7 @@ COLUMN_SCHEMA = [
         "transform": None,
         "default": None
     }
-    # Add new columns here following the same pattern
+    # Add new columns here following the same pattern (and add their keys to location_store.FIELDS)
     # {
     #     "index": 7,
     #     "key": "new_column_name",
@@ -92,70 +107,256 @@ COLUMN_SCHEMA = [
     # },
 ]
 
-def get_column_value(row: List[str], column_def: Dict[str, Any]) -> Any:
-    """Extract a column value from a row based on the column definition."""
-    index = column_def["index"]
-    transform = column_def["transform"]
-    default = column_def["default"]
+class RowError(NamedTuple):
+    """A sheet row that could not be converted to a location."""
+    row_number: int  # 1-based, as shown in the Google Sheets UI
+    column: Optional[str]  # COLUMN_SCHEMA key, or None if the whole row is invalid
+    message: str
+    row: List[str]
+
+
+class ParseResult(NamedTuple):
+    locations: List[SourceLocation]
+    errors: List[RowError]
+
+
+def compile_row_parser(schema: List[Dict[str, Any]] = COLUMN_SCHEMA) -> Callable[[Iterable[Tuple[int, List[str]]], List[RowError]], Iterator[SourceLocation]]:
+    """Compile a column schema into a generator converting sheet rows to locations.
+
+    All per-column decisions (index, transform, default, whether a missing
+    value invalidates the row) are made once here, so the returned parser only
+    does one pass over each row's cells.
+
+    A row is rejected if it is shorter than the last required column, or if a
+    required column without a default is empty or fails its transform (e.g. a
+    latitude that is not a number). Earlier versions kept such rows with the
+    value set to None, which broke every distance computed against them.
+
+    Returns:
+        parse(rows, errors) yielding a SourceLocation per valid row, where rows
+        are (row number, raw cells) pairs without the header row; rejected rows
+        are appended to `errors`
+    """
+    if [column["key"] for column in schema] != list(SourceLocation._fields):
+        raise ValueError("Schema keys must match the SourceLocation fields")
+    fields = tuple(
+        (column["index"], column["key"], column["transform"], column["default"],
+         column["required"] and column["default"] is None)
+        for column in schema
+    )
+    min_length = max((column["index"] for column in schema if column["required"]), default=-1) + 1
+    new_record = tuple.__new__
+
+    def parse(rows: Iterable[Tuple[int, List[str]]], errors: List[RowError]) -> Iterator[SourceLocation]:
+        for row_number, row in rows:
+            length = len(row)
+            if length < min_length:
+                errors.append(RowError(row_number, None, "missing required columns", row))
+                continue
+
+            record = []
+            for index, key, transform, default, mandatory in fields:
+                value = row[index] if index < length else None
+                if not value:
+                    value = default
+                elif transform is not None:
+                    try:
+                        value = transform(value)
+                    except (ValueError, TypeError):
+                        if mandatory:
+                            errors.append(RowError(row_number, key, f"invalid value {row[index]!r}", row))
+                            break
+                        value = default
+                if value is None and mandatory:
+                    errors.append(RowError(row_number, key, "required value is empty", row))
+                    break
+                record.append(value)
+            else:
+                yield new_record(SourceLocation, record)
+
+    return parse
+
+def compile_schema(schema: List[Dict[str, Any]] = COLUMN_SCHEMA) -> Callable[[List[List[str]]], ParseResult]:
+    """Compile a column schema into a function converting sheet values to locations.
+
+    See compile_row_parser() for how rows are validated.
+
+    Returns:
+        parse(values) -> ParseResult, where values are the raw sheet values
+        including the header row
+    """
+    parse_rows = compile_row_parser(schema)
+
+    def parse(values: List[List[str]]) -> ParseResult:
+        errors: List[RowError] = []
+        # Skip the header row (row 1)
+        locations = list(parse_rows(enumerate(values[1:], start=2), errors))
+        return ParseResult(locations, errors)
+
+    return parse
+
+_parse_row_stream = compile_row_parser()
+_parse_values = compile_schema()
+
+# Rows rejected by the most recent parse, for health and monitoring endpoints
+last_parse_errors: List[RowError] = []
+
+# Records and rejected rows of every page read by the last fetch_locations_if_changed(),
+# by hash of the page's raw values, so that a refresh only parses the pages that changed
+_parsed_pages: Dict[str, Tuple[List[SourceLocation], List[RowError]]] = {}
+
+def parse_rows(values: List[List[str]]) -> List[SourceLocation]:
+    """Convert raw sheet values (including the header row) to location records.
     
-    # Check if the column exists in the row
-    if len(row) > index and row[index]:
-        value = row[index]
-        # Apply transformation if provided
-        if transform is not None:
-            try:
-                return transform(value)
-            except (ValueError, TypeError):
-                return default
-        return value
-    return default
-
-def fetch_locations() -> List[Dict[str, Any]]:
-    """Fetch musollah locations from Google Sheets using API key.
+    Rejected rows are stored in `last_parse_errors` instead of failing the parse.
     
     Returns:
-        List of dictionaries containing musollah location data with keys defined in COLUMN_SCHEMA.
+        List of SourceLocation records with the keys defined in COLUMN_SCHEMA.
     """
-    try:
-        # Build the service with API key instead of OAuth credentials
-        service = build('sheets', 'v4', developerKey=API_KEY)
-        
-        # Call the Sheets API
-        sheet = service.spreadsheets()
-        result = sheet.values().get(spreadsheetId=SPREADSHEET_ID,
-                                   range=LOCATIONS_RANGE_NAME).execute()
-        values = result.get('values', [])
-        
-        if not values:
-            print('No data found in the Google Sheet.')
-            return []
-        
-        # Convert sheet data to location dictionaries
-        locations = []
+    if not values:
+        print('No data found in the Google Sheet.')
+        _record_parse_errors([])
+        return []
+    
+    locations, errors = _parse_values(values)
+    _record_parse_errors(errors)
+    return locations
+
+def _record_parse_errors(errors: List[RowError]) -> None:
+    global last_parse_errors
+    last_parse_errors = errors
+    if errors:
+        print(f"Skipped {len(errors)} invalid rows in the Google Sheet (first: row {errors[0].row_number}, "
+              f"{errors[0].column or 'row'}: {errors[0].message})")
+
+_service = None
+_service_lock = threading.Lock()
+_thread_local = threading.local()
+
+def _get_service():
+    """Return the Sheets API service, built once per process (building it is slow)."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            # Build the service with API key instead of OAuth credentials
+            _service = build('sheets', 'v4', developerKey=API_KEY, http=httplib2.Http(timeout=HTTP_TIMEOUT_SECONDS))
+        return _service
+
+def _get_http() -> httplib2.Http:
+    """Return this thread's HTTP connection for Sheets API requests (httplib2 is not thread-safe)."""
+    http = getattr(_thread_local, "http", None)
+    if http is None:
+        http = _thread_local.http = httplib2.Http(timeout=HTTP_TIMEOUT_SECONDS)
+    return http
+
+@timed(UPSTREAM_SECONDS, UPSTREAM_ERRORS, service="sheets")
+def _fetch_range(range_name: str) -> List[List[str]]:
+    """Download the raw values of one range."""
+    request = _get_service().spreadsheets().values().get(spreadsheetId=SPREADSHEET_ID, range=range_name)
+    return request.execute(http=_get_http()).get('values', [])
+
+@timed(UPSTREAM_SECONDS, UPSTREAM_ERRORS, service="sheets")
+def _fetch_row_count(sheet_name: str) -> int:
+    """Return the number of rows of a sheet (including empty ones)."""
+    request = _get_service().spreadsheets().get(
+        spreadsheetId=SPREADSHEET_ID, ranges=[sheet_name], fields='sheets.properties.gridProperties.rowCount')
+    result = request.execute(http=_get_http())
+    return result['sheets'][0]['properties']['gridProperties']['rowCount']
+
+def _fetch_values() -> List[List[str]]:
+    """Download the raw values of the locations range (including the header row) in one request."""
+    return _fetch_range(LOCATIONS_RANGE_NAME)
+
+def _iter_value_pages(page_rows: int = SHEETS_PAGE_ROWS) -> Iterator[Tuple[int, List[List[str]]]]:
+    """Download the locations range page by page.
+
+    Yields:
+        (row number of the first row, raw values) per page; row 1 is the header row
+    """
+    if page_rows <= 0 or '!' in LOCATIONS_RANGE_NAME:
+        yield 1, _fetch_values()
+        return
+
+    sheet = "'" + LOCATIONS_RANGE_NAME.replace("'", "''") + "'"
+    row_count = _fetch_row_count(LOCATIONS_RANGE_NAME)
+    for start in range(1, row_count + 1, page_rows):
+        end = min(start + page_rows - 1, row_count)
+        # Rows are returned from the start of the range, with only trailing empty rows left out
+        yield start, _fetch_range(f"{sheet}!{start}:{end}")
+
+def _parse_pages(pages: Iterable[Tuple[int, List[List[str]]]], errors: List[RowError]) -> Iterator[SourceLocation]:
+    """Parse pages of raw values into location records, skipping the header row."""
+    rows = ((start + offset, row) for start, values in pages
+            for offset, row in enumerate(values) if start + offset > 1)
+    return _parse_row_stream(rows, errors)
+
+def fetch_locations_if_changed(fingerprint: Optional[Dict[str, str]] = None) -> Tuple[Optional[Dict[str, str]], Optional[List[SourceLocation]]]:
+    """Fetch musollah locations from Google Sheets, skipping them if nothing changed.
+    
+    The Sheets values API has no revision or ETag support for API-key access,
+    so changes are detected with a hash of the raw cell values. The sheet is
+    read page by page (see SHEETS_PAGE_ROWS) and every page is hashed as it
+    arrives; only pages whose hash was not seen by the previous call are
+    parsed, the records of the others are reused. An unchanged sheet is not
+    parsed at all, and raw values are never held for more than one page.
+    
+    Args:
+        fingerprint: The fingerprint returned by the previous call, if any
         
-        # Skip the header row (first row)
-        if values and len(values) > 0:
-            data_rows = values[1:]
-            
-            for row in data_rows:
-                try:
-                    # Check if row has minimum required fields
-                    required_columns = [col for col in COLUMN_SCHEMA if col["required"]]
-                    if len(row) < max(col["index"] for col in required_columns) + 1:
-                        print(f"Skipping row {row}: missing required columns")
-                        continue
-                    
-                    # Build location dictionary using schema
-                    location = {}
-                    for column_def in COLUMN_SCHEMA:
-                        location[column_def["key"]] = get_column_value(row, column_def)
-                    
-                    locations.append(location)
-                except Exception as e:
-                    print(f"Error processing row {row}: {e}")
-                    continue
+    Returns:
+        (fingerprint, locations) where locations is None if the sheet is unchanged
+        since `fingerprint`
         
-        return locations
+    Raises:
+        Exception: If the sheet could not be fetched
+    """
+    global _parsed_pages
+    digest = hashlib.sha1()
+    parsed_pages: Dict[str, Tuple[List[SourceLocation], List[RowError]]] = {}
+    locations: List[SourceLocation] = []
+    errors: List[RowError] = []
+    for start, values in _iter_value_pages():
+        page_hash = hashlib.sha1(json.dumps([start, values], separators=(',', ':')).encode()).hexdigest()
+        digest.update(page_hash.encode())
+        parsed = _parsed_pages.get(page_hash)
+        if parsed is None:
+            page_errors: List[RowError] = []
+            parsed = list(_parse_pages([(start, values)], page_errors)), page_errors
+        parsed_pages[page_hash] = parsed
+        locations.extend(parsed[0])
+        errors.extend(parsed[1])
+    _parsed_pages = parsed_pages
+
+    new_fingerprint = {"sha1": digest.hexdigest()}
+    if fingerprint == new_fingerprint:
+        return new_fingerprint, None
+    if not locations:
+        print('No data found in the Google Sheet.')
+    _record_parse_errors(errors)
+    return new_fingerprint, locations
+
+@timed(UPSTREAM_SECONDS, UPSTREAM_ERRORS, service="sheets")
+async def _fetch_values_async() -> List[List[str]]:
+    """Download the raw values of the locations range through the shared async HTTP client."""
+    url = SHEETS_VALUES_URL.format(
+        spreadsheet_id=SPREADSHEET_ID,
+        range=quote(LOCATIONS_RANGE_NAME, safe=''),
+    )
+    response = await get_http_client().get(url, params={"key": API_KEY})
+    response.raise_for_status()
+    return response.json().get('values', [])
+
+async def fetch_locations_async() -> List[SourceLocation]:
+    """Fetch musollah locations from Google Sheets without blocking the event loop.
+    
+    Calls the Sheets REST endpoint directly through the shared pooled HTTP client
+    instead of the (blocking) googleapiclient discovery service.
+    
+    Returns:
+        List of SourceLocation records with the keys defined in COLUMN_SCHEMA.
+    """
+    try:
+        return parse_rows(await _fetch_values_async())
     except Exception as e:
         print(f"Error fetching data from Google Sheets: {e}")
         return []
@@ -0,0 +1,54 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Coalesces concurrent async calls with the same key into one call.
+
+    The first caller for a key starts the call; callers arriving while it is
+    still running await the same result (or exception) instead of starting
+    their own. Once the call finishes the key is forgotten, so later callers
+    start a fresh call. Results are not cached; use this in front of a cache
+    to stop a burst of misses from all reaching the upstream service.
+
+    The call runs in its own task, so a caller being cancelled (e.g. a
+    Telegram handler timing out) does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+        # Counters exposed through stats()
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Return the result of fn(), sharing one in-flight call per key.
+
+        Args:
+            key: Identifies calls that may share a result
+            fn: Coroutine function to call if no call for `key` is in flight
+        """
+        task = self._calls.get(key)
+        if task is None or task.done():
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return coalescing metrics for health and monitoring endpoints."""
+        return {
+            "in_flight": len(self._calls),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+        }
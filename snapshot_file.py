@@ -0,0 +1,192 @@
+"""
+Binary catalog snapshot files, shared between processes through mmap.
+
+A snapshot file holds one catalog snapshot: the columns of its location
+store, the built k-d tree of the spatial index, the arrays of the distance
+engine and the pre-rendered HTML fragments. Numbers are stored as raw
+float64/int64 arrays and text as JSON values addressed by an offset table,
+so readers map every section read-only instead of copying or decoding it:
+all processes mapping the same file share one copy in the page cache, and
+text values are only decoded when they are read.
+
+Files are written to a temporary file and renamed into place, so readers
+never see a partial file and a process that still maps the previous file
+keeps a valid mapping.
+
+Layout (all sections 8-byte aligned, numbers in the writer's byte order):
+    header       magic, format version, catalog version, positions, table offset, table length
+    sections     float64/int64 arrays, and for each text column an int64 offset
+                 table (positions + 1 entries) followed by its UTF-8 JSON values
+    table        UTF-8 JSON: {"sections": {name: [offset, length, format]}, "patches": [[position, lat, lon], ...]}
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Sequence
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from distance_engine import DistanceEngine
+from location_renderer import LocationRenderer
+from location_store import LocationStore
+from spatial_index import SpatialIndex
+
+MAGIC = b"MSNP"
+FORMAT_VERSION = 2
+
+_HEADER = struct.Struct("=4sIQQQQ")
+_HEADER_SIZE = _HEADER.size + (-_HEADER.size % 8)
+_BYTE_ORDER = 1 if sys.byteorder == "little" else 2
+
+
+class SnapshotFile(NamedTuple):
+    """The contents of a snapshot file."""
+    version: int
+    locations: LocationStore
+    index: SpatialIndex
+    engine: DistanceEngine
+    renderer: LocationRenderer
+
+
+class MappedColumn(Sequence):
+    """A read-only column of JSON values in a snapshot file, decoded on access."""
+
+    __slots__ = ("_offsets", "_data")
+
+    def __init__(self, offsets: memoryview, data: memoryview):
+        self._offsets = offsets
+        self._data = data
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        return json.loads(bytes(self._data[self._offsets[position]:self._offsets[position + 1]]))
+
+
+def _padded(data: bytes) -> bytes:
+    return data + b"\0" * (-len(data) % 8)
+
+
+def _encode_column(values: Iterable[Any]) -> Tuple[bytes, bytes]:
+    """Encode a column as (offset table, JSON values)."""
+    encoded = [json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8") for value in values]
+    offsets = array("q", [0])
+    for value in encoded:
+        offsets.append(offsets[-1] + len(value))
+    return offsets.tobytes(), b"".join(encoded)
+
+
+def write_snapshot_file(path: str, version: int, locations: LocationStore, index: SpatialIndex,
+                        engine: DistanceEngine, renderer: LocationRenderer) -> None:
+    """Write a catalog snapshot to `path`, atomically replacing any previous file."""
+    tree_lats, tree_lons, order = index.tree
+    tree_xs, tree_ys = index.projection
+    engine_lat, engine_lon, engine_cos_lat = engine.arrays
+    heads, tails = renderer.fragments
+    columns = {**locations.text_columns, "head": heads, "tail": tails}
+
+    sections: List[Tuple[str, bytes, str]] = [
+        ("lats", array("d", locations.lats).tobytes(), "d"),
+        ("lons", array("d", locations.lons).tobytes(), "d"),
+        ("tree_lats", array("d", tree_lats).tobytes(), "d"),
+        ("tree_lons", array("d", tree_lons).tobytes(), "d"),
+        ("tree_xs", array("d", tree_xs).tobytes(), "d"),
+        ("tree_ys", array("d", tree_ys).tobytes(), "d"),
+        ("tree_order", array("q", order).tobytes(), "q"),
+        ("engine_lat", engine_lat.astype("=f8").tobytes(), "d"),
+        ("engine_lon", engine_lon.astype("=f8").tobytes(), "d"),
+        ("engine_cos_lat", engine_cos_lat.astype("=f8").tobytes(), "d"),
+    ]
+    for name, values in columns.items():
+        offsets, data = _encode_column(values)
+        sections.append((f"{name}.offsets", offsets, "q"))
+        sections.append((f"{name}.data", data, "B"))
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"\0" * _HEADER_SIZE)
+        offset = _HEADER_SIZE
+        table: Dict[str, List[Any]] = {}
+        for name, data, fmt in sections:
+            table[name] = [offset, len(data), fmt]
+            f.write(_padded(data))
+            offset += len(data) + (-len(data) % 8)
+        text = json.dumps({
+            "sections": table,
+            "patches": [[position, *(coordinates or (None, None))]
+                        for position, coordinates in index.patches.items()],
+        }, separators=(",", ":")).encode("utf-8")
+        f.write(text)
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION | _BYTE_ORDER << 16, version, len(locations), offset, len(text)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_snapshot_file(path: str) -> SnapshotFile:
+    """Map a snapshot file written by write_snapshot_file().
+
+    Every column stays in the read-only mapping, shared with every other
+    process that maps the same file; nothing is copied or decoded up front.
+
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If the file is not a snapshot file of this format
+    """
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(mapped) < _HEADER_SIZE:
+        raise ValueError(f"{path} is not a catalog snapshot file")
+    magic, fmt, version, positions, table_offset, table_length = _HEADER.unpack_from(mapped)
+    if magic != MAGIC or fmt != FORMAT_VERSION | _BYTE_ORDER << 16:
+        raise ValueError(f"{path} is not a catalog snapshot file of format {FORMAT_VERSION} for this machine")
+    if len(mapped) != table_offset + table_length:
+        raise ValueError(f"{path} is truncated")
+
+    view = memoryview(mapped)
+    table = json.loads(bytes(view[table_offset:]).decode("utf-8"))
+
+    def section(name: str) -> memoryview:
+        offset, length, section_fmt = table["sections"][name]
+        return view[offset:offset + length].cast(section_fmt)
+
+    def column(name: str) -> MappedColumn:
+        return MappedColumn(section(f"{name}.offsets"), section(f"{name}.data"))
+
+    lats, lons = section("lats"), section("lons")
+    if len(lats) != positions:
+        raise ValueError(f"{path} is corrupt")
+    fields = [name[:-len(".offsets")] for name in table["sections"] if name.endswith(".offsets")]
+    locations = LocationStore.from_columns(lats, lons, {field: column(field) for field in fields})
+
+    index = SpatialIndex.from_tree(section("tree_lats"), section("tree_lons"), section("tree_order"),
+                                   section("tree_xs"), section("tree_ys"))
+    patches = {position: (lat, lon) if lat is not None else None for position, lat, lon in table["patches"]}
+    if patches:
+        index = index.patched(patches)
+    engine = DistanceEngine.from_arrays(section("engine_lat"), section("engine_lon"), section("engine_cos_lat"))
+    renderer = LocationRenderer.from_fragments(column("head"), column("tail"))
+    return SnapshotFile(version, locations, index, engine, renderer)
+
+
+def snapshot_file_id(path: str) -> Optional[Tuple[int, int, int]]:
+    """Identify the current file at `path` (changes whenever a new snapshot is written), or None if missing."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
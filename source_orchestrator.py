@@ -0,0 +1,291 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Total time one source may take per refresh, including retries
+SOURCE_DEADLINE_SECONDS = float(os.getenv("SOURCE_DEADLINE_SECONDS", "30"))
+
+# Retries after a failed attempt, with exponential backoff and full jitter
+SOURCE_RETRIES = int(os.getenv("SOURCE_RETRIES", "2"))
+SOURCE_RETRY_BACKOFF_SECONDS = float(os.getenv("SOURCE_RETRY_BACKOFF_SECONDS", "1"))
+
+# A source is skipped for the cooldown after this many consecutive failed refreshes
+SOURCE_BREAKER_THRESHOLD = int(os.getenv("SOURCE_BREAKER_THRESHOLD", "3"))
+SOURCE_BREAKER_COOLDOWN_SECONDS = float(os.getenv("SOURCE_BREAKER_COOLDOWN_SECONDS", "300"))
+
+
+class SourceResult(NamedTuple):
+    """Outcome of fetching one source.
+
+    `locations` is None when the source is unchanged since the fingerprint
+    passed in, or when it failed (then `error` is set).
+    """
+    fingerprint: Any
+    locations: Optional[List[Any]]
+    error: Optional[str] = None
+
+
+class CircuitBreaker:
+    """Per-source circuit breaker.
+
+    After `threshold` consecutive failures the circuit opens and the source is
+    not called for `cooldown` seconds (callers keep serving its last good
+    data). After the cooldown one trial fetch is let through: success closes
+    the circuit, failure opens it for another cooldown.
+    """
+
+    def __init__(self, threshold: int = SOURCE_BREAKER_THRESHOLD,
+                 cooldown: float = SOURCE_BREAKER_COOLDOWN_SECONDS):
+        self._threshold = max(1, threshold)
+        self._cooldown = cooldown
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self._cooldown:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        """Return True if the source may be called now."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self._threshold:
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class SourceMetrics:
+    """Latency and error counters of one source."""
+
+    def __init__(self):
+        self.attempts = 0
+        self.successes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.skipped = 0
+        self.last_latency_ms: Optional[float] = None
+        self.total_latency_ms = 0.0
+        self.last_error: Optional[str] = None
+
+    def record(self, latency_ms: float, error: Optional[str] = None, timed_out: bool = False) -> None:
+        """Record a finished fetch (all attempts of one refresh)."""
+        self.last_latency_ms = latency_ms
+        self.total_latency_ms += latency_ms
+        if error is None:
+            self.successes += 1
+        else:
+            self.failures += 1
+            self.timeouts += timed_out
+            self.last_error = error
+
+    def stats(self) -> Dict[str, Any]:
+        finished = self.successes + self.failures
+        return {
+            "attempts": self.attempts,
+            "successes": self.successes,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "skipped": self.skipped,
+            "last_latency_ms": round(self.last_latency_ms, 1) if self.last_latency_ms is not None else None,
+            "avg_latency_ms": round(self.total_latency_ms / finished, 1) if finished else None,
+            "last_error": self.last_error,
+        }
+
+
+def _backoff(attempt: int, base: float) -> float:
+    """Exponential backoff with full jitter for the given (0-based) retry."""
+    return random.uniform(0, base * (2 ** attempt))
+
+
+class SourceOrchestrator:
+    """Fetches all data sources concurrently, each with its own deadline,
+    retries and circuit breaker.
+
+    Sources are fetched in parallel, so a refresh takes as long as the
+    slowest source rather than the sum of all of them, and a source that
+    hangs or keeps failing is cut off at its deadline (or skipped while its
+    circuit is open) without delaying the others. A failed source is
+    reported in its SourceResult; the caller decides what to serve instead
+    (the catalog keeps that source's last good locations).
+
+    Sync sources are called as fetch(fingerprint) -> (fingerprint, locations
+    or None if unchanged) on worker threads; async sources as
+    await fetch() -> locations. An empty list of locations counts as a
+    failure and is retried.
+    """
+
+    def __init__(self, sources: Dict[str, Callable[[Any], Tuple[Any, Optional[List[Any]]]]],
+                 async_sources: Optional[Dict[str, Callable[[], Awaitable[List[Any]]]]] = None,
+                 deadline: float = SOURCE_DEADLINE_SECONDS,
+                 retries: int = SOURCE_RETRIES,
+                 backoff: float = SOURCE_RETRY_BACKOFF_SECONDS):
+        self._sources = sources
+        self._async_sources = async_sources or {}
+        self._deadline = deadline
+        self._retries = max(0, retries)
+        self._backoff = backoff
+        names = set(self._sources) | set(self._async_sources)
+        self._breakers = {name: CircuitBreaker() for name in names}
+        self._metrics = {name: SourceMetrics() for name in names}
+
+    def _call_with_retries(self, name: str, fetch: Callable[[Any], Tuple[Any, Optional[List[Any]]]],
+                           fingerprint: Any, deadline_at: float) -> Tuple[Any, Optional[List[Any]]]:
+        metrics = self._metrics[name]
+        attempt = 0
+        while True:
+            metrics.attempts += 1
+            try:
+                new_fingerprint, locations = fetch(fingerprint)
+                if locations is not None and not locations:
+                    raise ValueError("no locations returned")
+                return new_fingerprint, locations
+            except Exception:
+                delay = _backoff(attempt, self._backoff)
+                attempt += 1
+                if attempt > self._retries or time.monotonic() + delay >= deadline_at:
+                    raise
+                time.sleep(delay)
+
+    def fetch(self, fingerprints: Optional[Dict[str, Any]] = None) -> Dict[str, SourceResult]:
+        """Fetch every sync source concurrently.
+
+        Args:
+            fingerprints: Per-source fingerprint from the previous fetch, if any
+
+        Returns:
+            One SourceResult per source
+        """
+        fingerprints = fingerprints or {}
+        results: Dict[str, SourceResult] = {}
+        started = time.monotonic()
+        deadline_at = started + self._deadline
+
+        finished_at: Dict[str, float] = {}
+
+        def run(name, fetch):
+            try:
+                return self._call_with_retries(name, fetch, fingerprints.get(name), deadline_at)
+            finally:
+                finished_at[name] = time.monotonic()
+
+        futures = {}
+        executor = ThreadPoolExecutor(max_workers=max(1, len(self._sources)), thread_name_prefix="source-fetch")
+        try:
+            for name, fetch in self._sources.items():
+                if not self._breakers[name].allow():
+                    self._metrics[name].skipped += 1
+                    results[name] = SourceResult(fingerprints.get(name), None, "circuit open")
+                    continue
+                futures[name] = executor.submit(run, name, fetch)
+            wait(futures.values(), timeout=self._deadline)
+        finally:
+            # A source still running past its deadline is abandoned, not waited for
+            executor.shutdown(wait=False)
+
+        for name, future in futures.items():
+            latency_ms = (finished_at.get(name, time.monotonic()) - started) * 1000
+            if not future.done():
+                error, timed_out = f"no response within {self._deadline:g}s", True
+                results[name] = SourceResult(fingerprints.get(name), None, error)
+            elif future.exception() is not None:
+                error, timed_out = str(future.exception()) or type(future.exception()).__name__, False
+                results[name] = SourceResult(fingerprints.get(name), None, error)
+            else:
+                error, timed_out = None, False
+                results[name] = SourceResult(*future.result())
+            self._finish(name, latency_ms, error, timed_out)
+        return results
+
+    async def fetch_async(self) -> Dict[str, SourceResult]:
+        """Fetch every async source concurrently (full fetches, no fingerprints)."""
+        names = [name for name in self._async_sources if self._breakers[name].allow()]
+        results = {
+            name: SourceResult(None, None, "circuit open")
+            for name in self._async_sources if name not in names
+        }
+        for name in results:
+            self._metrics[name].skipped += 1
+        outcomes = await asyncio.gather(*(self._fetch_one_async(name) for name in names))
+        results.update(zip(names, outcomes))
+        return results
+
+    async def _fetch_one_async(self, name: str) -> SourceResult:
+        fetch = self._async_sources[name]
+        metrics = self._metrics[name]
+        started = time.monotonic()
+        deadline_at = started + self._deadline
+
+        async def attempts() -> List[Any]:
+            attempt = 0
+            while True:
+                metrics.attempts += 1
+                try:
+                    locations = await fetch()
+                    if not locations:
+                        raise ValueError("no locations returned")
+                    return locations
+                except Exception:
+                    delay = _backoff(attempt, self._backoff)
+                    attempt += 1
+                    if attempt > self._retries or time.monotonic() + delay >= deadline_at:
+                        raise
+                    await asyncio.sleep(delay)
+
+        try:
+            locations = await asyncio.wait_for(attempts(), self._deadline)
+            result, timed_out = SourceResult(None, locations), False
+        except asyncio.TimeoutError:
+            result, timed_out = SourceResult(None, None, f"no response within {self._deadline:g}s"), True
+        except Exception as e:
+            result, timed_out = SourceResult(None, None, str(e) or type(e).__name__), False
+        self._finish(name, (time.monotonic() - started) * 1000, result.error, timed_out)
+        return result
+
+    def _finish(self, name: str, latency_ms: float, error: Optional[str], timed_out: bool) -> None:
+        self._metrics[name].record(latency_ms, error, timed_out)
+        if error is None:
+            self._breakers[name].record_success()
+        else:
+            self._breakers[name].record_failure()
+
+    @property
+    def sources(self) -> List[str]:
+        """Names of all sources, sync sources first, in the order they were given."""
+        return list(self._sources) + [name for name in self._async_sources if name not in self._sources]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return per-source latency, error and circuit breaker metrics."""
+        return {
+            name: {**self._metrics[name].stats(), "circuit": self._breakers[name].state}
+            for name in self._metrics
+        }
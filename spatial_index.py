@@ -0,0 +1,238 @@
+import heapq
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+from geographiclib.geodesic import Geodesic
+from geopy.distance import ELLIPSOIDS
+
+# Length of one degree of latitude in kilometers (mean Earth radius 6371.0088 km)
+KM_PER_DEGREE = 6371.0088 * math.pi / 180
+
+# Extra candidates fetched from the tree before the exact geodesic re-rank.
+# The projected distance differs from the geodesic one by well under 1% at
+# Singapore's latitude, so a small margin is enough to keep the top-k exact.
+RERANK_MARGIN = 8
+
+# The ellipsoid geopy's geodesic() uses, with lengths in km
+_GEODESIC = Geodesic(ELLIPSOIDS["WGS-84"][0], ELLIPSOIDS["WGS-84"][2])
+
+
+def geodesic_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Geodesic distance in km, identical to geopy's `geodesic(...).kilometers` at half the cost."""
+    return _GEODESIC.Inverse(lat1, lon1, lat2, lon2, Geodesic.DISTANCE)["s12"]
+
+
+class SpatialIndex:
+    """Static k-d tree over location coordinates for nearest-neighbour queries.
+
+    Coordinates are projected once onto a local equirectangular plane (in km)
+    centred on the mean latitude of the points, which is accurate for a
+    city-sized area like Singapore. The tree is stored implicitly in a single
+    permutation list: the node of the range [lo, hi) is at the middle index,
+    its left subtree is [lo, mid) and its right subtree is [mid + 1, hi).
+
+    An index is never modified after it is built, so it can be queried
+    concurrently without locking. Small catalog changes are applied with
+    `patched()`, which returns a new index that shares the tree with this one
+    and only tracks the changed positions (see `patch_size`).
+    """
+
+    LEAF_SIZE = 8
+
+    def __init__(self, points: Sequence[Tuple[float, float]]):
+        """Build the index.
+
+        Args:
+            points: (lat, lon) pairs. Query results refer to positions in this sequence.
+        """
+        self._lats = [float(lat) for lat, _ in points]
+        self._lons = [float(lon) for _, lon in points]
+
+        lat0 = sum(self._lats) / len(self._lats) if self._lats else 0.0
+        self._kx = KM_PER_DEGREE * math.cos(math.radians(lat0))
+        self._ky = KM_PER_DEGREE
+        self._xs = [lon * self._kx for lon in self._lons]
+        self._ys = [lat * self._ky for lat in self._lats]
+
+        self._order = list(range(len(self._xs)))
+        self._build()
+
+        # Changes applied by patched(): tree positions that must be skipped,
+        # and points living outside the tree (position -> (x, y, lat, lon))
+        self._dead: frozenset = frozenset()
+        self._extra: Dict[int, Tuple[float, float, float, float]] = {}
+
+    @classmethod
+    def from_tree(cls, lats: Sequence[float], lons: Sequence[float], order: Sequence[int],
+                  xs: Optional[Sequence[float]] = None, ys: Optional[Sequence[float]] = None) -> "SpatialIndex":
+        """Restore an index from the `tree` of a previously built one, without rebuilding it.
+
+        The sequences are used as they are, not copied, so they may be views
+        of a memory-mapped file (see snapshot_file). Pass the `projection` of
+        the built index as `xs` and `ys` to skip projecting the points again.
+        """
+        index = object.__new__(cls)
+        index._lats = lats
+        index._lons = lons
+        lat0 = sum(lats) / len(lats) if len(lats) else 0.0
+        index._kx = KM_PER_DEGREE * math.cos(math.radians(lat0))
+        index._ky = KM_PER_DEGREE
+        index._xs = xs if xs is not None else [lon * index._kx for lon in lons]
+        index._ys = ys if ys is not None else [lat * index._ky for lat in lats]
+        index._order = order
+        index._dead = frozenset()
+        index._extra = {}
+        return index
+
+    @property
+    def tree(self) -> Tuple[Sequence[float], Sequence[float], Sequence[int]]:
+        """The (lats, lons, order) the tree was built from; see from_tree()."""
+        return self._lats, self._lons, self._order
+
+    @property
+    def projection(self) -> Tuple[Sequence[float], Sequence[float]]:
+        """The projected (xs, ys) of the tree's points in km; see from_tree()."""
+        return self._xs, self._ys
+
+    @property
+    def patches(self) -> Dict[int, Optional[Tuple[float, float]]]:
+        """The changes applied since the tree was built, in the form patched() accepts."""
+        changes: Dict[int, Optional[Tuple[float, float]]] = {position: None for position in self._dead}
+        for position, (_, _, lat, lon) in self._extra.items():
+            changes[position] = (lat, lon)
+        return changes
+
+    def __len__(self) -> int:
+        return len(self._order) - len(self._dead) + len(self._extra)
+
+    @property
+    def patch_size(self) -> int:
+        """Number of positions changed since the tree was built (query overhead grows with it)."""
+        return len(self._dead) + len(self._extra)
+
+    def patched(self, changes: Dict[int, Optional[Tuple[float, float]]]) -> "SpatialIndex":
+        """Return a new index with some positions moved, added or removed.
+
+        The tree itself is shared and not rebuilt, so the cost is proportional
+        to the number of changes. Changed points are scanned linearly at query
+        time, so callers should rebuild once `patch_size` grows large.
+
+        Args:
+            changes: position -> new (lat, lon), or None to remove the position
+        """
+        index = object.__new__(SpatialIndex)
+        index.__dict__.update(self.__dict__)
+        dead = set(self._dead)
+        extra = dict(self._extra)
+        tree_size = len(self._order)
+        for position, coordinates in changes.items():
+            if position < tree_size:
+                dead.add(position)
+            if coordinates is None:
+                extra.pop(position, None)
+            else:
+                lat, lon = coordinates
+                extra[position] = (lon * self._kx, lat * self._ky, lat, lon)
+        index._dead = frozenset(dead)
+        index._extra = extra
+        return index
+
+    def coordinates(self, position: int) -> Tuple[float, float]:
+        """Return the (lat, lon) of a position."""
+        if position in self._extra:
+            _, _, lat, lon = self._extra[position]
+            return lat, lon
+        return self._lats[position], self._lons[position]
+
+    def _build(self) -> None:
+        order = self._order
+        stack = [(0, len(order), 0)]
+        while stack:
+            lo, hi, axis = stack.pop()
+            if hi - lo <= self.LEAF_SIZE:
+                continue
+            coords = self._xs if axis == 0 else self._ys
+            order[lo:hi] = sorted(order[lo:hi], key=coords.__getitem__)
+            mid = (lo + hi) // 2
+            stack.append((lo, mid, 1 - axis))
+            stack.append((mid + 1, hi, 1 - axis))
+
+    def _search(self, lo: int, hi: int, axis: int, qx: float, qy: float,
+                k: int, heap: List[Tuple[float, int]]) -> None:
+        xs, ys, order, dead = self._xs, self._ys, self._order, self._dead
+
+        if hi - lo <= self.LEAF_SIZE:
+            for i in order[lo:hi]:
+                if i in dead:
+                    continue
+                dx = xs[i] - qx
+                dy = ys[i] - qy
+                d2 = dx * dx + dy * dy
+                if len(heap) < k:
+                    heapq.heappush(heap, (-d2, i))
+                elif d2 < -heap[0][0]:
+                    heapq.heapreplace(heap, (-d2, i))
+            return
+
+        mid = (lo + hi) // 2
+        node = order[mid]
+        dx = xs[node] - qx
+        dy = ys[node] - qy
+        d2 = dx * dx + dy * dy
+        if node in dead:
+            pass
+        elif len(heap) < k:
+            heapq.heappush(heap, (-d2, node))
+        elif d2 < -heap[0][0]:
+            heapq.heapreplace(heap, (-d2, node))
+
+        diff = (qx - xs[node]) if axis == 0 else (qy - ys[node])
+        if diff < 0:
+            near, far = (lo, mid), (mid + 1, hi)
+        else:
+            near, far = (mid + 1, hi), (lo, mid)
+
+        self._search(near[0], near[1], 1 - axis, qx, qy, k, heap)
+        # Only descend into the far side if it can still contain a closer point
+        if len(heap) < k or diff * diff < -heap[0][0]:
+            self._search(far[0], far[1], 1 - axis, qx, qy, k, heap)
+
+    def _candidates(self, lat: float, lon: float, k: int) -> List[Tuple[float, int]]:
+        """Return up to k (projected distance in km, position) pairs, nearest first."""
+        if k <= 0 or len(self) == 0:
+            return []
+        heap: List[Tuple[float, int]] = []
+        qx, qy = lon * self._kx, lat * self._ky
+        if self._order:
+            self._search(0, len(self._order), 0, qx, qy, k, heap)
+        for i, (x, y, _, _) in self._extra.items():
+            dx = x - qx
+            dy = y - qy
+            d2 = dx * dx + dy * dy
+            if len(heap) < k:
+                heapq.heappush(heap, (-d2, i))
+            elif d2 < -heap[0][0]:
+                heapq.heapreplace(heap, (-d2, i))
+        return sorted((math.sqrt(-neg_d2), i) for neg_d2, i in heap)
+
+    def nearest(self, lat: float, lon: float, k: int = 1, exact: bool = True) -> List[Tuple[float, int]]:
+        """Find the k points nearest to (lat, lon).
+
+        Args:
+            lat: Query latitude
+            lon: Query longitude
+            k: Number of results to return
+            exact: If True, re-rank a few extra tree candidates by geodesic
+                distance so both the ordering and the distances match geopy
+
+        Returns:
+            List of (distance in km, position) pairs sorted by distance
+        """
+        if not exact:
+            return self._candidates(lat, lon, k)
+
+        candidates = self._candidates(lat, lon, k + RERANK_MARGIN)
+        reranked = sorted(
+            (geodesic_km(lat, lon, *self.coordinates(i)), i)
+            for _, i in candidates
+        )
+        return reranked[:k]
@@ -1,15 +1,22 @@
 import os
-import requests
 from dotenv import load_dotenv
-from telegram import Update, constants
-from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes, MessageHandler, filters, ConversationHandler
-from geopy.distance import geodesic
+from telegram import Update, constants, InlineQueryResultArticle, InlineQueryResultsButton, InputTextMessageContent
+from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes, MessageHandler, filters, ConversationHandler, TypeHandler, InlineQueryHandler
 from datetime import datetime
 import pytz
 
-from database_service import init_database, log_user_to_supabase
-from location_service import fetch_all_locations
+from database_service import init_database
+from user_logging_service import log_user, get_user_log_pipeline
+from onemap_service import geocode_postal_code_async
+from http_client import close_http_client
+from catalog_service import get_catalog, CATALOG_PERSIST_SNAPSHOT
+from answer_table import get_answer_table
+from multi_worker import is_primary_process
+from nearest_cache import get_nearest_cache
+from conversation_store import StoredConversationHandler, load_user_data, save_user_data, get_conversation_store
+from location_renderer import compile_location, render_fragment
 from constants import CMD_HELLO, CMD_START, CMD_HELP, CMD_LOCATION, CMD_NEAREST, CMD_FEEDBACK
+from metrics import Timer, NEAREST_PHASE_SECONDS, BOT_COMMANDS
 
 load_dotenv()
 
@@ -18,12 +25,26 @@ WAITING_FOR_COUNT = 1
 WAITING_FOR_LOCATION = 2
 WAITING_FOR_FEEDBACK = 3
 
+# Commands counted by name in the metrics (anything else is counted as "other")
+KNOWN_COMMANDS = {CMD_HELLO, CMD_START, CMD_HELP, CMD_LOCATION, CMD_NEAREST, CMD_FEEDBACK, "cancel"}
+
+# How long Telegram may cache the results of an inline query (seconds)
+INLINE_CACHE_SECONDS = int(os.getenv("INLINE_CACHE_SECONDS", "300"))
+
+# Locations of inline queries are rounded to this many decimals (about 11 m,
+# finer than the 10 m distances are shown with), so a user moving around the
+# same spot gets the same results
+INLINE_COORDINATE_DECIMALS = 4
+
+# Number of nearest locations offered as inline query results
+INLINE_MAX_RESULTS = 5
+
 async def hello(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await update.message.reply_text(f'Hello {update.effective_user.first_name}')
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.effective_user
-    log_user_to_supabase(user)
+    log_user(user)
     await update.message.reply_text(
         "🕌 Ready to help you find prayer spaces!\n\n"
         "📍 Send your location to get started:\n"
@@ -37,7 +58,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.effective_user
-    log_user_to_supabase(user)
+    log_user(user)
     await update.message.reply_text(
         f'To find the nearest musollah 🕌:\n\n'
         f'Tap the attachment icon (paperclip), select "Location", and send your current location 📍.\n\n\n'
@@ -46,7 +67,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         f'/{CMD_HELLO} - Get a greeting\n'
         f'/{CMD_HELP} - Show this help message\n'
         f'/{CMD_LOCATION} - Find nearest prayer space using a postal code\n'
-        f'/{CMD_NEAREST} - Find multiple nearest prayer spaces\n'
+        f'/{CMD_NEAREST} - Find multiple nearest prayer spaces (or /{CMD_NEAREST} 3 119077 to skip the questions)\n'
         f'/{CMD_FEEDBACK} - Send feedback to the developers\n\n'
         "💡 <b>Pro tip:</b> For better accuracy, enable <b>precise location</b> in your phone settings.\n\n"
         f'<b>How to use:</b>\n\n'
@@ -58,95 +79,58 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         parse_mode=constants.ParseMode.HTML
     )
 
-def _get_gmaps_link(location):
-    """Extract or generate Google Maps link from location data."""
-    if "google_maps" in location and location["google_maps"]:
-        return location["google_maps"]
-    elif "lat" in location and "lon" in location:
-        return f"https://www.google.com/maps/search/?api=1&query={location['lat']},{location['lon']}"
-    return ''
-
-def _format_location_details(location, index=None):
+def _format_location_details(result, index=None):
     """Format the details of a location for display.
     
     Args:
-        location: The location data dictionary
+        result: A NearestLocation (the location view and its distance)
         index: Optional index for numbered lists (used in multiple locations display)
         
     Returns:
         Formatted location details as HTML text
     """
-    # Basic location information
-    name_prefix = f"{index}. " if index is not None else ""
-    name = f'<b>{name_prefix}{location["name"]}</b>\n'
-    if (not location["type"] or location["type"].lower() == "musollah") and "musollah" not in location["name"].lower():
-        name = f'<b>{name_prefix}{location["name"]} Musollah</b>\n'
-    
-    # Address and Google Maps link
-    gmaps_link = _get_gmaps_link(location)
-    address_line = ""
-    if "address" in location and location["address"]:
-        if gmaps_link:
-            address_line = f'<b>Address:</b> {location["address"]} (<a href="{gmaps_link}">Google Maps</a>)\n'
-        else:
-            address_line = f'<b>Address:</b> {location["address"]}\n'
-    elif gmaps_link:
-        address_line = f'<b>Address:</b> <a href="{gmaps_link}">Google Maps</a>\n'
-    
-    # Distance
-    distance_line = f'<b>Distance:</b> {location["distance"]:.2f} kilometers\n'
-    
-    # Directions (only if video guide is available)
-    video_guide = location.get("guide", "")
-    directions_line = ""
-    if video_guide:
-        directions_line = f'<b>Directions:</b> <a href="{video_guide}">Directional Video</a>\n'
-    elif location.get("directions"):
-        directions_line = f'<b>Directions:</b> {location.get("directions")}\n'
-    
-    # Additional details
-    details = location.get("details", "")
-    details_lines = f'<b>Additional Info:</b> {details}' if details and details.strip() else ""
-    
-    return name + address_line + distance_line + directions_line + details_lines
+    # Replies for catalog locations use the fragments pre-rendered per snapshot
+    # (see LocationRenderer); this renders a single location from scratch.
+    head, tail = compile_location(result.location)
+    return render_fragment(head, tail, result.distance, index)
 
-def get_nearest_musollah_text(lat, lon, count=1):
-    # Fetch locations from all sources (Google Sheets and API)
-    locations = fetch_all_locations()
-    
+def _nearest_musollah_text(snapshot, lat, lon, count):
     # If no locations are found, inform the user
-    if not locations:
+    if not snapshot or len(snapshot) == 0:
         return (
             "Sorry, I couldn't retrieve the musollah locations at the moment. Please try again later."
         )
     
-    # Calculate distances for all locations
-    for location in locations:
-        location['distance'] = geodesic((lat, lon), (location["lat"], location["lon"])).kilometers
-    
-    # Sort locations by distance
-    sorted_locations = sorted(locations, key=lambda loc: loc['distance'])
-    
-    # Limit to the requested number of locations
-    nearest_locations = sorted_locations[:count]
-    
-    if count == 1:
-        # Single location response
-        return _format_location_details(nearest_locations[0])
-    else:
-        # Multiple locations response
-        response_text = f'<b>🕌 {count} Nearest Prayer Spaces:</b>\n\n'
-        
-        for i, location in enumerate(nearest_locations, 1):
-            response_text += _format_location_details(location, i)
-            if i < len(nearest_locations):  # Add separator between locations except after the last one
-                response_text += "\n\n"
-        
-        return response_text
+    # Query the spatial index for the nearest locations (exact geodesic distances, already sorted),
+    # through the cache of the locations nearest to each small map cell
+    with Timer(NEAREST_PHASE_SECONDS, phase="distance"):
+        nearest = get_nearest_cache().nearest(snapshot, lat, lon, count)
+    return _format_nearest_locations(snapshot, nearest, count)
+
+def _format_nearest_locations(snapshot, nearest, count):
+    # Only the distances and list numbers are filled in; everything else was rendered with the snapshot
+    with Timer(NEAREST_PHASE_SECONDS, phase="format"):
+        return snapshot.renderer.render_nearest(nearest, count)
+
+async def get_nearest_musollah_text_async(lat, lon, count=1):
+    # Read locations from the in-memory catalog (refreshed in the background);
+    # a cold catalog is loaded without blocking the event loop
+    with Timer(NEAREST_PHASE_SECONDS, phase="fetch"):
+        snapshot = await get_catalog().get_snapshot_async()
+    return _nearest_musollah_text(snapshot, lat, lon, count)
+
+def get_precomputed_musollah_text(postal_code, count=1):
+    # Answer from the precomputed postal code table; None if the postal code is not in it
+    # (or the catalog is still cold, in which case the regular path loads it without blocking)
+    snapshot = get_catalog().current_snapshot
+    nearest = get_answer_table().lookup(postal_code, snapshot, count)
+    if not nearest:
+        return None
+    return _format_nearest_locations(snapshot, nearest, count)
 
 async def location_pindrop_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.effective_user
-    log_user_to_supabase(user)
+    log_user(user)
     loading_msg = await update.message.reply_text("Finding the nearest musollah...⏳")
     user_location = update.message.location
     latitude = user_location.latitude
@@ -156,20 +140,18 @@ async def location_pindrop_handler(update: Update, context: ContextTypes.DEFAULT
     if 'nearest_count' in context.user_data:
         count = context.user_data['nearest_count']
         del context.user_data['nearest_count']  # Clear the data after use
-        final_text = get_nearest_musollah_text(latitude, longitude, count)
+        final_text = await get_nearest_musollah_text_async(latitude, longitude, count)
         await loading_msg.edit_text(final_text, parse_mode=constants.ParseMode.HTML)
         return ConversationHandler.END
     else:
         # Regular location handling
-        final_text = get_nearest_musollah_text(latitude, longitude)
+        final_text = await get_nearest_musollah_text_async(latitude, longitude)
         await loading_msg.edit_text(final_text, parse_mode=constants.ParseMode.HTML)
 
 async def location_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    user = update.effective_user
-    log_user_to_supabase(user)
     """Start the conversation flow for the /location command."""
     user = update.effective_user
-    log_user_to_supabase(user)
+    log_user(user)
     
     await update.message.reply_text(
         "📍 Please send me a 6-digit Singapore postal code to find the nearest prayer space.\n\n"
@@ -180,9 +162,9 @@ async def location_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     return WAITING_FOR_LOCATION
 
 async def process_postal_code(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    user = update.effective_user
-    log_user_to_supabase(user)
     """Process the postal code sent by the user."""
+    user = update.effective_user
+    log_user(user)
     loading_msg = await update.message.reply_text("Finding the nearest musollah...⏳")
     postal_code = update.message.text.strip()
     
@@ -190,45 +172,79 @@ async def process_postal_code(update: Update, context: ContextTypes.DEFAULT_TYPE
         await loading_msg.edit_text("Please provide a valid 6-digit Singapore postal code. Example: 119077")
         return WAITING_FOR_LOCATION
 
-    url = f"https://www.onemap.gov.sg/api/common/elastic/search?searchVal={postal_code}&returnGeom=Y&getAddrDetails=N"
-    try:
-        response = requests.get(url)
-        data = response.json()
-        results = data.get('results', [])
-        if not results:
-            await loading_msg.edit_text("Postal code not found. Please check and try again.")
-            return WAITING_FOR_LOCATION
-        lat = float(results[0]['LATITUDE'])
-        lon = float(results[0]['LONGITUDE'])
-    except Exception as e:
-        await loading_msg.edit_text("Error looking up postal code. Please try again later.")
+    # Check if this is part of a /nearest conversation
+    count = context.user_data.get('nearest_count', 1)
+    if not await _reply_with_postal_code_results(loading_msg, postal_code, count):
         return WAITING_FOR_LOCATION
 
-    # Check if this is part of a /nearest conversation
-    if 'nearest_count' in context.user_data:
-        count = context.user_data['nearest_count']
-        del context.user_data['nearest_count']  # Clear the data after use
-        final_text = get_nearest_musollah_text(lat, lon, count)
-        await loading_msg.edit_text(final_text, parse_mode=constants.ParseMode.HTML)
-    else:
-        # Regular location handling
-        final_text = get_nearest_musollah_text(lat, lon)
-        await loading_msg.edit_text(final_text, parse_mode=constants.ParseMode.HTML)
-    
+    context.user_data.pop('nearest_count', None)  # Clear the data after use
     return ConversationHandler.END
 
+async def _reply_with_postal_code_results(loading_msg, postal_code, count) -> bool:
+    """Edit the loading message into the nearest musollahs to a postal code.
+
+    Returns:
+        False if the postal code could not be looked up (the message then says why)
+    """
+    # Hot postal codes are answered straight from the precomputed table
+    final_text = get_precomputed_musollah_text(postal_code, count)
+    if final_text is None:
+        try:
+            coordinates = await geocode_postal_code_async(postal_code)
+            if coordinates is None:
+                await loading_msg.edit_text("Postal code not found. Please check and try again.")
+                return False
+            lat, lon = coordinates
+        except Exception as e:
+            await loading_msg.edit_text("Error looking up postal code. Please try again later.")
+            return False
+        final_text = await get_nearest_musollah_text_async(lat, lon, count)
+
+    await loading_msg.edit_text(final_text, parse_mode=constants.ParseMode.HTML)
+    return True
+
 async def cancel_location(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Cancel the location conversation."""
     await update.message.reply_text("Command cancelled.")
     return ConversationHandler.END
 
 async def nearest_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Start the conversation flow for the /nearest command.
+
+    `/nearest N` skips the question for the count, and `/nearest N <postal code>`
+    answers right away, without any further messages.
+    """
     user = update.effective_user
-    log_user_to_supabase(user)
-    """Start the conversation flow for the /nearest command."""
-    user = update.effective_user
-    log_user_to_supabase(user)
-    
+    log_user(user)
+
+    if context.args:
+        try:
+            count = int(context.args[0])
+        except ValueError:
+            count = 0
+        if count < 1 or len(context.args) > 2:
+            await update.message.reply_text(
+                f"Usage: /{CMD_NEAREST} [count] [postal code]\n\n"
+                f"Example: /{CMD_NEAREST} 3 119077"
+            )
+            return ConversationHandler.END
+        count = min(count, 5)  # Limit to 5 to avoid overly long messages
+        context.user_data['nearest_count'] = count
+
+        if len(context.args) == 2:
+            postal_code = context.args[1]
+            if len(postal_code) == 6 and postal_code.isdigit():
+                loading_msg = await update.message.reply_text("Finding the nearest musollah...⏳")
+                if await _reply_with_postal_code_results(loading_msg, postal_code, count):
+                    context.user_data.pop('nearest_count', None)
+                    return ConversationHandler.END
+                return WAITING_FOR_LOCATION
+            await update.message.reply_text("Please provide a valid 6-digit Singapore postal code. Example: 119077")
+            return WAITING_FOR_LOCATION
+
+        await update.message.reply_text(_nearest_location_prompt(count))
+        return WAITING_FOR_LOCATION
+
     await update.message.reply_text(
         "🔍 How many nearest prayer spaces would you like to see? (maximum 5)\n\n"
         "Please enter a number between 1 and 5.\n\n"
@@ -256,7 +272,12 @@ async def process_count(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     # Store the count in user data
     context.user_data['nearest_count'] = count
     
-    await update.message.reply_text(
+    await update.message.reply_text(_nearest_location_prompt(count))
+    
+    return WAITING_FOR_LOCATION
+
+def _nearest_location_prompt(count):
+    return (
         f"I'll show you the {count} nearest prayer spaces.\n\n"
         f"Please share your location by:\n"
         f"• Tapping the attachment icon (📎)\n"
@@ -265,8 +286,6 @@ async def process_count(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
         f"Or send a 6-digit Singapore postal code.\n\n"
         f"You can cancel anytime by typing /cancel."
     )
-    
-    return WAITING_FOR_LOCATION
 
 async def cancel_nearest(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     # Clear the stored count
@@ -276,12 +295,72 @@ async def cancel_nearest(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     await update.message.reply_text("Command cancelled.")
     return ConversationHandler.END
 
+async def inline_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Answer inline queries: `@bot <postal code>`, or an empty query sent with the user's location.
+
+    Each result is one nearby location; choosing it sends its details to the chat.
+    Everything is answered from the catalog snapshot in this single update, and
+    Telegram caches the results for INLINE_CACHE_SECONDS: per postal code for
+    every user, per user for location queries.
+    """
+    inline_query = update.inline_query
+    query = inline_query.query.strip()
+    with Timer(NEAREST_PHASE_SECONDS, phase="fetch"):
+        snapshot = await get_catalog().get_snapshot_async()
+
+    nearest = []
+    key = None
+    is_personal = True
+    if snapshot and len(snapshot) > 0:
+        if len(query) == 6 and query.isdigit():
+            key = query
+            is_personal = False
+            nearest = get_answer_table().lookup(query, snapshot, INLINE_MAX_RESULTS)
+            if nearest is None:
+                try:
+                    coordinates = await geocode_postal_code_async(query)
+                except Exception as e:
+                    print(f"Error looking up postal code {query} for an inline query: {e}")
+                    coordinates = None
+                nearest = []
+                if coordinates is not None:
+                    with Timer(NEAREST_PHASE_SECONDS, phase="distance"):
+                        nearest = snapshot.index.nearest(*coordinates, INLINE_MAX_RESULTS)
+        elif not query and inline_query.location:
+            lat = round(inline_query.location.latitude, INLINE_COORDINATE_DECIMALS)
+            lon = round(inline_query.location.longitude, INLINE_COORDINATE_DECIMALS)
+            key = f"{lat},{lon}"
+            with Timer(NEAREST_PHASE_SECONDS, phase="distance"):
+                nearest = get_nearest_cache().nearest(snapshot, lat, lon, INLINE_MAX_RESULTS)
+
+    with Timer(NEAREST_PHASE_SECONDS, phase="format"):
+        results = []
+        for distance, position in nearest:
+            location = snapshot.locations[position]
+            description = f"{distance:.2f} km away"
+            if location.get("address"):
+                description += f" · {location['address']}"
+            results.append(InlineQueryResultArticle(
+                # Result ids only need to be unique within one answer
+                id=f"{snapshot.version}:{key}:{position}",
+                title=location["name"],
+                description=description,
+                input_message_content=InputTextMessageContent(
+                    snapshot.renderer.render(position, distance), parse_mode=constants.ParseMode.HTML
+                ),
+            ))
+
+    button = None
+    if not results:
+        button = InlineQueryResultsButton(
+            text="Type a 6-digit postal code or share your location", start_parameter="inline"
+        )
+    await inline_query.answer(results, cache_time=INLINE_CACHE_SECONDS, is_personal=is_personal, button=button)
+
 async def feedback_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    user = update.effective_user
-    log_user_to_supabase(user)
     """Handle the /feedback command to start the feedback conversation flow."""
     user = update.effective_user
-    log_user_to_supabase(user)
+    log_user(user)
     
     await update.message.reply_text(
         "📝 We'd love to hear your feedback! Please type your message below.\n\n"
@@ -342,6 +421,25 @@ async def cancel_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     await update.message.reply_text("Feedback cancelled.")
     return ConversationHandler.END
 
+async def _count_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Count every bot command and inline query received (runs before the regular handlers)."""
+    message = update.effective_message
+    if message and message.text and message.text.startswith("/"):
+        command = message.text.split()[0][1:].split("@")[0].lower()
+        BOT_COMMANDS.inc(command=command if command in KNOWN_COMMANDS else "other")
+    elif update.inline_query:
+        BOT_COMMANDS.inc(command="inline")
+
+async def _post_init(app) -> None:
+    """Start background workers when the bot starts (polling mode)."""
+    await get_user_log_pipeline().start()
+
+async def _post_shutdown(app) -> None:
+    """Flush pending user logs and conversation states, and release the shared HTTP connection pool (polling mode)."""
+    await get_user_log_pipeline().stop()
+    get_conversation_store().close()
+    await close_http_client()
+
 def create_bot_app():
     environment = os.getenv("ENVIRONMENT", "dev").lower()
     
@@ -354,17 +452,45 @@ def create_bot_app():
         print(f"Error: TELEGRAM_BOT_TOKEN_{environment.upper()} environment variable not set.")
         return None
 
-    app = ApplicationBuilder().token(token).build()
+    builder = ApplicationBuilder().token(token).post_init(_post_init).post_shutdown(_post_shutdown)
+
+    # Point the bot at another Bot API server (e.g. a local stub for benchmarks)
+    base_url = os.getenv("TELEGRAM_API_BASE_URL")
+    if base_url:
+        builder = builder.base_url(base_url)
+
+    app = builder.build()
 
-    init_database()
+    if is_primary_process():
+        init_database()
+
+    # Load the location catalog now and keep it fresh in the background,
+    # updating the precomputed postal code answers whenever it changes
+    get_catalog().add_refresh_listener(get_answer_table().update)
+    if CATALOG_PERSIST_SNAPSHOT:
+        # Answer from the snapshot saved before the restart until the sources have been fetched
+        get_catalog().persist_snapshots()
+    get_catalog().start()
+
+    # Conversation states and user_data live in the conversation store, so that
+    # consecutive updates of a flow can be handled by different worker processes
+    app.add_handler(TypeHandler(Update, load_user_data), group=-2)
+    app.add_handler(TypeHandler(Update, save_user_data), group=1)
+
+    # Count commands before any other handler sees them
+    app.add_handler(TypeHandler(Update, _count_command), group=-1)
 
     # Regular command handlers
     app.add_handler(CommandHandler(CMD_HELLO, hello))
     app.add_handler(CommandHandler(CMD_START, start_command))
     app.add_handler(CommandHandler(CMD_HELP, help_command))
+
+    # Inline queries (@bot <postal code>, or with the user's location)
+    app.add_handler(InlineQueryHandler(inline_query_handler))
     
     # Conversation handler for /location command
-    location_conv_handler = ConversationHandler(
+    location_conv_handler = StoredConversationHandler(
+        name="location",
         entry_points=[CommandHandler(CMD_LOCATION, location_command)],
         states={
             WAITING_FOR_LOCATION: [
@@ -376,7 +502,8 @@ def create_bot_app():
     app.add_handler(location_conv_handler)
     
     # Conversation handler for /nearest command
-    nearest_conv_handler = ConversationHandler(
+    nearest_conv_handler = StoredConversationHandler(
+        name="nearest",
         entry_points=[CommandHandler(CMD_NEAREST, nearest_command)],
         states={
             WAITING_FOR_COUNT: [
@@ -392,7 +519,8 @@ def create_bot_app():
     app.add_handler(nearest_conv_handler)
     
     # Conversation handler for /feedback command
-    feedback_conv_handler = ConversationHandler(
+    feedback_conv_handler = StoredConversationHandler(
+        name="feedback",
         entry_points=[CommandHandler(CMD_FEEDBACK, feedback_command)],
         states={
             WAITING_FOR_FEEDBACK: [
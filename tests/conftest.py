@@ -0,0 +1,16 @@
+import os
+import sys
+import tempfile
+
+# The bot's modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings are read at import time: keep local files out of the working tree and retries short
+_workdir = tempfile.mkdtemp(prefix="musollah-tests-")
+os.environ.update({
+    "GEOCODE_CACHE_PATH": os.path.join(_workdir, "geocode.sqlite3"),
+    "ANSWER_TABLE_PATH": os.path.join(_workdir, "answers.json"),
+    "CONVERSATION_STORE_PATH": os.path.join(_workdir, "conversations.sqlite3"),
+    "CATALOG_SNAPSHOT_PATH": os.path.join(_workdir, "catalog.snapshot"),
+    "SOURCE_RETRY_BACKOFF_SECONDS": "0.01",
+})
@@ -0,0 +1,143 @@
+import random
+import time
+
+import pytest
+
+from answer_table import AnswerTable
+from catalog_service import CatalogSnapshot
+
+LAT_RANGE = (1.22, 1.47)
+LON_RANGE = (103.6, 104.05)
+
+
+def location(i, lat, lon):
+    return {"name": f"Location {i}", "lat": lat, "lon": lon, "address": "", "directions": "", "details": "",
+            "google_maps": None, "type": "Musollah", "guide": None}
+
+
+@pytest.fixture
+def snapshot():
+    rng = random.Random(0)
+    locations = [location(i, rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)) for i in range(300)]
+    return CatalogSnapshot(1, locations, time.monotonic())
+
+
+@pytest.fixture
+def postal_codes():
+    rng = random.Random(1)
+    return {f"{100000 + i}": (rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)) for i in range(50)}
+
+
+def assert_matches_index(table, snapshot, postal_codes):
+    for postal_code, (lat, lon) in postal_codes.items():
+        expected = snapshot.index.nearest(lat, lon, 5)
+        answer = table.lookup(postal_code, snapshot, 5)
+        assert [position for _, position in answer] == [position for _, position in expected]
+        # Saved distances are rounded to the millimeter
+        assert [distance for distance, _ in answer] == pytest.approx([distance for distance, _ in expected], abs=1e-6)
+
+
+def test_answers_match_the_spatial_index(tmp_path, snapshot, postal_codes):
+    table = AnswerTable(str(tmp_path / "answers.json"))
+    table.add_postal_codes(postal_codes)
+    table.update(snapshot)
+    assert len(table) == len(postal_codes)
+    assert_matches_index(table, snapshot, postal_codes)
+    assert table.lookup("100000", snapshot, 2) == table.lookup("100000", snapshot, 5)[:2]
+    assert table.lookup("999999", snapshot) is None
+
+
+def test_patched_snapshots_update_only_affected_answers(tmp_path, snapshot, postal_codes):
+    table = AnswerTable(str(tmp_path / "answers.json"))
+    table.add_postal_codes(postal_codes)
+    table.update(snapshot)
+
+    # Remove the nearest location of one postal code and add one right next to another
+    lat, lon = postal_codes["100003"]
+    _, removed = snapshot.index.nearest(*postal_codes["100001"], 1)[0]
+    changes = {removed: None, len(snapshot.locations): location(999, lat + 0.0001, lon)}
+    patched = snapshot.patched(2, changes, time.monotonic())
+    table.update(patched)
+
+    assert_matches_index(table, patched, postal_codes)
+    assert table.lookup("100003", patched)[0][1] == len(snapshot.locations)
+
+
+def test_answers_are_only_served_for_their_snapshot(tmp_path, snapshot, postal_codes):
+    table = AnswerTable(str(tmp_path / "answers.json"))
+    table.add_postal_codes(postal_codes)
+    table.update(snapshot)
+    other = CatalogSnapshot(2, [location(i, *point) for i, point in enumerate(postal_codes.values())],
+                            time.monotonic())
+    assert table.lookup("100000", other) is None
+    assert table.lookup("100000", None) is None
+
+
+def test_saved_table_is_reloaded(tmp_path, snapshot, postal_codes):
+    path = str(tmp_path / "answers.json")
+    table = AnswerTable(path)
+    table.add_postal_codes(postal_codes)
+    table.update(snapshot)
+
+    loaded = AnswerTable.load(path)
+    assert len(loaded) == len(postal_codes)
+    # Loaded answers are served once the table has seen the current snapshot
+    assert loaded.lookup("100000", snapshot) is None
+    loaded.update(snapshot)
+    assert_matches_index(loaded, snapshot, postal_codes)
+
+
+def test_following_table_reloads_the_saved_one(tmp_path, snapshot, postal_codes):
+    path = str(tmp_path / "answers.json")
+    main = AnswerTable(path)
+    main.add_postal_codes(postal_codes)
+    main.update(snapshot)
+
+    worker = AnswerTable.load(path, follow_file=True)
+    worker.update(snapshot)
+    assert_matches_index(worker, snapshot, postal_codes)
+
+    # The worker picks up the table the main process saved for the next snapshot, and never saves its own
+    patched = snapshot.patched(2, {0: None, 1: None}, time.monotonic())
+    main.update(patched)
+    saved = (tmp_path / "answers.json").read_bytes()
+    worker.update(patched)
+    assert_matches_index(worker, patched, postal_codes)
+    assert (tmp_path / "answers.json").read_bytes() == saved
+
+
+def test_ties_are_ranked_like_the_spatial_index(tmp_path):
+    # Same place under two names; the later position sorts first by key
+    locations = [location("Zeta", 1.3, 103.8), location("Alpha", 1.3, 103.8), location(2, 1.31, 103.8)]
+    snapshot = CatalogSnapshot(1, locations, time.monotonic())
+    table = AnswerTable(str(tmp_path / "answers.json"))
+    table.add_postal_codes({"100000": (1.301, 103.8)})
+    table.update(snapshot)
+    assert_matches_index(table, snapshot, {"100000": (1.301, 103.8)})
+
+
+def test_table_built_from_the_catalog_matches_it_after_a_restart(tmp_path, postal_codes, capsys):
+    from catalog_service import LocationCatalog
+
+    rng = random.Random(2)
+    sheet = [location(i, rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)) for i in range(100)]
+    # The API lists some of the same places with less detail; the catalog merges them
+    api = [dict(record, address=None, type="Musollah") for record in sheet[:30]]
+
+    def catalog():
+        return LocationCatalog(sources={"sheets": lambda fingerprint: (1, sheet), "api": lambda fingerprint: (1, api)},
+                               async_sources={})
+
+    path = str(tmp_path / "answers.json")
+    offline = AnswerTable(path)
+    offline.add_postal_codes(postal_codes)
+    offline.update(catalog().get_snapshot())
+    offline.save()
+
+    capsys.readouterr()
+    snapshot = catalog().get_snapshot()
+    assert len(snapshot) == len(sheet)
+    served = AnswerTable.load(path)
+    served.update(snapshot)
+    assert "0 recomputed, 0 added, 0 removed locations" in capsys.readouterr().out
+    assert_matches_index(served, snapshot, postal_codes)
@@ -0,0 +1,80 @@
+import io
+import json
+
+import pytest
+import requests
+
+import api_service
+
+ITEMS = [
+    {"ID": 1, "Place": "Central Library", "Latitude": "1.2966", "Longitude": "103.7764",
+     "Address": "12 Kent Ridge Crescent", "LocationIn": "Level 2", "Details": "", "Type": "Musollah"},
+    {"ID": 2, "Place": "Broken", "Latitude": "north", "Longitude": "103.85"},
+]
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """Serve the musollah list from memory, honouring If-None-Match; records the request headers."""
+    server = {"body": json.dumps(ITEMS).encode(), "etag": "", "requests": []}
+
+    def get(url, headers=None, **kwargs):
+        server["requests"].append(dict(headers))
+        response = requests.Response()
+        response.url = url
+        if server["etag"] and headers.get("If-None-Match") == server["etag"]:
+            response.status_code = 304
+            response.raw = io.BytesIO(b"")
+            return response
+        response.status_code = 200
+        response.raw = server["stream"] = io.BytesIO(server["body"])
+        if server["etag"]:
+            response.headers["ETag"] = server["etag"]
+        return response
+
+    monkeypatch.setattr(api_service, "API_CHUNK_BYTES", 16)
+    monkeypatch.setattr(api_service.requests, "get", get)
+    return server
+
+
+def test_first_fetch_converts_the_list(api):
+    fingerprint, locations = api_service.fetch_api_locations_if_changed()
+    assert [location.name for location in locations] == ["Central Library"]
+    assert fingerprint == {"etag": "", "last_modified": "", "sha1": fingerprint["sha1"]}
+    assert "If-None-Match" not in api["requests"][0]
+
+
+def test_unchanged_body_reports_no_change(api):
+    fingerprint, _ = api_service.fetch_api_locations_if_changed()
+    assert api_service.fetch_api_locations_if_changed(fingerprint) == (fingerprint, None)
+
+
+def test_unchanged_body_is_parsed_while_it_downloads(api, monkeypatch):
+    fingerprint, _ = api_service.fetch_api_locations_if_changed()
+    # Stream position when each item is converted: the body is never read in full up front
+    read = []
+    convert = api_service.api_item_location
+
+    def recording(item):
+        read.append(api["stream"].tell())
+        return convert(item)
+
+    monkeypatch.setattr(api_service, "api_item_location", recording)
+    assert api_service.fetch_api_locations_if_changed(fingerprint) == (fingerprint, None)
+    assert read[0] < len(api["body"])
+
+
+def test_changed_body_is_converted(api):
+    fingerprint, _ = api_service.fetch_api_locations_if_changed()
+    api["body"] = json.dumps([dict(ITEMS[0], Place="Renamed")]).encode()
+    new_fingerprint, locations = api_service.fetch_api_locations_if_changed(fingerprint)
+    assert new_fingerprint["sha1"] != fingerprint["sha1"]
+    assert [location.name for location in locations] == ["Renamed"]
+
+
+def test_not_modified_response_keeps_the_fingerprint(api):
+    api["etag"] = '"v1"'
+    fingerprint, locations = api_service.fetch_api_locations_if_changed()
+    assert fingerprint["etag"] == '"v1"' and locations
+    assert api_service.fetch_api_locations_if_changed(fingerprint) == (fingerprint, None)
+    assert api["requests"][-1]["If-None-Match"] == '"v1"'
@@ -0,0 +1,226 @@
+import asyncio
+import random
+import threading
+import time
+from unittest.mock import AsyncMock
+
+import pytest
+
+import catalog_service
+from catalog_service import LocationCatalog
+
+
+def location(i, lat=None, details="Ablution area available"):
+    return {
+        "name": f"Location {i}", "lat": lat if lat is not None else 1.3 + i * 0.001, "lon": 103.8,
+        "address": f"{i} Example Road", "directions": "Level 2", "details": details,
+        "google_maps": None, "type": "Musollah", "guide": None,
+    }
+
+
+class FakeSource:
+    """Change-aware source serving `locations`; its fingerprint changes with every edit."""
+
+    def __init__(self, locations):
+        self.locations = list(locations)
+        self.version = 1
+        self.calls = 0
+        self.error = None
+
+    def set(self, locations):
+        self.locations = list(locations)
+        self.version += 1
+
+    def __call__(self, fingerprint):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        if fingerprint == self.version:
+            return fingerprint, None
+        return self.version, list(self.locations)
+
+
+def make_catalog(*sources):
+    return LocationCatalog(sources={f"source{i}": source for i, source in enumerate(sources)}, async_sources={})
+
+
+def live(snapshot):
+    return {location["name"]: position for position, location in enumerate(snapshot.locations) if location}
+
+
+def test_cold_load_and_nearest():
+    catalog = make_catalog(FakeSource([location(i) for i in range(10)]))
+    snapshot = catalog.get_snapshot()
+    assert snapshot.version == 1
+    assert len(snapshot) == 10
+    assert [result.location["name"] for result in snapshot.nearest(1.3029, 103.8, 2)] == ["Location 3", "Location 2"]
+
+
+def test_unchanged_source_keeps_the_snapshot():
+    source = FakeSource([location(i) for i in range(5)])
+    catalog = make_catalog(source)
+    snapshot = catalog.get_snapshot()
+    assert catalog.refresh() is False
+    assert catalog.get_snapshot() is snapshot
+    assert catalog.unchanged_refreshes == 1
+
+
+def test_incremental_refresh_patches_only_changes():
+    source = FakeSource([location(i) for i in range(10)])
+    catalog = make_catalog(source)
+    before = catalog.get_snapshot()
+    positions = live(before)
+
+    source.set([location(i, details="Renovated" if i == 4 else "Ablution area available")
+                for i in range(10) if i != 2] + [location(10)])
+    assert catalog.refresh() is True
+    after = catalog.get_snapshot()
+
+    assert after.version == 2
+    assert catalog.last_change == {"added": 1, "removed": 1, "modified": 1, "duplicates_merged": 0}
+    assert len(after) == 10
+    # Unchanged locations keep their position; the removed one's slot is reused by the new one
+    for name, position in live(after).items():
+        if name != "Location 10":
+            assert positions[name] == position
+    assert live(after)["Location 10"] == positions["Location 2"]
+    assert after.locations[positions["Location 4"]]["details"] == "Renovated"
+    assert after.nearest(1.310, 103.8, 1)[0].location["name"] == "Location 10"
+    # The previous snapshot is untouched
+    assert before.locations[positions["Location 4"]]["details"] == "Ablution area available"
+    assert "Location 2" in live(before)
+
+
+def test_failed_source_keeps_its_last_good_locations():
+    good = FakeSource([location(i) for i in range(5)])
+    flaky = FakeSource([location(i) for i in range(5, 8)])
+    catalog = make_catalog(good, flaky)
+    assert len(catalog.get_snapshot()) == 8
+
+    flaky.error = RuntimeError("down")
+    good.set([location(i) for i in range(4)])
+    assert catalog.refresh() is True
+    assert len(catalog.get_snapshot()) == 7
+    assert catalog.refresh_failures == 1
+    assert "down" in catalog.last_error
+
+
+def test_many_removals_compact_the_snapshot(monkeypatch):
+    monkeypatch.setattr(catalog_service, "CATALOG_MAX_PATCH_SIZE", 4)
+    monkeypatch.setattr(catalog_service, "CATALOG_MAX_PATCH_FRACTION", 0)
+    source = FakeSource([location(i) for i in range(20)])
+    catalog = make_catalog(source)
+    catalog.get_snapshot()
+
+    source.set([location(i) for i in range(0, 20, 2)])
+    catalog.refresh()
+    snapshot = catalog.get_snapshot()
+    assert catalog.full_rebuilds == 2  # The first load and the compaction
+    assert snapshot.fragmentation == 0
+    assert len(snapshot.locations) == len(snapshot) == 10
+    assert sorted(live(snapshot)) == sorted(f"Location {i}" for i in range(0, 20, 2))
+
+    # Positions are tracked correctly after compaction
+    source.set([location(i) for i in range(0, 20, 2)] + [location(99, lat=1.4)])
+    catalog.refresh()
+    assert catalog.get_snapshot().nearest(1.4, 103.8, 1)[0].location["name"] == "Location 99"
+
+
+def test_listeners_see_every_new_snapshot():
+    source = FakeSource([location(i) for i in range(3)])
+    catalog = make_catalog(source)
+    versions = []
+    catalog.add_refresh_listener(lambda snapshot: versions.append(snapshot.version))
+    catalog.get_snapshot()
+    catalog.refresh()
+    source.set([location(i) for i in range(4)])
+    catalog.refresh()
+    assert versions == [1, 2]
+
+
+@pytest.mark.parametrize("down", [(), ("source1",), ("source0", "source1")])
+def test_restored_snapshot_is_served_until_every_source_answers(tmp_path, down):
+    path = str(tmp_path / "catalog.snapshot")
+    sources = [FakeSource([location(i) for i in range(5)]), FakeSource([location(i) for i in range(5, 9)])]
+    first = make_catalog(*sources)
+    assert first.persist_snapshots(path) is False
+    first.refresh()
+
+    restarted = make_catalog(*sources)
+    for i, source in enumerate(sources):
+        source.error = RuntimeError("down") if f"source{i}" in down else None
+    sources[0].set([location(i) for i in range(4)])
+    assert restarted.persist_snapshots(path) is True
+    snapshot = restarted.get_snapshot()
+    assert (snapshot.version, len(snapshot)) == (1, 9)
+
+    restarted.refresh()
+    if down:
+        assert restarted.get_snapshot() is snapshot
+        assert restarted.stats()["restored_from"] == path
+    else:
+        assert (restarted.get_snapshot().version, len(restarted.get_snapshot())) == (2, 8)
+        assert restarted.stats()["restored_from"] is None
+
+
+def test_async_refresh_builds_the_snapshot_off_the_event_loop():
+    async_source = AsyncMock(return_value=[location(i) for i in range(3)])
+    catalog = LocationCatalog(sources={"source0": FakeSource([])}, async_sources={"source0": async_source})
+    threads = []
+    catalog.add_refresh_listener(lambda snapshot: threads.append(threading.get_ident()))
+
+    async def main():
+        snapshot = await catalog.get_snapshot_async()
+        return snapshot, threading.get_ident()
+
+    snapshot, loop_thread = asyncio.run(main())
+    assert len(snapshot) == 3
+    assert threads and loop_thread not in threads
+
+
+def test_async_cold_start_waits_for_the_background_load():
+    started, release = threading.Event(), threading.Event()
+    source = FakeSource([location(i) for i in range(3)])
+
+    def slow_source(fingerprint):
+        started.set()
+        release.wait(5)
+        return source(fingerprint)
+
+    async_source = AsyncMock(return_value=[location(i) for i in range(3)])
+    catalog = LocationCatalog(sources={"source0": slow_source}, async_sources={"source0": async_source})
+    catalog.start()
+    try:
+        assert started.wait(5)
+
+        async def main():
+            waiting = asyncio.ensure_future(catalog.get_snapshot_async())
+            await asyncio.sleep(0.05)
+            assert not waiting.done()
+            release.set()
+            return await waiting
+
+        snapshot = asyncio.run(main())
+    finally:
+        release.set()
+        catalog.stop()
+    assert (snapshot.version, len(snapshot)) == (1, 3)
+    assert source.calls == 1
+    async_source.assert_not_called()
+
+
+def test_restart_answers_from_a_realistic_snapshot_within_100_ms(tmp_path):
+    path = str(tmp_path / "catalog.snapshot")
+    rng = random.Random(0)
+    locations = [location(i, lat=rng.uniform(1.22, 1.47)) for i in range(20000)]
+    catalog_service.save_snapshot(catalog_service.CatalogSnapshot(1, locations, time.monotonic()), path)
+
+    started = time.perf_counter()
+    restarted = make_catalog()
+    assert restarted.persist_snapshots(path) is True
+    snapshot = restarted.get_snapshot()
+    reply = snapshot.renderer.render_nearest(snapshot.index.nearest(1.3, 103.8, 5), 5)
+    elapsed = time.perf_counter() - started
+
+    assert len(snapshot) == len(locations) and reply.startswith("<b>🕌 5 Nearest Prayer Spaces:</b>")
+    assert elapsed < 0.1
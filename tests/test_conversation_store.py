@@ -0,0 +1,161 @@
+import asyncio
+import time
+
+import pytest
+from telegram import Update, User
+from telegram.ext import ApplicationBuilder, CommandHandler, ConversationHandler, MessageHandler, TypeHandler, filters
+
+import conversation_store
+from conversation_store import MemoryConversationStore, SQLiteConversationStore, StoredConversationHandler
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "conversations.sqlite3")
+
+
+def test_values_are_copies():
+    store = MemoryConversationStore()
+    store.set_user_data(7, {"radius": 500})
+    store.get_user_data(7)["radius"] = 1
+    assert store.get_user_data(7) == {"radius": 500}
+    store.set_user_data(7, {})
+    assert store.get_user_data(7) == {}
+
+
+def test_memory_entries_expire():
+    store = MemoryConversationStore(ttl=0.05)
+    store.set_state("search", (7, 7), 1)
+    assert store.get_state("search", (7, 7)) == 1
+    time.sleep(0.06)
+    assert store.get_state("search", (7, 7)) is None
+    assert store.cleanup() == 1
+
+
+def test_sqlite_store_survives_restart(path):
+    store = SQLiteConversationStore(path, flush_interval=60)
+    store.set_state("search", (7, 7), 2)
+    store.set_user_data(7, {"radius": 500})
+    store.close()
+
+    restarted = SQLiteConversationStore(path, flush_interval=60)
+    assert restarted.get_state("search", (7, 7)) == 2
+    assert restarted.get_user_data(7) == {"radius": 500}
+    restarted.set_state("search", (7, 7), None)
+    restarted.close()
+    assert SQLiteConversationStore(path, flush_interval=60).get_state("search", (7, 7)) is None
+
+
+def test_write_behind_store_writes_in_the_background(path):
+    store = SQLiteConversationStore(path, flush_interval=60)
+    store.set_user_data(7, {"radius": 500})
+    asyncio.run(store.commit())
+    # Not shared: nothing is written until the next flush
+    assert store.stats()["pending"] == 1
+    store.flush()
+    assert store.stats()["pending"] == 0 and store.stats()["flushed_entries"] == 1
+
+
+def test_shared_stores_see_each_others_commits(path):
+    first = SQLiteConversationStore(path, flush_interval=60, shared=True)
+    second = SQLiteConversationStore(path, flush_interval=60, shared=True)
+    entries = [("user_data", "7")]
+
+    async def scenario():
+        first.set_user_data(7, {"radius": 500})
+        await first.commit()
+        await second.load(entries)
+        seen = second.get_user_data(7)
+        second.set_user_data(7, {})
+        await second.commit()
+        await first.load(entries)
+        return seen, first.get_user_data(7)
+
+    assert asyncio.run(scenario()) == ({"radius": 500}, {})
+
+
+def make_app(log):
+    async def start(update, context):
+        context.user_data["radius"] = 500
+        log.append("start")
+        return 1
+
+    async def reply(update, context):
+        log.append((update.message.text, context.user_data.get("radius")))
+        return ConversationHandler.END
+
+    app = ApplicationBuilder().token("123:abc").updater(None).build()
+    app.add_handler(TypeHandler(Update, conversation_store.load_user_data), group=-2)
+    app.add_handler(TypeHandler(Update, conversation_store.save_user_data), group=1)
+    app.add_handler(StoredConversationHandler(
+        name="search",
+        entry_points=[CommandHandler("start", start)],
+        states={1: [MessageHandler(filters.TEXT & ~filters.COMMAND, reply)]},
+        fallbacks=[],
+    ))
+    # Updates are fed to process_update() directly, without contacting Telegram
+    app._initialized = True
+    app.bot._initialized = True
+    app.bot._bot_user = User(1, "bot", True, username="bot")
+    return app
+
+
+def make_update(update_id, text, bot):
+    message = {"message_id": update_id, "date": int(time.time()), "chat": {"id": 7, "type": "private"},
+               "from": {"id": 7, "is_bot": False, "first_name": "User"}, "text": text}
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+    return Update.de_json({"update_id": update_id, "message": message}, bot)
+
+
+def test_conversation_continues_in_another_worker(path, monkeypatch):
+    log = []
+    first, second = make_app(log), make_app(log)
+    first_store = SQLiteConversationStore(path, flush_interval=60, shared=True)
+    second_store = SQLiteConversationStore(path, flush_interval=60, shared=True)
+
+    async def scenario():
+        monkeypatch.setattr(conversation_store, "_store", first_store)
+        await first.process_update(make_update(1, "/start", first.bot))
+        monkeypatch.setattr(conversation_store, "_store", second_store)
+        await second.process_update(make_update(2, "hello", second.bot))
+        # The conversation ended in the second worker, so the first one ignores this
+        monkeypatch.setattr(conversation_store, "_store", first_store)
+        await first.process_update(make_update(3, "again", first.bot))
+
+    asyncio.run(scenario())
+    assert log == ["start", ("hello", 500)]
+
+
+def test_stores_must_implement_the_entry_methods():
+    with pytest.raises(TypeError):
+        conversation_store.ConversationStore()
+
+    class ReadOnlyStore(conversation_store.ConversationStore):
+        def _get(self, table, key):
+            return None
+
+    with pytest.raises(TypeError):
+        ReadOnlyStore()
+
+
+def test_ptb_conversation_handler_internals():
+    # StoredConversationHandler relies on these non-public ConversationHandler members;
+    # if this fails after upgrading python-telegram-bot, adapt StoredConversationHandler
+    handler = StoredConversationHandler(name="search", entry_points=[CommandHandler("start", lambda u, c: None)],
+                                        states={}, fallbacks=[])
+    bot = make_app([]).bot
+    update = make_update(1, "/start", bot)
+    assert isinstance(handler._conversations, dict)
+    assert handler._get_key(update) == (7, 7)
+    handler._conversations[(7, 7)] = 1
+    # check_update() replaces the handler's state with the stored one (none here: the conversation ended)
+    handler.check_update(update)
+    assert (7, 7) not in handler._conversations
+
+
+def test_missing_ptb_internals_are_reported(monkeypatch):
+    monkeypatch.delattr(ConversationHandler, "_get_key")
+    with pytest.raises(RuntimeError, match="_get_key"):
+        StoredConversationHandler(name="search", entry_points=[CommandHandler("start", lambda u, c: None)],
+                                  states={}, fallbacks=[])
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+from geographiclib.geodesic import Geodesic
+
+from distance_engine import DistanceEngine
+
+# Haversine on the mean sphere vs. WGS-84 geodesic around Singapore (see the module docstring)
+MAX_RELATIVE_ERROR = 0.006
+
+# Roughly the bounding box of Singapore
+LAT_RANGE = (1.22, 1.47)
+LON_RANGE = (103.6, 104.05)
+
+
+def geodesic_km(lat1, lon1, lat2, lon2):
+    return Geodesic.WGS84.Inverse(lat1, lon1, lat2, lon2, Geodesic.DISTANCE)["s12"] / 1000
+
+
+@pytest.fixture(scope="module")
+def points():
+    rng = np.random.default_rng(0)
+    return rng.uniform(*LAT_RANGE, 2000), rng.uniform(*LON_RANGE, 2000)
+
+
+@pytest.fixture(scope="module")
+def queries():
+    rng = np.random.default_rng(1)
+    return list(zip(rng.uniform(*LAT_RANGE, 20), rng.uniform(*LON_RANGE, 20)))
+
+
+@pytest.fixture(scope="module")
+def exact(points, queries):
+    """Geodesic distances from every query to every point."""
+    lats, lons = points
+    return [np.array([geodesic_km(*query, lat, lon) for lat, lon in zip(lats, lons)]) for query in queries]
+
+
+def test_relative_error_is_bounded(points, queries, exact):
+    engine = DistanceEngine(*points)
+    for query, distances in zip(queries, exact):
+        relative = np.abs(engine.distances(*query) - distances) / distances
+        assert relative.max() < MAX_RELATIVE_ERROR
+
+
+def test_north_south_and_east_west_errors_have_opposite_signs():
+    engine = DistanceEngine([1.3 + 0.05, 1.3], [103.8, 103.8 + 0.05])
+    haversine = engine.distances(1.3, 103.8)
+    exact = [geodesic_km(1.3, 103.8, 1.35, 103.8), geodesic_km(1.3, 103.8, 1.3, 103.85)]
+    assert haversine[0] > exact[0]
+    assert haversine[1] < exact[1]
+
+
+@pytest.mark.parametrize("k", [1, 5, 20])
+def test_top_k_agrees_with_geodesic(points, queries, exact, k):
+    engine = DistanceEngine(*points)
+    for query, distances in zip(queries, exact):
+        haversine_top = [position for _, position in engine.nearest(*query, k=k)]
+        exact_top = list(np.argsort(distances)[:k])
+        # Rankings may only differ between locations whose geodesic distances are
+        # within the error margin of the k-th nearest one
+        boundary = distances[exact_top[-1]]
+        for position in set(haversine_top) ^ set(exact_top):
+            assert abs(distances[position] - boundary) <= 2 * MAX_RELATIVE_ERROR * boundary
+        assert sorted(distances[haversine_top]) == pytest.approx(sorted(distances[exact_top]),
+                                                                 rel=2 * MAX_RELATIVE_ERROR)
+
+
+def test_nearest_is_sorted_and_matches_distances(points):
+    lats, lons = points
+    engine = DistanceEngine(lats, lons)
+    distances = engine.distances(1.3, 103.8)
+    nearest = engine.nearest(1.3, 103.8, k=10)
+    assert [d for d, _ in nearest] == sorted(d for d, _ in nearest)
+    assert [p for _, p in nearest] == list(np.argsort(distances)[:10])
+
+
+def test_nearest_batch_matches_single_queries(points, queries, monkeypatch):
+    lats, lons = points
+    engine = DistanceEngine(lats, lons)
+    # Force several blocks
+    monkeypatch.setattr("distance_engine.BATCH_BLOCK_ELEMENTS", len(engine) * 3)
+    assert engine.nearest_batch(queries, k=3) == [engine.nearest(*query, k=3) for query in queries]
+
+
+def test_k_larger_than_catalog_returns_everything():
+    engine = DistanceEngine([1.3, 1.31], [103.8, 103.81])
+    assert [p for _, p in engine.nearest(1.3, 103.8, k=5)] == [0, 1]
+    assert engine.nearest(1.3, 103.8, k=0) == []
+
+
+def test_patched_engine_skips_removed_positions():
+    engine = DistanceEngine([1.3, 1.31, 1.32], [103.8, 103.8, 103.8])
+    patched = engine.patched({0: None, 3: (1.3001, 103.8)}, size=4)
+    assert [p for _, p in patched.nearest(1.3, 103.8, k=4)] == [3, 1, 2]
+    # The original engine is unchanged
+    assert [p for _, p in engine.nearest(1.3, 103.8, k=3)] == [0, 1, 2]
@@ -0,0 +1,110 @@
+import asyncio
+import threading
+
+import pytest
+
+from geocode_cache import NOT_FOUND, GeocodeCache, normalize_postal_code
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "geocode.sqlite3")
+
+
+def test_normalize_postal_code():
+    assert normalize_postal_code(" 18956 ") == "018956"
+
+
+def test_entries_are_kept_on_disk(path):
+    cache = GeocodeCache(path)
+    assert cache.get("119077") is None
+    cache.put("119077", 1.2966, 103.7764)
+    assert cache.get("119077") == (1.2966, 103.7764)
+
+    reopened = GeocodeCache(path)
+    assert reopened.get("119077") == (1.2966, 103.7764)
+    assert reopened.get("119077") == (1.2966, 103.7764)
+    assert (reopened.disk_hits, reopened.memory_hits) == (1, 1)
+
+
+def test_not_found_entries_expire(path, monkeypatch):
+    cache = GeocodeCache(path, negative_ttl=60)
+    cache.put_missing("999999")
+    assert cache.get("999999") is NOT_FOUND
+    assert GeocodeCache(path, negative_ttl=60).get("999999") is NOT_FOUND
+    # Expired both in memory and on disk
+    assert GeocodeCache(path, negative_ttl=0).get("999999") is None
+    monkeypatch.setattr("geocode_cache.time.time", lambda: 2e10)
+    assert cache.get("999999") is None
+
+
+def test_found_coordinates_replace_a_not_found_entry(path):
+    cache = GeocodeCache(path)
+    cache.put_missing("018956")
+    cache.put("018956", 1.29, 103.85)
+    assert cache.get("018956") == (1.29, 103.85)
+    assert GeocodeCache(path).get("018956") == (1.29, 103.85)
+
+
+def test_memory_is_bounded(path):
+    cache = GeocodeCache(path, max_size=2)
+    for code in ("100001", "100002", "100003"):
+        cache.put(code, 1.3, 103.8)
+    assert cache.stats()["memory_entries"] == 2
+    # Evicted entries are still on disk
+    assert cache.get("100001") == (1.3, 103.8)
+
+
+def test_async_methods_keep_sqlite_off_the_event_loop(path):
+    cache = GeocodeCache(path)
+    loop_thread = threading.get_ident()
+    threads = []
+
+    class RecordingConnection:
+        def __init__(self, db):
+            self._db = db
+
+        def execute(self, *args):
+            threads.append(threading.get_ident())
+            return self._db.execute(*args)
+
+        def commit(self):
+            self._db.commit()
+
+    cache._db = RecordingConnection(cache._db)
+
+    async def scenario():
+        await cache.put_async("119077", 1.2966, 103.7764)
+        await cache.put_missing_async("999999")
+        cache._memory.clear()
+        cache._missing.clear()
+        results = await cache.get_async("119077"), await cache.get_async("999999"), await cache.get_async("123456")
+        # /health reads the stats on the event loop
+        assert cache.stats()["stored_entries"] == 1
+        return results
+
+    assert asyncio.run(scenario()) == ((1.2966, 103.7764), NOT_FOUND, None)
+    assert threads and loop_thread not in threads
+
+
+def test_preload_csv(path, tmp_path):
+    csv_path = tmp_path / "codes.csv"
+    csv_path.write_text("postal_code,lat,lon\n18956,1.29,103.85\nbad,row\n")
+    cache = GeocodeCache(path)
+    cache.put_missing("018956")
+    assert cache.preload_csv(str(csv_path)) == 1
+    assert cache.get("018956") == (1.29, 103.85)
+
+
+def test_stored_entries_are_counted_without_querying(path, tmp_path):
+    cache = GeocodeCache(path)
+    cache.put("119077", 1.2966, 103.7764)
+    cache.put("119077", 1.2967, 103.7765)
+    cache.put_missing("999999")
+    assert cache.stats()["stored_entries"] == 1
+
+    csv_path = tmp_path / "codes.csv"
+    csv_path.write_text("119077,1.29,103.77\n018956,1.29,103.85\n")
+    cache.preload_csv(str(csv_path))
+    assert cache.stats()["stored_entries"] == 2
+    assert GeocodeCache(path).stats()["stored_entries"] == 2
@@ -0,0 +1,59 @@
+import asyncio
+import json
+import random
+
+import pytest
+
+from json_stream import JSONArrayParser, aiter_json_array, iter_json_array
+
+DOCUMENT = json.dumps([
+    {"name": "Masjid Sultan", "lat": 1.302, "lon": 103.8589, "tags": ["mosque", None, True]},
+    "Musollah éà ☃ \U0001f54c, with \"quotes\" and ] brackets",
+    12345, -0.5, 1e-7, 0, True, False, None, [], {}, [[1, 2], [3]],
+], ensure_ascii=False, indent=1).encode()
+
+
+def split(data, rng):
+    """Cut `data` into random chunks, including empty ones and cuts inside UTF-8 characters."""
+    cuts = sorted(rng.randrange(len(data) + 1) for _ in range(rng.randrange(1, 40)))
+    return [data[start:end] for start, end in zip([0, *cuts], [*cuts, len(data)])]
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_any_chunking_gives_the_same_items(seed):
+    assert list(iter_json_array(split(DOCUMENT, random.Random(seed)))) == json.loads(DOCUMENT)
+
+
+def test_byte_by_byte():
+    assert list(iter_json_array(DOCUMENT[i:i + 1] for i in range(len(DOCUMENT)))) == json.loads(DOCUMENT)
+
+
+def test_numbers_split_across_chunks():
+    assert list(iter_json_array([b"[12", b"34.", b"5e", b"2,6", b"7]"])) == [123450.0, 67]
+    assert list(iter_json_array([b"[1", b"]"])) == [1]
+
+
+def test_items_are_returned_as_soon_as_complete():
+    parser = JSONArrayParser()
+    assert parser.feed(b'[{"a": 1}, {"b"') == [{"a": 1}]
+    assert parser.feed(b': 2}, 3') == [{"b": 2}]
+    assert parser.feed(b"]", final=True) == [3]
+
+
+def test_async_iteration():
+    async def chunks():
+        for chunk in (b'[1, "', b'two"', b", []]"):
+            yield chunk
+
+    async def collect():
+        return [item async for item in aiter_json_array(chunks())]
+
+    assert asyncio.run(collect()) == [1, "two", []]
+
+
+@pytest.mark.parametrize("document", [
+    b"", b"[", b'[1, {"a": ', b"[1,", b'{"a": 1}', b"[1 2]", b"[,1]", b"[1]]", b"[1] x", b"[tru]",
+])
+def test_invalid_or_truncated_documents_raise(document):
+    with pytest.raises(ValueError):
+        list(iter_json_array([document]))
@@ -0,0 +1,60 @@
+from location_merger import merge_locations, name_similarity, normalize_name
+
+# About 1 m of latitude
+METER = 1 / 111195
+
+
+def place(name, lat=1.2966, lon=103.773, **fields):
+    return {"name": name, "lat": lat, "lon": lon, **fields}
+
+
+def test_normalize_name_drops_generic_words():
+    assert normalize_name("The Musollah @ NUS Central Library!") == ("nus", "central", "library")
+    assert normalize_name(None) == ()
+
+
+def test_name_similarity_tolerates_reordering_and_generic_names():
+    assert name_similarity(normalize_name("NUS Central Library"), normalize_name("Central Library (NUS)")) == 1.0
+    assert name_similarity(normalize_name("Musollah"), normalize_name("Raffles Place")) == 1.0
+    assert name_similarity(normalize_name("Jurong Point"), normalize_name("Raffles Place")) < 0.6
+
+
+def test_same_place_from_two_sources_is_merged():
+    sheets = [place("Central Library Musollah", details="Level 3", guide="https://example.com/guide")]
+    api = [place("NUS Central Library", lat=1.2966 + 20 * METER, lon=103.7731,
+                 address="12 Kent Ridge Crescent", details="")]
+    [merged] = merge_locations({"sheets": sheets, "api": api})
+    # Name and coordinates from the most trusted source, the longest other fields from any
+    assert (merged["name"], merged["lat"], merged["lon"]) == ("Central Library Musollah", 1.2966, 103.773)
+    assert merged["address"] == "12 Kent Ridge Crescent"
+    assert merged["details"] == "Level 3"
+    assert merged["guide"] == "https://example.com/guide"
+    assert merged["sources"] == "sheets,api"
+
+
+def test_distant_or_differently_named_records_are_kept_apart():
+    sheets = [place("Jurong Point")]
+    api = [place("Raffles Place", lat=1.2966 + 10 * METER), place("Jurong Point", lat=1.2966 + 200 * METER)]
+    merged = merge_locations({"sheets": sheets, "api": api})
+    assert [location["sources"] for location in merged] == ["sheets", "api", "api"]
+
+
+def test_records_of_one_source_are_never_merged():
+    sheets = [place("Library Level 3"), place("Library Level 3", lat=1.2966 + METER)]
+    assert len(merge_locations({"sheets": sheets})) == 2
+
+
+def test_record_joins_the_most_similar_nearby_place():
+    sheets = [place("Engineering Auditorium"), place("Science Library", lat=1.2966 + 5 * METER)]
+    api = [place("Science Library (S16)", lat=1.2966 + 3 * METER)]
+    merged = merge_locations({"sheets": sheets, "api": api})
+    assert [location["sources"] for location in merged] == ["sheets", "sheets,api"]
+
+
+def test_merge_matches_across_grid_cells():
+    # Records straddling a cell boundary are still compared
+    radius = 75
+    step = radius * METER
+    sheets = [place("Block A", lat=step * 1000 - 5 * METER)]
+    api = [place("Block A", lat=step * 1000 + 5 * METER)]
+    assert len(merge_locations({"sheets": sheets, "api": api}, radius_m=radius)) == 1
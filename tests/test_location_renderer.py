@@ -0,0 +1,67 @@
+import pytest
+
+from location_renderer import LocationRenderer, compile_location, render_fragment
+
+PLAIN = {"name": "Central Library", "lat": 1.2966, "lon": 103.7764, "address": "12 Kent Ridge Crescent",
+         "directions": "Level 2, next to the lift lobby", "details": "Ablution area available",
+         "google_maps": None, "type": "Musollah", "guide": None}
+WITH_GUIDE = {"name": "Raffles Musollah", "lat": 1.28, "lon": 103.85, "address": "",
+              "directions": "Basement", "details": "  ", "google_maps": "https://maps.example/raffles",
+              "type": "Prayer Room", "guide": "https://video.example/raffles"}
+
+
+def test_compiled_fragments_render_the_full_text():
+    head, tail = compile_location(PLAIN)
+    assert render_fragment(head, tail, 1.234) == (
+        '<b>Central Library Musollah</b>\n'
+        '<b>Address:</b> 12 Kent Ridge Crescent '
+        '(<a href="https://www.google.com/maps/search/?api=1&query=1.2966,103.7764">Google Maps</a>)\n'
+        '<b>Distance:</b> 1.23 kilometers\n'
+        '<b>Directions:</b> Level 2, next to the lift lobby\n'
+        '<b>Additional Info:</b> Ablution area available'
+    )
+
+
+def test_video_guide_and_map_link_without_address():
+    head, tail = compile_location(WITH_GUIDE)
+    assert render_fragment(head, tail, 0.5, 2) == (
+        '<b>2. Raffles Musollah</b>\n'
+        '<b>Address:</b> <a href="https://maps.example/raffles">Google Maps</a>\n'
+        '<b>Distance:</b> 0.50 kilometers\n'
+        '<b>Directions:</b> <a href="https://video.example/raffles">Directional Video</a>\n'
+    )
+
+
+def test_render_nearest_numbers_multiple_results():
+    renderer = LocationRenderer([PLAIN, WITH_GUIDE])
+    assert renderer.render_nearest([(0.5, 0)], 1) == renderer.render(0, 0.5)
+    reply = renderer.render_nearest([(0.5, 1), (1.0, 0)], 2)
+    assert reply == ('<b>🕌 2 Nearest Prayer Spaces:</b>\n\n'
+                     + renderer.render(1, 0.5, 1) + "\n\n" + renderer.render(0, 1.0, 2))
+
+
+def wrapped(renderer):
+    """A renderer around read-only copies of the fragments, like one mapped from a snapshot file."""
+    heads, tails = renderer.fragments
+    return LocationRenderer.from_fragments(tuple(heads), tuple(tails))
+
+
+@pytest.mark.parametrize("from_fragments", [False, True])
+def test_patched_renderer_recompiles_changed_positions(from_fragments):
+    renderer = LocationRenderer([PLAIN, WITH_GUIDE, None])
+    if from_fragments:
+        renderer = wrapped(renderer)
+    changed = dict(PLAIN, name="Changed")
+    patched = renderer.patched({0: changed, 1: None, 3: WITH_GUIDE}, 4)
+    assert patched.render(0, 1.0).startswith("<b>Changed Musollah</b>")
+    assert patched.render(1, 1.0) == patched.render(2, 1.0) == "<b>1.00"
+    assert patched.render(3, 1.0) == LocationRenderer([WITH_GUIDE]).render(0, 1.0)
+    # The original renderer is unchanged
+    assert renderer.render(0, 1.0).startswith("<b>Central Library Musollah</b>")
+
+
+def test_renderer_from_fragments_matches_the_original():
+    locations = [PLAIN, None, WITH_GUIDE]
+    original = LocationRenderer(locations)
+    for position in range(len(locations)):
+        assert wrapped(original).render(position, 2.5, 1) == original.render(position, 2.5, 1)
@@ -0,0 +1,71 @@
+import pytest
+
+from location_store import FIELDS, LocationStore, SourceLocation, location_row
+
+
+def location(i, **fields):
+    return {"name": f"Location {i}", "lat": 1.3 + i / 1000, "lon": 103.8, "address": f"{i} Example Road",
+            "directions": None, "details": "", "google_maps": None, "type": "Musollah", "guide": None, **fields}
+
+
+def test_views_read_like_dictionaries():
+    store = LocationStore([location(0), location(1, guide="https://video.example/1")])
+    view = store[1]
+    assert view["name"] == view.name == "Location 1"
+    assert view["lat"] == pytest.approx(1.301)
+    assert view.get("guide") == "https://video.example/1"
+    assert view.get("missing", "default") == "default"
+    assert "address" in view and "missing" not in view
+    assert dict(view) == dict(zip(FIELDS, location_row(location(1, guide="https://video.example/1"))))
+    with pytest.raises(KeyError):
+        view["missing"]
+    assert store[-1] == view
+
+
+def test_repeated_strings_are_stored_once():
+    store = LocationStore([location(0, type="".join(["Musol", "lah"])), location(1)])
+    assert store[0]["type"] is store[1]["type"]
+
+
+def test_patched_store_adds_modifies_and_removes():
+    store = LocationStore([location(i) for i in range(4)])
+    patched = store.patched({1: None, 2: location(2, details="Renovated"), 5: location(5)}, 6)
+
+    assert (len(patched), patched.size) == (6, 4)
+    assert patched[1] is None and patched[4] is None
+    assert patched[2]["details"] == "Renovated"
+    assert patched.row(5) == location_row(location(5))
+    assert [view["name"] for view in patched if view is not None] == [
+        "Location 0", "Location 2", "Location 3", "Location 5"]
+    # The original store is unchanged
+    assert (len(store), store.size) == (4, 4)
+    assert store[2]["details"] == ""
+
+    # A removed position can be filled again
+    refilled = patched.patched({1: location(9)}, 6)
+    assert (refilled.size, refilled[1]["name"]) == (5, "Location 9")
+
+
+def test_store_rebuilt_from_columns_matches_the_original():
+    store = LocationStore([location(0), None, location(2)])
+    rebuilt = LocationStore.from_columns(list(store.lats), list(store.lons), store.text_columns)
+    assert rebuilt.size == 2
+    assert [rebuilt.row(i) for i in range(3)] == [store.row(i) for i in range(3)]
+
+
+def test_nearest_pairs_distances_with_views():
+    store = LocationStore([location(0), location(1)])
+    results = store.nearest([(0.25, 1), (0.5, 0)])
+    assert [(result.distance, result.location["name"]) for result in results] == [
+        (0.25, "Location 1"), (0.5, "Location 0")]
+
+
+def test_source_records_read_like_dictionaries():
+    record = SourceLocation(**location(2))
+    assert record["name"] == record.name == "Location 2"
+    assert record[1] == record["lat"]
+    assert record.get("sources") is None and "sources" not in record
+    assert dict(record) == location(2)
+    assert location_row(record) == location_row(location(2))
+    with pytest.raises(KeyError):
+        record["missing"]
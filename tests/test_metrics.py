@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from metrics import Counter, Histogram, Timer, timed
+
+
+def test_counter_renders_per_label():
+    counter = Counter("test_total", "Things counted", ["kind"])
+    counter.inc(kind="a")
+    counter.inc(2, kind="b")
+    counter.inc(kind='quote"d')
+    assert counter.render() == [
+        "# HELP test_total Things counted",
+        "# TYPE test_total counter",
+        'test_total{kind="a"} 1',
+        'test_total{kind="b"} 2',
+        'test_total{kind="quote\\"d"} 1',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_seconds", "Durations", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value)
+    assert histogram.render()[2:] == [
+        'test_seconds_bucket{le="0.1"} 1',
+        'test_seconds_bucket{le="1"} 3',
+        'test_seconds_bucket{le="+Inf"} 4',
+        "test_seconds_sum 6.05",
+        "test_seconds_count 4",
+    ]
+
+
+def test_timed_records_calls_and_counts_errors():
+    histogram = Histogram("test_call_seconds", "Calls", ["service"])
+    errors = Counter("test_errors_total", "Errors", ["service"])
+
+    @timed(histogram, errors, service="sync")
+    def fail():
+        raise ValueError("boom")
+
+    @timed(histogram, errors, service="async")
+    async def succeed():
+        return "ok"
+
+    with pytest.raises(ValueError):
+        fail()
+    assert asyncio.run(succeed()) == "ok"
+    with Timer(histogram, service="block"):
+        pass
+
+    counts = [line for line in histogram.render() if "_count" in line]
+    assert counts == ['test_call_seconds_count{service="async"} 1', 'test_call_seconds_count{service="block"} 1',
+                      'test_call_seconds_count{service="sync"} 1']
+    assert errors.render()[2:] == ['test_errors_total{service="sync"} 1']
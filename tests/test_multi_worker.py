@@ -0,0 +1,23 @@
+import fcntl
+
+import multi_worker
+
+
+def test_single_process_is_primary(monkeypatch):
+    monkeypatch.setattr(multi_worker, "WEB_PRIMARY_LOCK_PATH", None)
+    assert multi_worker.is_primary_process()
+
+
+def test_only_the_worker_holding_the_lock_is_primary(tmp_path, monkeypatch):
+    path = tmp_path / "primary-worker.lock"
+    monkeypatch.setattr(multi_worker, "WEB_PRIMARY_LOCK_PATH", str(path))
+    monkeypatch.setattr(multi_worker, "_primary_lock", None)
+
+    # Another worker holds the lock
+    with open(path, "a") as other:
+        fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        assert not multi_worker.is_primary_process()
+    # ...until it exits
+    assert multi_worker.is_primary_process()
+    assert multi_worker.is_primary_process()
+    multi_worker._primary_lock.close()
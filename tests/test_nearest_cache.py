@@ -0,0 +1,54 @@
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from nearest_cache import NearestCache
+from spatial_index import SpatialIndex
+
+
+@pytest.fixture(scope="module")
+def snapshot():
+    rng = random.Random(0)
+    points = [(rng.uniform(1.22, 1.47), rng.uniform(103.6, 104.05)) for _ in range(500)]
+    return SimpleNamespace(index=SpatialIndex(points))
+
+
+def clustered_queries(count, seed=1):
+    """Queries around a few hotspots, like users at the same MRT exits."""
+    rng = random.Random(seed)
+    hotspots = [(rng.uniform(1.25, 1.45), rng.uniform(103.65, 104.0)) for _ in range(5)]
+    return [(lat + rng.uniform(-0.0004, 0.0004), lon + rng.uniform(-0.0004, 0.0004))
+            for lat, lon in (rng.choice(hotspots) for _ in range(count))]
+
+
+@pytest.mark.parametrize("count", [1, 3, 10])
+def test_results_equal_the_index(snapshot, count):
+    cache = NearestCache(cell_meters=50)
+    for lat, lon in clustered_queries(200):
+        assert cache.nearest(snapshot, lat, lon, count) == snapshot.index.nearest(lat, lon, count)
+    assert cache.hits > cache.misses
+
+
+def test_cache_is_cleared_for_a_new_snapshot(snapshot):
+    cache = NearestCache()
+    cache.nearest(snapshot, 1.3, 103.8, 3)
+    moved = snapshot.index.patched({0: (1.3, 103.8)})
+    new_snapshot = SimpleNamespace(index=moved)
+    result = cache.nearest(new_snapshot, 1.3, 103.8, 3)
+    assert result == moved.nearest(1.3, 103.8, 3)
+    assert result[0][1] == 0
+    assert cache.stats()["invalidations"] == 1 and cache.stats()["hits"] == 0
+
+
+def test_least_recently_used_cells_are_dropped(snapshot):
+    cache = NearestCache(max_size=2)
+    for lat in (1.30, 1.31, 1.32, 1.30):
+        cache.nearest(snapshot, lat, 103.8)
+    assert cache.stats()["cells"] == 2 and cache.misses == 4
+
+
+def test_disabled_cache_answers_from_the_index(snapshot):
+    cache = NearestCache(max_size=0)
+    assert cache.nearest(snapshot, 1.3, 103.8, 2) == snapshot.index.nearest(1.3, 103.8, 2)
+    assert cache.stats()["misses"] == 0
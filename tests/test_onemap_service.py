@@ -0,0 +1,57 @@
+import asyncio
+
+import httpx
+import pytest
+
+import geocode_cache
+import http_client
+import onemap_service
+
+
+@pytest.fixture
+def onemap(tmp_path, monkeypatch):
+    """Route OneMap searches to a mock transport; returns the list of searched postal codes."""
+    searches = []
+
+    async def handler(request):
+        postal_code = request.url.params["searchVal"]
+        searches.append(postal_code)
+        await asyncio.sleep(0.01)
+        if postal_code == "999999":
+            return httpx.Response(200, json={"found": 0, "results": []})
+        if postal_code == "500500":
+            return httpx.Response(500)
+        return httpx.Response(200, json={"results": [{"LATITUDE": "1.2966", "LONGITUDE": "103.7764"}]})
+
+    monkeypatch.setattr(http_client, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(geocode_cache, "_cache", geocode_cache.GeocodeCache(str(tmp_path / "geocode.sqlite3")))
+    return searches
+
+
+def test_geocode_returns_coordinates_and_caches_them(onemap):
+    assert asyncio.run(onemap_service.geocode_postal_code_async("119077")) == (1.2966, 103.7764)
+    assert asyncio.run(onemap_service.geocode_postal_code_async("119077")) == (1.2966, 103.7764)
+    assert onemap == ["119077"]
+
+
+def test_unknown_postal_code(onemap):
+    assert asyncio.run(onemap_service.geocode_postal_code_async("999999")) is None
+
+
+def test_upstream_errors_are_raised(onemap):
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(onemap_service.geocode_postal_code_async("500500"))
+
+
+
+def test_unknown_postal_codes_are_cached(onemap):
+    assert asyncio.run(onemap_service.geocode_postal_code_async("999999")) is None
+    assert asyncio.run(onemap_service.geocode_postal_code_async("999999")) is None
+    assert onemap == ["999999"]
+
+
+def test_failed_lookups_are_not_cached(onemap):
+    for _ in range(2):
+        with pytest.raises(httpx.HTTPStatusError):
+            asyncio.run(onemap_service.geocode_postal_code_async("500500"))
+    assert onemap == ["500500", "500500"]
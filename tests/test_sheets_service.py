@@ -0,0 +1,133 @@
+import pytest
+
+import sheets_service
+from location_store import SourceLocation
+
+HEADER = ["Name", "Latitude", "Longitude", "Address", "Directions", "Details"]
+
+
+@pytest.fixture
+def sheet(monkeypatch):
+    """A two-page sheet served from memory; counts how many rows are parsed."""
+    pages = {
+        1: [HEADER, ["Central Library", "1.2966", "103.7764", "12 Kent Ridge Crescent", "Level 2", "Ablution area"]],
+        3: [["Raffles Musollah", "1.28", "103.85", "", "Basement", "Open daily"], ["Broken", "north", "103.85", "", "", "x"]],
+    }
+    parsed = []
+    parse_pages = sheets_service._parse_pages
+
+    def counting_parse(page_list, errors):
+        page_list = list(page_list)
+        parsed.extend(start for start, _ in page_list)
+        return parse_pages(page_list, errors)
+
+    monkeypatch.setattr(sheets_service, "_iter_value_pages", lambda page_rows=0: iter(list(pages.items())))
+    monkeypatch.setattr(sheets_service, "_parse_pages", counting_parse)
+    monkeypatch.setattr(sheets_service, "_parsed_pages", {})
+    return pages, parsed
+
+
+def test_first_fetch_parses_every_page(sheet):
+    _, parsed = sheet
+    fingerprint, locations = sheets_service.fetch_locations_if_changed()
+    assert [location.name for location in locations] == ["Central Library", "Raffles Musollah"]
+    assert [error.row_number for error in sheets_service.last_parse_errors] == [4]
+    assert parsed == [1, 3]
+    assert set(fingerprint) == {"sha1"}
+
+
+def test_unchanged_sheet_is_not_parsed_again(sheet):
+    _, parsed = sheet
+    fingerprint, _ = sheets_service.fetch_locations_if_changed()
+    parsed.clear()
+    assert sheets_service.fetch_locations_if_changed(fingerprint) == (fingerprint, None)
+    assert parsed == []
+
+
+def test_only_changed_pages_are_parsed(sheet):
+    pages, parsed = sheet
+    fingerprint, _ = sheets_service.fetch_locations_if_changed()
+    parsed.clear()
+    pages[3] = [["Raffles Musollah", "1.28", "103.85", "Raffles Place", "Basement", "Open daily"]]
+    new_fingerprint, locations = sheets_service.fetch_locations_if_changed(fingerprint)
+    assert new_fingerprint != fingerprint
+    assert [location.address for location in locations] == ["12 Kent Ridge Crescent", "Raffles Place"]
+    assert sheets_service.last_parse_errors == []
+    assert parsed == [3]
+
+
+PARSE_SCHEMA = [
+    {"index": 0, "key": "name", "required": True, "transform": None, "default": None},
+    {"index": 1, "key": "lat", "required": True, "transform": float, "default": None},
+    {"index": 2, "key": "lon", "required": True, "transform": float, "default": None},
+    {"index": 3, "key": "address", "required": False, "transform": str.upper, "default": None},
+    {"index": 4, "key": "directions", "required": False, "transform": None, "default": "Ask at the counter"},
+    {"index": 5, "key": "details", "required": True, "transform": None, "default": "No additional details"},
+    {"index": 6, "key": "google_maps", "required": False, "transform": None, "default": None},
+    {"index": 7, "key": "type", "required": False, "transform": None, "default": "Musollah"},
+    {"index": 8, "key": "guide", "required": False, "transform": int, "default": 0},
+]
+
+
+def parse(rows, schema=PARSE_SCHEMA):
+    errors = []
+    locations = list(sheets_service.compile_row_parser(schema)(rows, errors))
+    return locations, errors
+
+
+def test_parser_applies_transforms_and_defaults():
+    locations, errors = parse([(2, ["Library", "1.5", "103.25", "kent ridge", "", "", "", "Prayer Room", "7"])])
+    assert errors == []
+    assert locations == [("Library", 1.5, 103.25, "KENT RIDGE", "Ask at the counter", "No additional details",
+                          None, "Prayer Room", 7)]
+    assert isinstance(locations[0], SourceLocation)
+
+
+def test_parser_pads_short_rows_with_defaults():
+    # Only the required columns up to `details` must be present; the rest take their defaults
+    [location], _ = parse([(2, ["Library", "1.5", "103.25", "", "", "Open daily"])])
+    assert location[3:] == (None, "Ask at the counter", "Open daily", None, "Musollah", 0)
+
+
+def test_parser_falls_back_to_the_default_of_optional_columns_that_fail_their_transform():
+    [location], errors = parse([(2, ["Library", "1.5", "103.25", "", "", "x", "", "", "not a number"])])
+    assert errors == []
+    assert location.guide == 0
+
+
+@pytest.mark.parametrize("row, column, message", [
+    (["Library", "1.5"], None, "missing required columns"),
+    (["", "1.5", "103.25", "", "", "x"], "name", "required value is empty"),
+    (["Library", "", "103.25", "", "", "x"], "lat", "required value is empty"),
+    (["Library", "north", "103.25", "", "", "x"], "lat", "invalid value 'north'"),
+])
+def test_parser_rejects_invalid_rows(row, column, message):
+    locations, errors = parse([(2, row)])
+    assert locations == []
+    assert errors == [sheets_service.RowError(2, column, message, row)]
+
+
+def test_parser_rejects_schemas_that_do_not_match_the_record():
+    with pytest.raises(ValueError):
+        sheets_service.compile_row_parser(PARSE_SCHEMA[:-1])
+
+
+def test_parse_rows_numbers_rows_as_the_sheet_does():
+    values = [
+        ["Name", "Latitude", "Longitude", "Address", "Directions", "Details"],
+        ["Library", "1.5", "103.25", "", "", "x"],
+        ["Broken", "1.5"],
+        ["Hall", "1.6", "103.3", "", "", "x"],
+        ["Empty", "", "103.3", "", "", "x"],
+    ]
+    locations = sheets_service.parse_rows(values)
+    assert [location.name for location in locations] == ["Library", "Hall"]
+    assert [(error.row_number, error.column) for error in sheets_service.last_parse_errors] == [(3, None), (5, "lat")]
+
+
+def test_pages_keep_their_row_numbers():
+    errors = []
+    pages = [(1, [["Name"], ["A", "1", "2", "", "", "x"]]), (3, [["B", "bad", "2", "", "", "x"]])]
+    locations = list(sheets_service._parse_pages(pages, errors))
+    assert [location.name for location in locations] == ["A"]
+    assert [error.row_number for error in errors] == [3]
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_result():
+    async def scenario():
+        flight, calls = SingleFlight(), []
+
+        async def lookup():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+
+        results = await asyncio.gather(*(flight.do("key", lookup) for _ in range(10)), flight.do("other", lookup))
+        return flight, calls, results
+
+    flight, calls, results = asyncio.run(scenario())
+    assert results == ["result"] * 11
+    assert len(calls) == 2
+    assert flight.stats() == {"in_flight": 0, "calls": 2, "coalesced": 9}
+
+
+def test_exception_is_shared_and_key_is_forgotten():
+    async def scenario():
+        flight, calls = SingleFlight(), []
+
+        async def failing():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream down")
+
+        results = await asyncio.gather(flight.do("key", failing), flight.do("key", failing), return_exceptions=True)
+        # The finished call is not reused
+        with pytest.raises(RuntimeError):
+            await flight.do("key", failing)
+        return calls, results
+
+    calls, results = asyncio.run(scenario())
+    assert [str(result) for result in results] == ["upstream down"] * 2
+    assert len(calls) == 2
+
+
+def test_cancelled_caller_does_not_cancel_the_call():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def lookup():
+            await asyncio.sleep(0.05)
+            return "result"
+
+        impatient = asyncio.create_task(flight.do("key", lookup))
+        patient = asyncio.create_task(flight.do("key", lookup))
+        await asyncio.sleep(0.01)
+        impatient.cancel()
+        return await patient, impatient.cancelled()
+
+    assert asyncio.run(scenario()) == ("result", True)
@@ -0,0 +1,94 @@
+import random
+import time
+
+import pytest
+
+from catalog_service import CatalogSnapshot, SnapshotFileCatalog, save_snapshot
+from snapshot_file import MappedColumn, read_snapshot_file
+
+LAT_RANGE = (1.22, 1.47)
+LON_RANGE = (103.6, 104.05)
+
+
+def location(i, lat, lon):
+    return {"name": f"Location {i} — Musollah", "lat": lat, "lon": lon, "address": f"{i} Example Road",
+            "directions": None, "details": "Level 2\nnext to the lift", "google_maps": None,
+            "type": "Musollah", "guide": None, "sources": "sheets"}
+
+
+@pytest.fixture
+def snapshot():
+    rng = random.Random(0)
+    locations = [location(i, rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)) for i in range(200)]
+    # Patched, so the file holds removed positions and changes outside the tree
+    return CatalogSnapshot(3, locations, time.monotonic()).patched(
+        4, {5: None, 7: location(7, 1.3, 103.8), 200: location(200, 1.31, 103.81)}, time.monotonic())
+
+
+@pytest.fixture
+def queries():
+    rng = random.Random(1)
+    return [(rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)) for _ in range(20)]
+
+
+def test_mapped_snapshot_equals_the_original(tmp_path, snapshot, queries):
+    path = str(tmp_path / "catalog.snapshot")
+    save_snapshot(snapshot, path)
+    data = read_snapshot_file(path)
+
+    assert data.version == 4
+    assert len(data.locations) == len(snapshot.locations) and data.locations.size == len(snapshot)
+    assert [data.locations.row(i) for i in range(len(data.locations))] == \
+        [snapshot.locations.row(i) for i in range(len(snapshot.locations))]
+    for lat, lon in queries:
+        assert data.index.nearest(lat, lon, 5) == snapshot.index.nearest(lat, lon, 5)
+        assert data.engine.nearest(lat, lon, 5) == snapshot.engine.nearest(lat, lon, 5)
+    for position in (0, 5, 7, 200):
+        assert data.renderer.render(position, 1.5, 2) == snapshot.renderer.render(position, 1.5, 2)
+
+
+def test_columns_stay_in_the_mapping(tmp_path, snapshot):
+    path = str(tmp_path / "catalog.snapshot")
+    save_snapshot(snapshot, path)
+    data = read_snapshot_file(path)
+
+    assert isinstance(data.locations.lats, memoryview)
+    assert all(isinstance(column, MappedColumn) for column in data.locations.text_columns.values())
+    assert all(isinstance(sequence, memoryview) for sequence in (*data.index.tree, *data.index.projection))
+    assert all(not array.flags.owndata and not array.flags.writeable for array in data.engine.arrays)
+    assert all(isinstance(fragments, MappedColumn) for fragments in data.renderer.fragments)
+
+
+def test_mapped_snapshot_can_be_patched(tmp_path, snapshot):
+    path = str(tmp_path / "catalog.snapshot")
+    save_snapshot(snapshot, path)
+    data = read_snapshot_file(path)
+    mapped = CatalogSnapshot(data.version, data.locations, time.monotonic(), index=data.index,
+                             engine=data.engine, renderer=data.renderer)
+
+    changes = {0: None, 201: location(201, 1.35, 103.9)}
+    patched = mapped.patched(5, changes, time.monotonic())
+    expected = snapshot.patched(5, changes, time.monotonic())
+    assert patched.nearest(1.35, 103.9, 3) == expected.nearest(1.35, 103.9, 3)
+    assert patched.renderer.render(201, 1.0) == expected.renderer.render(201, 1.0)
+    assert patched.locations[0] is None and mapped.locations[0] is not None
+
+
+@pytest.mark.parametrize("damage", ["truncate", "magic", "empty"])
+def test_damaged_files_are_rejected(tmp_path, snapshot, damage):
+    path = tmp_path / "catalog.snapshot"
+    save_snapshot(snapshot, str(path))
+    data = path.read_bytes()
+    path.write_bytes({"truncate": data[:-10], "magic": b"XXXX" + data[4:], "empty": b""}[damage])
+    with pytest.raises(ValueError):
+        read_snapshot_file(str(path))
+
+
+def test_worker_catalog_follows_the_file(tmp_path, snapshot):
+    path = str(tmp_path / "catalog.snapshot")
+    catalog = SnapshotFileCatalog(path)
+    assert catalog.refresh() is False
+    save_snapshot(snapshot, path)
+    assert catalog.refresh() is True
+    assert catalog.refresh() is False
+    assert catalog.get_snapshot().nearest(1.3, 103.8, 1)[0].location["name"] == "Location 7 — Musollah"
@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+from source_orchestrator import CircuitBreaker, SourceOrchestrator
+
+
+class Flaky:
+    """Sync source failing its first `failures` calls."""
+
+    def __init__(self, failures=0, delay=0.0, locations=("a",)):
+        self.failures = failures
+        self.delay = delay
+        self.locations = list(locations)
+        self.calls = 0
+
+    def __call__(self, fingerprint):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.calls <= self.failures:
+            raise RuntimeError(f"failure {self.calls}")
+        return "v1", list(self.locations)
+
+
+def test_sources_are_fetched_concurrently():
+    sources = {name: Flaky(delay=0.2) for name in ("a", "b", "c")}
+    started = time.monotonic()
+    results = SourceOrchestrator(sources).fetch()
+    assert time.monotonic() - started < 0.5
+    assert {name: result.locations for name, result in results.items()} == {name: ["a"] for name in sources}
+
+
+def test_failures_are_retried_within_the_deadline():
+    source = Flaky(failures=2)
+    result = SourceOrchestrator({"s": source}, retries=2, backoff=0.01).fetch()["s"]
+    assert (result.fingerprint, result.locations, result.error) == ("v1", ["a"], None)
+    assert source.calls == 3
+
+    failing = Flaky(failures=10)
+    result = SourceOrchestrator({"s": failing}, retries=1, backoff=0.01).fetch()["s"]
+    assert result.locations is None and result.error == "failure 2"
+
+
+def test_empty_results_count_as_failures():
+    result = SourceOrchestrator({"s": Flaky(locations=())}, retries=0).fetch({"s": "v0"})["s"]
+    assert (result.fingerprint, result.locations, result.error) == ("v0", None, "no locations returned")
+
+
+def test_slow_source_is_cut_off_without_delaying_the_others():
+    orchestrator = SourceOrchestrator({"slow": Flaky(delay=1), "fast": Flaky()}, deadline=0.2, retries=0)
+    started = time.monotonic()
+    results = orchestrator.fetch()
+    assert time.monotonic() - started < 0.6
+    assert results["fast"].locations == ["a"]
+    assert "no response within" in results["slow"].error
+    assert orchestrator.stats()["slow"]["timeouts"] == 1
+
+
+def test_circuit_opens_after_repeated_failures_and_recovers():
+    breaker = CircuitBreaker(threshold=2, cooldown=0.1)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+    time.sleep(0.12)
+    assert breaker.allow()       # One trial after the cooldown...
+    assert not breaker.allow()   # ...at a time
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_open_circuit_skips_the_source():
+    source = Flaky(failures=100)
+    orchestrator = SourceOrchestrator({"s": source}, retries=0)
+    for _ in range(5):
+        orchestrator.fetch()
+    # SOURCE_BREAKER_THRESHOLD (3) failed refreshes open the circuit
+    assert source.calls == 3
+    assert orchestrator.stats()["s"]["circuit"] == "open"
+    assert orchestrator.stats()["s"]["skipped"] == 2
+
+
+def test_async_sources():
+    async def good():
+        return ["a"]
+
+    async def bad():
+        raise RuntimeError("down")
+
+    results = asyncio.run(SourceOrchestrator({}, {"good": good, "bad": bad}, retries=0).fetch_async())
+    assert results["good"].locations == ["a"]
+    assert results["bad"].error == "down"
@@ -0,0 +1,93 @@
+import math
+import random
+
+import pytest
+from geopy.distance import geodesic
+
+from spatial_index import SpatialIndex, KM_PER_DEGREE, geodesic_km
+
+LAT_RANGE = (1.22, 1.47)
+LON_RANGE = (103.6, 104.05)
+
+
+@pytest.fixture(scope="module")
+def points():
+    rng = random.Random(0)
+    return [(rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)) for _ in range(1000)]
+
+
+@pytest.fixture(scope="module")
+def queries():
+    rng = random.Random(1)
+    return [(rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)) for _ in range(15)]
+
+
+@pytest.fixture(scope="module")
+def ranked(points, queries):
+    """Every point as (geodesic distance, position), nearest first, per query."""
+    return [brute_force(points, lat, lon, len(points)) for lat, lon in queries]
+
+
+def brute_force(points, lat, lon, k, skip=()):
+    return sorted((geodesic_km(lat, lon, *point), position)
+                  for position, point in enumerate(points) if position not in skip)[:k]
+
+
+def projected(index, lat, lon, point_lat, point_lon):
+    dx = (point_lon - lon) * index._kx
+    dy = (point_lat - lat) * KM_PER_DEGREE
+    return math.hypot(dx, dy)
+
+
+def test_geodesic_km_matches_geopy():
+    assert geodesic_km(1.3, 103.8, 1.35, 103.9) == geodesic((1.3, 103.8), (1.35, 103.9)).kilometers
+
+
+@pytest.mark.parametrize("k", [1, 3, 10])
+def test_exact_nearest_matches_brute_force(points, queries, ranked, k):
+    index = SpatialIndex(points)
+    for (lat, lon), expected in zip(queries, ranked):
+        assert index.nearest(lat, lon, k) == expected[:k]
+
+
+def test_projected_candidates_match_brute_force(points, queries):
+    index = SpatialIndex(points)
+    for lat, lon in queries:
+        expected = sorted((projected(index, lat, lon, *point), position)
+                          for position, point in enumerate(points))[:5]
+        result = index.nearest(lat, lon, 5, exact=False)
+        assert [position for _, position in result] == [position for _, position in expected]
+        assert [d for d, _ in result] == pytest.approx([d for d, _ in expected])
+
+
+def test_small_and_empty_indexes():
+    assert SpatialIndex([]).nearest(1.3, 103.8, 3) == []
+    index = SpatialIndex([(1.3, 103.8), (1.31, 103.8)])
+    assert [position for _, position in index.nearest(1.3, 103.8, 5)] == [0, 1]
+    assert index.nearest(1.3, 103.8, 0) == []
+
+
+def test_patched_index_moves_adds_and_removes(points, queries):
+    index = SpatialIndex(points)
+    rng = random.Random(2)
+    changes = {position: None for position in rng.sample(range(len(points)), 30)}
+    changes.update({position: (rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE))
+                    for position in rng.sample(range(len(points)), 30)})
+    changes[len(points)] = (1.3, 103.8)
+    patched = index.patched(changes)
+
+    updated = list(points) + [None]
+    for position, coordinates in changes.items():
+        updated[position] = coordinates
+    removed = {position for position, point in enumerate(updated) if point is None}
+    assert len(patched) == len(updated) - len(removed)
+    for lat, lon in queries + [(1.3, 103.8)]:
+        assert patched.nearest(lat, lon, 5) == brute_force(updated, lat, lon, 5, skip=removed)
+    # The original index is unchanged
+    assert index.nearest(1.3, 103.8, 5) == brute_force(points, 1.3, 103.8, 5)
+
+
+def test_restored_tree_answers_like_the_original(points, queries, ranked):
+    restored = SpatialIndex.from_tree(*SpatialIndex(points).tree)
+    for (lat, lon), expected in zip(queries, ranked):
+        assert restored.nearest(lat, lon, 3) == expected[:3]
@@ -0,0 +1,182 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from telegram.ext import ConversationHandler
+
+import telegram_bot
+from answer_table import AnswerTable
+from catalog_service import CatalogSnapshot
+from nearest_cache import NearestCache
+
+HOT_POSTAL_CODE = "119077"
+OTHER_POSTAL_CODE = "018989"
+
+
+def location(i):
+    return {"name": f"Location {i}", "lat": 1.28 + i * 0.005, "lon": 103.8, "address": f"{i} Example Road",
+            "directions": "Level 2", "details": "", "google_maps": None, "type": "Musollah", "guide": None}
+
+
+class StubCatalog:
+    def __init__(self, snapshot):
+        self.current_snapshot = snapshot
+
+    async def get_snapshot_async(self):
+        return self.current_snapshot
+
+
+@pytest.fixture
+def bot(tmp_path, monkeypatch):
+    """telegram_bot wired to an in-memory snapshot, answer table, nearest cache and geocoder."""
+    snapshot = CatalogSnapshot(1, [location(i) for i in range(8)], time.monotonic())
+    table = AnswerTable(str(tmp_path / "answers.json"))
+    table.add_postal_codes({HOT_POSTAL_CODE: (1.2805, 103.8)})
+    table.update(snapshot)
+    cache = NearestCache()
+    geocode = AsyncMock(return_value=(1.3, 103.8))
+
+    monkeypatch.setattr(telegram_bot, "get_catalog", lambda: StubCatalog(snapshot))
+    monkeypatch.setattr(telegram_bot, "get_answer_table", lambda: table)
+    monkeypatch.setattr(telegram_bot, "get_nearest_cache", lambda: cache)
+    monkeypatch.setattr(telegram_bot, "geocode_postal_code_async", geocode)
+    monkeypatch.setattr(telegram_bot, "log_user", lambda user: None)
+    return SimpleNamespace(snapshot=snapshot, cache=cache, geocode=geocode)
+
+
+def inline_update(query="", lat=None, lon=None):
+    inline_query = MagicMock()
+    inline_query.query = query
+    inline_query.location = SimpleNamespace(latitude=lat, longitude=lon) if lat is not None else None
+    inline_query.answer = AsyncMock()
+    return SimpleNamespace(inline_query=inline_query)
+
+
+def answer_inline(update):
+    asyncio.run(telegram_bot.inline_query_handler(update, SimpleNamespace(user_data={})))
+    update.inline_query.answer.assert_awaited_once()
+    args, kwargs = update.inline_query.answer.call_args
+    return args[0], kwargs
+
+
+def titles(results):
+    return [result.title for result in results]
+
+
+def test_inline_postal_code_is_answered_from_the_answer_table(bot):
+    results, kwargs = answer_inline(inline_update(f" {HOT_POSTAL_CODE} "))
+    assert titles(results) == [f"Location {i}" for i in range(5)]
+    assert results[0].description.startswith("0.06 km away · 0 Example Road")
+    distance, position = telegram_bot.get_answer_table().lookup(HOT_POSTAL_CODE, bot.snapshot)[0]
+    assert results[0].input_message_content.message_text == bot.snapshot.renderer.render(position, distance)
+    assert kwargs["cache_time"] == telegram_bot.INLINE_CACHE_SECONDS
+    assert kwargs["is_personal"] is False
+    assert kwargs["button"] is None
+    bot.geocode.assert_not_awaited()
+
+
+def test_inline_postal_code_falls_back_to_the_geocoder(bot):
+    results, kwargs = answer_inline(inline_update(OTHER_POSTAL_CODE))
+    bot.geocode.assert_awaited_once_with(OTHER_POSTAL_CODE)
+    expected = bot.snapshot.index.nearest(1.3, 103.8, telegram_bot.INLINE_MAX_RESULTS)
+    assert [result.id for result in results] == [f"1:{OTHER_POSTAL_CODE}:{position}" for _, position in expected]
+    assert kwargs["is_personal"] is False
+
+
+def test_inline_postal_code_not_found_offers_the_button(bot):
+    bot.geocode.return_value = None
+    results, kwargs = answer_inline(inline_update(OTHER_POSTAL_CODE))
+    assert results == []
+    assert kwargs["button"].start_parameter == "inline"
+
+
+def test_inline_location_goes_through_the_nearest_cache(bot):
+    results, kwargs = answer_inline(inline_update(lat=1.300004, lon=103.800004))
+    expected = bot.snapshot.index.nearest(1.3, 103.8, telegram_bot.INLINE_MAX_RESULTS)
+    assert [result.id for result in results] == [f"1:1.3,103.8:{position}" for _, position in expected]
+    assert kwargs["is_personal"] is True
+    assert kwargs["cache_time"] == telegram_bot.INLINE_CACHE_SECONDS
+    assert bot.cache.misses == 1
+
+    answer_inline(inline_update(lat=1.30001, lon=103.80001))
+    assert bot.cache.hits == 1
+
+
+@pytest.mark.parametrize("query", ["", "hello", "12345", "1234567"])
+def test_empty_or_invalid_inline_query_offers_the_button(bot, query):
+    results, kwargs = answer_inline(inline_update(query))
+    assert results == []
+    assert kwargs["is_personal"] is True
+    assert kwargs["button"].text == "Type a 6-digit postal code or share your location"
+    bot.geocode.assert_not_awaited()
+
+
+def nearest_update(*args):
+    loading = MagicMock()
+    loading.edit_text = AsyncMock()
+    message = MagicMock()
+    message.reply_text = AsyncMock(return_value=loading)
+    update = SimpleNamespace(message=message, effective_user=None)
+    context = SimpleNamespace(args=list(args), user_data={})
+    return update, context, loading
+
+
+def run_nearest(*args):
+    update, context, loading = nearest_update(*args)
+    state = asyncio.run(telegram_bot.nearest_command(update, context))
+    return state, update, context, loading
+
+
+def test_nearest_with_count_and_postal_code_answers_right_away(bot):
+    state, update, context, loading = run_nearest("3", HOT_POSTAL_CODE)
+    assert state == ConversationHandler.END
+    assert context.user_data == {}
+    expected = bot.snapshot.renderer.render_nearest(
+        telegram_bot.get_answer_table().lookup(HOT_POSTAL_CODE, bot.snapshot, 3), 3)
+    assert loading.edit_text.call_args.args[0] == expected
+    bot.geocode.assert_not_awaited()
+
+
+def test_nearest_with_other_postal_code_uses_the_geocoder(bot):
+    state, _, _, loading = run_nearest("2", OTHER_POSTAL_CODE)
+    assert state == ConversationHandler.END
+    bot.geocode.assert_awaited_once_with(OTHER_POSTAL_CODE)
+    assert loading.edit_text.call_args.args[0].startswith("<b>🕌 2 Nearest Prayer Spaces:</b>")
+
+
+def test_nearest_with_unknown_postal_code_keeps_waiting(bot):
+    bot.geocode.return_value = None
+    state, _, context, loading = run_nearest("2", OTHER_POSTAL_CODE)
+    assert state == telegram_bot.WAITING_FOR_LOCATION
+    assert context.user_data == {"nearest_count": 2}
+    loading.edit_text.assert_awaited_once_with("Postal code not found. Please check and try again.")
+
+
+def test_nearest_with_count_asks_for_the_location(bot):
+    state, update, context, _ = run_nearest("9")
+    assert state == telegram_bot.WAITING_FOR_LOCATION
+    assert context.user_data == {"nearest_count": 5}
+    assert "the 5 nearest prayer spaces" in update.message.reply_text.call_args.args[0]
+
+
+def test_nearest_with_invalid_postal_code_keeps_waiting(bot):
+    state, update, context, _ = run_nearest("2", "12ab56")
+    assert state == telegram_bot.WAITING_FOR_LOCATION
+    assert context.user_data == {"nearest_count": 2}
+    assert update.message.reply_text.call_args.args[0].startswith("Please provide a valid 6-digit")
+
+
+@pytest.mark.parametrize("args", [("0",), ("-2",), ("three",), ("2", HOT_POSTAL_CODE, "extra")])
+def test_nearest_with_invalid_count_shows_the_usage(bot, args):
+    state, update, context, _ = run_nearest(*args)
+    assert state == ConversationHandler.END
+    assert context.user_data == {}
+    assert update.message.reply_text.call_args.args[0].startswith("Usage: /nearest [count] [postal code]")
+
+
+def test_nearest_without_arguments_asks_for_the_count(bot):
+    state, update, _, _ = run_nearest()
+    assert state == telegram_bot.WAITING_FOR_COUNT
+    assert update.message.reply_text.call_args.args[0].startswith("🔍 How many")
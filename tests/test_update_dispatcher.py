@@ -0,0 +1,76 @@
+import asyncio
+import random
+from types import SimpleNamespace
+
+from update_dispatcher import UpdateDispatcher
+
+
+def update(update_id, chat_id):
+    return SimpleNamespace(update_id=update_id, effective_chat=SimpleNamespace(id=chat_id), effective_user=None)
+
+
+def test_updates_of_one_chat_are_processed_in_order():
+    processed = []
+    running = set()
+    overlaps = []
+
+    async def process(item):
+        chat = item.effective_chat.id
+        if chat in running:
+            overlaps.append(item.update_id)
+        running.add(chat)
+        await asyncio.sleep(random.uniform(0, 0.003))
+        running.discard(chat)
+        processed.append((chat, item.update_id))
+
+    async def run():
+        dispatcher = UpdateDispatcher(process, workers=4, queue_size=400, enqueue_timeout=1)
+        await dispatcher.start()
+        for update_id in range(200):
+            assert await dispatcher.submit(update(update_id, update_id % 7))
+        await dispatcher.stop()
+        return dispatcher
+
+    dispatcher = asyncio.run(run())
+    assert dispatcher.processed == 200
+    assert overlaps == []
+    for chat in range(7):
+        ids = [update_id for processed_chat, update_id in processed if processed_chat == chat]
+        assert ids == sorted(ids)
+
+
+def test_full_queue_rejects_after_the_timeout():
+    async def run():
+        release = asyncio.Event()
+
+        async def process(item):
+            await release.wait()
+
+        dispatcher = UpdateDispatcher(process, workers=1, queue_size=1, enqueue_timeout=0.05)
+        await dispatcher.start()
+        results = [await dispatcher.submit(update(i, 1)) for i in range(3)]
+        release.set()
+        await dispatcher.stop()
+        return dispatcher, results
+
+    dispatcher, results = asyncio.run(run())
+    # One update is being processed, one waits in the queue, the third finds it full
+    assert results == [True, True, False]
+    assert (dispatcher.accepted, dispatcher.rejected, dispatcher.processed) == (2, 1, 2)
+
+
+def test_failed_updates_do_not_stop_the_worker():
+    async def process(item):
+        if item.update_id == 0:
+            raise RuntimeError("handler failed")
+
+    async def run():
+        dispatcher = UpdateDispatcher(process, workers=1, queue_size=10)
+        await dispatcher.start()
+        for update_id in range(3):
+            await dispatcher.submit(update(update_id, 1))
+        await dispatcher.stop()
+        return dispatcher
+
+    dispatcher = asyncio.run(run())
+    assert (dispatcher.failed, dispatcher.processed) == (1, 2)
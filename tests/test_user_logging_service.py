@@ -0,0 +1,85 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import database_service
+from user_logging_service import UserLogPipeline
+
+
+class FakeSupabase:
+    """Records the rows of every `table(...).upsert(...).execute()` call."""
+
+    def __init__(self, fail=False):
+        self.upserts = []
+        self.fail = fail
+
+    def table(self, name):
+        return self
+
+    def upsert(self, rows, on_conflict=None):
+        self._rows = rows
+        return self
+
+    async def execute(self):
+        if self.fail:
+            raise RuntimeError("supabase is down")
+        self.upserts.append(self._rows)
+
+
+@pytest.fixture
+def supabase(monkeypatch):
+    client = FakeSupabase()
+    monkeypatch.setattr(database_service, "_async_client", client)
+    return client
+
+
+def user(user_id):
+    return SimpleNamespace(id=user_id, username=f"user{user_id}", first_name="First", last_name=None)
+
+
+def test_users_are_batched_and_deduplicated(supabase):
+    async def run():
+        pipeline = UserLogPipeline(batch_size=3, flush_seconds=0.05, dedup_seconds=60)
+        await pipeline.start()
+        for user_id in [1, 2, 1, 3, 4, 2, 5, 6, 7]:
+            pipeline.log(user(user_id))
+        await asyncio.sleep(0.2)
+        await pipeline.stop()
+        return pipeline
+
+    pipeline = asyncio.run(run())
+    assert sorted(row["user_id"] for rows in supabase.upserts for row in rows) == [1, 2, 3, 4, 5, 6, 7]
+    assert all(len(rows) <= 3 for rows in supabase.upserts)
+    assert pipeline.deduplicated == 2
+    row = next(row for rows in supabase.upserts for row in rows if row["user_id"] == 2)
+    assert (row["username"], row["first_name"], row["last_name"]) == ("user2", "First", "")
+
+
+def test_stop_flushes_pending_users(supabase):
+    async def run():
+        pipeline = UserLogPipeline(batch_size=100, flush_seconds=60, dedup_seconds=60)
+        await pipeline.start()
+        for user_id in range(10):
+            pipeline.log(user(user_id))
+        await asyncio.sleep(0.01)
+        await pipeline.stop()
+
+    asyncio.run(run())
+    assert sorted(row["user_id"] for rows in supabase.upserts for row in rows) == list(range(10))
+
+
+def test_failed_users_are_retried_on_their_next_message(supabase):
+    async def run():
+        pipeline = UserLogPipeline(batch_size=10, flush_seconds=60, dedup_seconds=60)
+        supabase.fail = True
+        pipeline.log(user(1))
+        await pipeline.stop()
+        supabase.fail = False
+        pipeline.log(user(1))
+        await pipeline.stop()
+        return pipeline
+
+    pipeline = asyncio.run(run())
+    assert pipeline.errors == 1
+    assert [[row["user_id"] for row in rows] for rows in supabase.upserts] == [[1]]
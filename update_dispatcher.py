@@ -0,0 +1,124 @@
+import os
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Acknowledge webhooks immediately and process updates in background workers
+WEBHOOK_FAST_ACK = os.getenv("WEBHOOK_FAST_ACK", "false").lower() == "true"
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+
+# How long a webhook request waits for queue space before it is rejected
+WEBHOOK_ENQUEUE_TIMEOUT_SECONDS = float(os.getenv("WEBHOOK_ENQUEUE_TIMEOUT_SECONDS", "2"))
+
+
+def _ordering_key(update) -> int:
+    """Updates with the same key are processed one at a time, in arrival order."""
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    return update.update_id
+
+
+class UpdateDispatcher:
+    """Bounded queue of Telegram updates drained by a pool of worker tasks.
+
+    Every worker owns one queue and updates are routed to a queue by chat, so
+    updates from the same chat are processed strictly in order (conversation
+    state depends on it) while different chats are processed concurrently.
+
+    When a queue is full, `submit()` waits up to WEBHOOK_ENQUEUE_TIMEOUT_SECONDS
+    and then gives up, so the webhook can answer with an error and Telegram
+    retries the update later instead of us buffering without limit.
+    """
+
+    def __init__(self, process_update: Callable[[Any], Awaitable[None]],
+                 workers: int = WEBHOOK_WORKERS,
+                 queue_size: int = WEBHOOK_QUEUE_SIZE,
+                 enqueue_timeout: float = WEBHOOK_ENQUEUE_TIMEOUT_SECONDS):
+        self._process_update = process_update
+        self._enqueue_timeout = enqueue_timeout
+        workers = max(1, workers)
+        per_worker = max(1, queue_size // workers)
+        self._queues: List[asyncio.Queue] = [asyncio.Queue(maxsize=per_worker) for _ in range(workers)]
+        self._tasks: List[asyncio.Task] = []
+
+        # Counters exposed through stats()
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+
+    async def start(self) -> None:
+        """Start the worker tasks."""
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._worker(queue), name=f"update-worker-{i}")
+                for i, queue in enumerate(self._queues)
+            ]
+
+    async def stop(self, drain_timeout: float = 10) -> None:
+        """Stop the workers after queued updates were processed (or drain_timeout passed)."""
+        if self._tasks and drain_timeout > 0:
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(*(queue.join() for queue in self._queues)), drain_timeout
+                )
+            except asyncio.TimeoutError:
+                logger.warning(f"Stopping update workers with {self.depth} updates still queued")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, update) -> bool:
+        """Queue an update for processing.
+
+        Returns:
+            True if the update was queued, False if the queue stayed full
+            for longer than the enqueue timeout
+        """
+        queue = self._queues[_ordering_key(update) % len(self._queues)]
+        try:
+            await asyncio.wait_for(queue.put(update), self._enqueue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return False
+        self.accepted += 1
+        return True
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            update = await queue.get()
+            try:
+                await self._process_update(update)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Error processing update {update.update_id}: {e}", exc_info=True)
+            finally:
+                queue.task_done()
+
+    @property
+    def depth(self) -> int:
+        """Number of updates waiting to be processed."""
+        return sum(queue.qsize() for queue in self._queues)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue metrics for health and monitoring endpoints."""
+        return {
+            "depth": self.depth,
+            "capacity": sum(queue.maxsize for queue in self._queues),
+            "workers": len(self._queues),
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+        }
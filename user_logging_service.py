@@ -0,0 +1,170 @@
+import os
+import time
+import asyncio
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from dotenv import load_dotenv
+
+from database_service import get_async_supabase_client
+from metrics import Timer, UPSTREAM_SECONDS, UPSTREAM_ERRORS
+
+# Load environment variables
+load_dotenv()
+
+# A batch is flushed once it has this many users or has waited this many seconds
+USER_LOG_BATCH_SIZE = int(os.getenv("USER_LOG_BATCH_SIZE", "50"))
+USER_LOG_FLUSH_SECONDS = float(os.getenv("USER_LOG_FLUSH_SECONDS", "5"))
+
+# A user is upserted at most once per window
+USER_LOG_DEDUP_SECONDS = float(os.getenv("USER_LOG_DEDUP_SECONDS", "3600"))
+
+
+def _user_row(user) -> Dict[str, Any]:
+    return {
+        'user_id': user.id,
+        'username': user.username or '',
+        'first_name': user.first_name or '',
+        'last_name': user.last_name or '',
+        'created_at': datetime.now().isoformat()
+    }
+
+
+class UserLogPipeline:
+    """Batched, deduplicated logging of users to Supabase.
+
+    Handlers call `log()`, which never waits on the network: users already
+    logged within the dedup window are dropped, and the rest are queued. A
+    background task drains the queue and writes multi-row upserts whenever
+    USER_LOG_BATCH_SIZE users are pending or USER_LOG_FLUSH_SECONDS have
+    passed. `stop()` flushes everything still pending.
+    """
+
+    def __init__(self, batch_size: int = USER_LOG_BATCH_SIZE,
+                 flush_seconds: float = USER_LOG_FLUSH_SECONDS,
+                 dedup_seconds: float = USER_LOG_DEDUP_SECONDS):
+        self._batch_size = batch_size
+        self._flush_seconds = flush_seconds
+        self._dedup_seconds = dedup_seconds
+        self._queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        self._seen: Dict[int, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: Optional[asyncio.Future] = None
+
+        # Counters exposed through stats()
+        self.deduplicated = 0
+        self.flushed_rows = 0
+        self.flushes = 0
+        self.errors = 0
+
+    def log(self, user) -> None:
+        """Queue a user for logging unless they were already logged recently."""
+        if user is None:
+            return
+        now = time.monotonic()
+        last_logged = self._seen.get(user.id)
+        if last_logged is not None and now - last_logged < self._dedup_seconds:
+            self.deduplicated += 1
+            return
+        self._seen[user.id] = now
+        self._queue.put_nowait(_user_row(user))
+
+    async def start(self) -> None:
+        """Start the background flush task (no-op if already running)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task and flush all pending users."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._inflight is not None:
+            # Let a flush that was already running finish
+            await self._inflight
+            self._inflight = None
+
+        pending = []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for start in range(0, len(pending), self._batch_size):
+            await self._flush(pending[start:start + self._batch_size])
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self._flush_seconds
+            try:
+                while len(batch) < self._batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                # Put the partial batch back so stop() flushes it
+                for row in batch:
+                    self._queue.put_nowait(row)
+                raise
+            # Shielded so that stop() never cancels a batch halfway through
+            self._inflight = asyncio.ensure_future(self._flush(batch))
+            await asyncio.shield(self._inflight)
+
+    async def _flush(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        # Postgres rejects an upsert that touches the same row twice
+        rows = list({row['user_id']: row for row in rows}.values())
+        try:
+            with Timer(UPSTREAM_SECONDS, service="supabase"):
+                supabase = await get_async_supabase_client()
+                await supabase.table('users').upsert(rows, on_conflict='user_id').execute()
+            self.flushes += 1
+            self.flushed_rows += len(rows)
+        except Exception as e:
+            self.errors += 1
+            UPSTREAM_ERRORS.inc(service="supabase")
+            # Forget these users so they are retried on their next message
+            for row in rows:
+                self._seen.pop(row['user_id'], None)
+            print(f'Error logging {len(rows)} users to Supabase: {e}')
+        self._prune_seen()
+
+    def _prune_seen(self) -> None:
+        cutoff = time.monotonic() - self._dedup_seconds
+        expired = [user_id for user_id, logged_at in self._seen.items() if logged_at < cutoff]
+        for user_id in expired:
+            del self._seen[user_id]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return pipeline metrics for health and monitoring endpoints."""
+        return {
+            "pending": self._queue.qsize(),
+            "seen_users": len(self._seen),
+            "deduplicated": self.deduplicated,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "errors": self.errors,
+        }
+
+
+_pipeline: Optional[UserLogPipeline] = None
+
+
+def get_user_log_pipeline() -> UserLogPipeline:
+    """Return the process-wide user logging pipeline."""
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = UserLogPipeline()
+    return _pipeline
+
+
+def log_user(user) -> None:
+    """Queue a user to be logged to Supabase (never blocks)."""
+    get_user_log_pipeline().log(user)
@@ -1,6 +1,18 @@
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from telegram import Update, constants
 from telegram_bot import create_bot_app
+from catalog_service import get_catalog
+from http_client import close_http_client
+from geocode_cache import get_geocode_cache
+from nearest_cache import get_nearest_cache
+from onemap_service import geocode_flights
+from user_logging_service import get_user_log_pipeline
+from conversation_store import get_conversation_store
+from update_dispatcher import UpdateDispatcher, WEBHOOK_FAST_ACK
+from multi_worker import is_primary_process
+import sheets_service
+from metrics import Timer, timed, render_metrics, WEBHOOK_SECONDS, UPDATE_SECONDS
 import os
 import logging
 import asyncio
@@ -13,10 +25,17 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI()
 bot_app = None
+update_dispatcher = None
 
 load_dotenv()
 PROD_URL = os.getenv("PROD_URL")
 
+# Number of worker processes when started with `python webserver.py` (see multi_worker.py)
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1"))
+
+# Outcomes of the updates processed inline (without fast-ack), exposed through /health
+inline_updates = {"processed": 0, "failed": 0}
+
 async def send_message_to_devs(message: str):
     developer_group_id = os.getenv("DEVELOPER_GROUP_ID")
     
@@ -55,7 +74,7 @@ async def keep_alive():
 @app.on_event("startup")
 async def startup_event():
     """Initialize bot and set webhook on startup"""
-    global bot_app
+    global bot_app, update_dispatcher
     
     try:
         bot_app = create_bot_app()
@@ -63,9 +82,20 @@ async def startup_event():
         if bot_app:
             await bot_app.initialize()
             await bot_app.start()
+            await get_user_log_pipeline().start()
             
             logger.info("Bot application initialized and started successfully")
             
+            if WEBHOOK_FAST_ACK:
+                update_dispatcher = UpdateDispatcher(timed(UPDATE_SECONDS)(bot_app.process_update))
+                await update_dispatcher.start()
+                logger.info(f"Webhook fast-ack enabled with {update_dispatcher.stats()['workers']} update workers")
+            
+            if not is_primary_process():
+                # The primary worker registers the webhook and runs the keep-alive pings
+                logger.info("Worker ready (webhook and keep-alive handled by the primary worker)")
+                return
+            
             webhook_url = PROD_URL + "webhook"
             logger.info(f"Using webhook URL: {webhook_url}")
             
@@ -87,7 +117,11 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Clean shutdown"""
-    global bot_app
+    global bot_app, update_dispatcher
+    if update_dispatcher:
+        await update_dispatcher.stop()
+        update_dispatcher = None
+    get_catalog().stop()
     if bot_app:
         try:
             await bot_app.stop()
@@ -95,24 +129,39 @@ async def shutdown_event():
             logger.info("Bot application stopped and shutdown completed")
         except Exception as e:
             logger.error(f"Error during shutdown: {e}")
+    await get_user_log_pipeline().stop()
+    get_conversation_store().close()
+    await close_http_client()
 
 @app.post("/webhook")
 async def webhook(request: Request):
     """Handle incoming webhook updates from Telegram"""
+    with Timer(WEBHOOK_SECONDS, mode="fast_ack" if update_dispatcher else "inline"):
+        return await _handle_webhook(request)
+
+async def _handle_webhook(request: Request):
     try:
-        # Log the incoming request
         update_data = await request.json()
-        logger.info(f"Received webhook update: {update_data}")
+        logger.debug(f"Received webhook update: {update_data}")
         
         if bot_app:
             # Create Update object
             update = Update.de_json(update_data, bot_app.bot)
-            logger.info(f"Parsed update: {update.update_id}")
+            
+            if update_dispatcher:
+                # Fast-ack: queue the update and answer Telegram right away
+                if not await update_dispatcher.submit(update):
+                    logger.warning(f"Update queue full, asking Telegram to retry update {update.update_id}")
+                    return JSONResponse(status_code=503, content={"status": "busy"})
+                return {"status": "ok"}
             
             try:
-                await bot_app.process_update(update)
-                logger.info(f"Successfully processed update {update.update_id}")
+                with Timer(UPDATE_SECONDS):
+                    await bot_app.process_update(update)
+                inline_updates["processed"] += 1
+                logger.debug(f"Successfully processed update {update.update_id}")
             except Exception as process_error:
+                inline_updates["failed"] += 1
                 logger.error(f"Error processing update {update.update_id}: {process_error}", exc_info=True)
             
         else:
@@ -133,15 +182,37 @@ async def root():
         "timestamp": datetime.now()
     }
 
+def update_outcomes():
+    """Number of updates this process finished processing, and how many of them raised."""
+    source = update_dispatcher.stats() if update_dispatcher else inline_updates
+    return {"processed": source["processed"], "failed": source["failed"]}
+
 @app.get("/health")
 async def health():
     bot_status = "ready" if bot_app else "not_initialized"
     return {
         "status": "ok", 
         "bot_status": bot_status,
+        "catalog": get_catalog().stats(),
+        "nearest_cache": get_nearest_cache().stats(),
+        "geocode_cache": get_geocode_cache().stats(),
+        "geocode_requests": geocode_flights.stats(),
+        "user_logging": get_user_log_pipeline().stats(),
+        "updates": update_outcomes(),
+        "update_queue": update_dispatcher.stats() if update_dispatcher else None,
+        "conversations": get_conversation_store().stats(),
+        "sheet_rows_rejected": [
+            {"row": error.row_number, "column": error.column, "message": error.message}
+            for error in sheets_service.last_parse_errors[:20]
+        ],
         "timestamp": datetime.now()
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Expose metrics in the Prometheus text format"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/webhook-info")
 async def webhook_info():
     """Get current webhook information"""
@@ -187,5 +258,9 @@ async def ping():
     return {"ping": "pong", "timestamp": datetime.now()}
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    if WEB_WORKERS > 1:
+        from multi_worker import run_workers
+        run_workers(WEB_WORKERS, host="0.0.0.0", port=8000)
+    else:
+        import uvicorn
+        uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file